@@ -0,0 +1,184 @@
+from array import array
+from typing import List, Tuple
+
+import numpy as np
+
+from floor_queues import FloorQueues, OrderedUsers
+from lift_algorithms.lift import LiftAction
+
+
+class ActionTrace:
+    """
+    Compact record of every action the lift took in a simulation so it can be replayed without running the algorithm
+    again. Every keyframe_interval actions the floor queues and lift occupants are saved so the state at any time can
+    be rebuilt by binary searching for the action then applying at most keyframe_interval actions from a keyframe.
+    Users are stored as their row in the simulation's UserTable
+    """
+    keyframe_interval: int
+    total_floors: int
+    end_time: int
+    # one value per action
+    times: array | np.ndarray  # when each action started
+    actions: array | np.ndarray  # Action value
+    floors: array | np.ndarray  # floor the lift was on when the action started
+    # boarded[add_offsets[i]:add_offsets[i + 1]] are the users that got on in action i, same for alighted
+    add_offsets: array | np.ndarray
+    boarded: array | np.ndarray
+    remove_offsets: array | np.ndarray
+    alighted: array | np.ndarray
+    # one value per keyframe, keyframe k is the state before action k * keyframe_interval
+    occupant_offsets: array | np.ndarray  # keyframe_occupants[occupant_offsets[k]:occupant_offsets[k + 1]]
+    keyframe_occupants: array | np.ndarray
+    # waiting users of keyframe k floor f are keyframe_queues[queue_offsets[k * floors + f]:queue_offsets[...+ 1]]
+    queue_offsets: array | np.ndarray
+    keyframe_queues: array | np.ndarray
+
+    def __init__(self, keyframe_interval: int = 1024):
+        self.total_floors = 0
+        self.keyframe_interval = keyframe_interval
+        self.end_time = 0
+        self.times = array("q")
+        self.actions = array("b")
+        self.floors = array("i")
+        self.add_offsets = array("q", [0])
+        self.boarded = array("q")
+        self.remove_offsets = array("q", [0])
+        self.alighted = array("q")
+        self.occupant_offsets = array("q", [0])
+        self.keyframe_occupants = array("q")
+        self.queue_offsets = array("q", [0])
+        self.keyframe_queues = array("q")
+
+    def __len__(self):
+        return len(self.times)
+
+    def record_state(self, floors: FloorQueues, lift_occupants: OrderedUsers):
+        """
+        Saves a keyframe if one is due before the next action
+        :param floors: users waiting on each floor
+        :param lift_occupants: users in the lift
+        """
+        if len(self.times) % self.keyframe_interval != 0:
+            return
+        self.total_floors = len(floors)
+        self.keyframe_occupants.extend(user.row for user in lift_occupants)
+        self.occupant_offsets.append(len(self.keyframe_occupants))
+        for floor in floors:
+            self.keyframe_queues.extend(user.row for user in floor)
+            self.queue_offsets.append(len(self.keyframe_queues))
+
+    def record(self, time: int, floor: int, action: LiftAction):
+        """
+        Adds an action to the end of the trace
+        :param time: when the action started
+        :param floor: floor the lift was on
+        :param action: the action
+        """
+        self.times.append(time)
+        self.actions.append(action.action.value)
+        self.floors.append(floor)
+        if action.add:
+            self.boarded.extend(user.row for user in action.add)
+        self.add_offsets.append(len(self.boarded))
+        if action.remove:
+            self.alighted.extend(user.row for user in action.remove)
+        self.remove_offsets.append(len(self.alighted))
+
+    def finish(self, end_time: int):
+        """
+        Marks the end of the simulation and turns the recorded values into numpy arrays so they can be searched
+        :param end_time: when the last action finished
+        """
+        self.end_time = end_time
+        for name in array_names:
+            values = getattr(self, name)
+            if isinstance(values, array):
+                setattr(self, name, np.frombuffer(values, dtype=values.typecode))
+
+    def save(self, path: str):
+        """
+        Saves a finished trace as an uncompressed numpy archive
+        """
+        with open(path, "wb") as f:
+            np.savez(f, header=np.array([self.total_floors, self.keyframe_interval, self.end_time], dtype=np.int64),
+                     **{name: getattr(self, name) for name in array_names})
+
+    def get_action_index(self, time: float) -> int:
+        """
+        :return: index of the action happening at a time
+        """
+        return max(int(np.searchsorted(self.times, time, side="right")) - 1, 0)
+
+    def get_action(self, index: int) -> Tuple[int, int, int, np.ndarray, np.ndarray]:
+        """
+        :return: the start time, Action value, floor, boarded rows and alighted rows of an action
+        """
+        return (int(self.times[index]), int(self.actions[index]), int(self.floors[index]),
+                self.boarded[self.add_offsets[index]:self.add_offsets[index + 1]],
+                self.alighted[self.remove_offsets[index]:self.remove_offsets[index + 1]])
+
+    def get_end_time(self, index: int) -> int:
+        """
+        :return: when an action finished
+        """
+        return int(self.times[index + 1]) if index + 1 < len(self.times) else self.end_time
+
+    def get_finished_count(self, index: int) -> int:
+        """
+        :return: how many users had got out of the lift before an action
+        """
+        return int(self.remove_offsets[index])
+
+    def get_state(self, index: int, time: float, start_floors: np.ndarray, start_times: np.ndarray,
+                  arrival_order: np.ndarray) -> Tuple[List[int], List[List[int]]]:
+        """
+        Rebuilds the lift occupants and floor queues during an action from the keyframe before it
+        :param index: the action
+        :param time: users that arrived at or before this time are waiting
+        :param start_floors: start floor of each user by row
+        :param start_times: start time of each user in arrival order
+        :param arrival_order: rows of the users in the order they arrive
+        :return: rows of the occupants and rows of the users waiting on each floor
+        """
+        keyframe = index // self.keyframe_interval
+        occupants = self.keyframe_occupants[self.occupant_offsets[keyframe]:self.occupant_offsets[keyframe + 1]].tolist()
+        queues = [self.keyframe_queues[self.queue_offsets[keyframe * self.total_floors + floor]:
+                                       self.queue_offsets[keyframe * self.total_floors + floor + 1]].tolist()
+                  for floor in range(self.total_floors)]
+
+        # add everyone who arrived since the keyframe
+        first = np.searchsorted(start_times, self.times[keyframe * self.keyframe_interval], side="right")
+        last = np.searchsorted(start_times, time, side="right")
+        for row in arrival_order[first:last].tolist():
+            queues[start_floors[row]].append(row)
+
+        # apply the actions since the keyframe
+        for action_index in range(keyframe * self.keyframe_interval, index):
+            _, _, floor, boarded, alighted = self.get_action(action_index)
+            if len(boarded) == 0 and len(alighted) == 0:
+                continue
+            boarding = set(boarded.tolist())
+            queues[floor] = [row for row in queues[floor] if row not in boarding]
+            occupants.extend(boarded.tolist())
+            leaving = set(alighted.tolist())
+            occupants = [row for row in occupants if row not in leaving]
+        return occupants, queues
+
+
+# the arrays saved by ActionTrace.save
+array_names = ("times", "actions", "floors", "add_offsets", "boarded", "remove_offsets", "alighted",
+               "occupant_offsets", "keyframe_occupants", "queue_offsets", "keyframe_queues")
+
+
+def load_trace(path: str) -> ActionTrace:
+    """
+    Loads a trace saved with ActionTrace.save
+    """
+    with np.load(path) as data:
+        total_floors, keyframe_interval, end_time = data["header"].tolist()
+        trace = ActionTrace(keyframe_interval)
+        trace.total_floors = total_floors
+        trace.end_time = end_time
+        for name in array_names:
+            setattr(trace, name, data[name])
+    return trace
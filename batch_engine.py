@@ -0,0 +1,264 @@
+import json
+from typing import Dict, List, Sequence, Callable
+
+import numpy as np
+
+import simulation_handler
+from lift_algorithms.lift import BaseLiftAlgorithm
+from user import UserTable
+
+
+def scan_directions(direction: np.ndarray, at_top: np.ndarray, at_bottom: np.ndarray, empty_lift: np.ndarray,
+                    empty_floor: np.ndarray, none_above: np.ndarray, none_below: np.ndarray) -> np.ndarray:
+    """
+    SCAN decision for lifts that are about to move: turn around at the top and bottom floors
+    :param direction: direction of each lift, true == up
+    :param at_top: if each lift is on the top floor
+    :param at_bottom: if each lift is on the bottom floor
+    :return: the direction each lift moves in
+    """
+    return direction ^ np.where(direction, at_top, at_bottom)
+
+
+def look_directions(direction: np.ndarray, at_top: np.ndarray, at_bottom: np.ndarray, empty_lift: np.ndarray,
+                    empty_floor: np.ndarray, none_above: np.ndarray, none_below: np.ndarray) -> np.ndarray:
+    """
+    LOOK decision for lifts that are about to move. Like LookAlgorithm it checks whether to turn around twice, once
+    inside SCAN and once more after, and also turns around an empty lift with nobody waiting ahead of it
+    :param direction: direction of each lift, true == up
+    :param at_top: if each lift is on the top floor
+    :param at_bottom: if each lift is on the bottom floor
+    :param empty_lift: if each lift has nobody in it
+    :param empty_floor: if nobody is waiting on the floor each lift is on
+    :param none_above: if nobody is waiting above each lift, only used where the lift and floor are empty
+    :param none_below: if nobody is waiting below each lift, only used where the lift and floor are empty
+    :return: the direction each lift moves in
+    """
+    def should_change_direction(current_direction: np.ndarray) -> np.ndarray:
+        nobody_ahead = empty_lift & empty_floor & np.where(current_direction, none_above, none_below)
+        return nobody_ahead | np.where(current_direction, at_top, at_bottom)
+
+    direction = direction ^ should_change_direction(direction)
+    return direction ^ should_change_direction(direction)
+
+
+# vectorised version of each algorithm, picking users up works the same way for both so only moving differs
+direction_kernels: Dict[str, Callable[..., np.ndarray]] = {"SCAN": scan_directions, "LOOK": look_directions}
+
+
+def expand_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    :return: every index in the ranges [start, start + count) one after another
+    """
+    ends = np.cumsum(counts)
+    return np.repeat(starts - (ends - counts), counts) + np.arange(ends[-1] if len(ends) > 0 else 0)
+
+
+def simulate_batch(algorithm: BaseLiftAlgorithm, scenarios: List[UserTable], total_floors: int | Sequence[int],
+                   capacity: int | Sequence[int], constants: Dict[str, int],
+                   event_driven: bool = True) -> List[UserTable]:
+    """
+    Runs many independent simulations at once, stepping every lift in lockstep with numpy. Gives exactly the same
+    times as simulate. The waiting users of each (scenario, floor, direction of travel) are a queue sorted by arrival
+    so arrivals and pickups only move a pointer, as SCAN and LOOK always pick up the first users going their way
+    :param algorithm: algorithm to use, must have a kernel in direction_kernels
+    :param scenarios: users of each simulation, their times are filled in
+    :param total_floors: number of floors in every building or in each one
+    :param capacity: capacity of every lift or of each one
+    :param constants: the timing constants from data/constants.json
+    :param event_driven: when a lift is idle jump straight to the next arrival instead of stepping one time unit at a time
+    :return: the users tables with times
+    """
+    if algorithm.name not in direction_kernels:
+        raise Exception(f"Algorithm {algorithm.name} can not be run in a batch.")
+    kernel = direction_kernels[algorithm.name]
+    scenario_count = len(scenarios)
+    floor_counts = np.broadcast_to(np.asarray(total_floors, dtype=np.int64), (scenario_count,))
+    capacities = np.broadcast_to(np.asarray(capacity, dtype=np.int64), (scenario_count,))
+    if scenario_count == 0:
+        return scenarios
+    floors = int(floor_counts.max())
+    floor_time = constants["time between floors"]
+    first_pickup_time = constants["first pickup time"]
+    extra_pickup_time = constants["extra pickup time"]
+
+    # users of every scenario one after another
+    sizes = np.array([len(users) for users in scenarios], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    scenario_of = np.repeat(np.arange(scenario_count), sizes)
+    start_floors = np.concatenate([users.start_floors for users in scenarios]).astype(np.int64)
+    end_floors = np.concatenate([users.end_floors for users in scenarios]).astype(np.int64)
+    start_times = np.concatenate([users.start_times for users in scenarios]).astype(np.int64)
+    if np.any(start_floors == end_floors):
+        raise Exception("Every user must travel to a different floor to be run in a batch.")
+    start_traveling_times = np.full(len(start_times), -1, dtype=np.int64)
+    finish_times = np.full(len(start_times), -1, dtype=np.int64)
+
+    # users in the order they arrive in each scenario, ties in file order like UserTable.get_arrival_stream
+    arrivals = np.lexsort((start_times, scenario_of))
+    arrival_times = start_times[arrivals]
+    # scenario * stride + time is sorted so every scenario's arrivals can be found with one search
+    latest_arrival = int(start_times.max()) if len(start_times) > 0 else 0
+    stride = latest_arrival + 2
+    arrival_keys = scenario_of[arrivals] * stride + arrival_times
+    next_arrival = offsets[:-1].copy()
+
+    # one queue for each (scenario, floor, going up or down), users between head and tail are waiting
+    queue_of = (scenario_of * floors + start_floors) * 2 + (end_floors < start_floors)
+    queue_users = np.lexsort((start_times, queue_of))
+    queue_head = np.concatenate(([0], np.cumsum(np.bincount(queue_of, minlength=scenario_count * floors * 2))))[:-1]
+    queue_tail = queue_head.copy()
+    waiting = np.zeros(scenario_count * floors, dtype=np.int64)
+    total_waiting = np.zeros(scenario_count, dtype=np.int64)
+    floor_numbers = np.arange(floors)
+
+    # each lift has a slot for every person it can hold
+    occupants = np.full((scenario_count, int(capacities.max())), -1, dtype=np.int64)
+    occupant_ends = np.full(occupants.shape, -1, dtype=np.int64)
+    occupant_counts = np.zeros(scenario_count, dtype=np.int64)
+
+    current_times = np.zeros(scenario_count, dtype=np.int64)
+    current_floors = np.full(scenario_count, constants["start floor"], dtype=np.int64)
+    directions = np.ones(scenario_count, dtype=bool)
+    last_opened_doors = np.zeros(scenario_count, dtype=bool)
+    finished_users = np.zeros(scenario_count, dtype=np.int64)
+    active = np.flatnonzero(sizes > 0)
+
+    # run every lift loop until every simulation has finished
+    while len(active) > 0:
+        times = current_times[active]
+        # see if any new lift users have arrived since the last action
+        arrived_to = np.searchsorted(arrival_keys, active * stride + np.minimum(times, latest_arrival + 1),
+                                     side="right")
+        arrived_counts = arrived_to - next_arrival[active]
+        if arrived_counts.any():
+            arrived = arrivals[expand_ranges(next_arrival[active], arrived_counts)]
+            np.add.at(queue_tail, queue_of[arrived], 1)
+            np.add.at(waiting, scenario_of[arrived] * floors + start_floors[arrived], 1)
+            total_waiting[active] += arrived_counts
+            next_arrival[active] = arrived_to
+
+        floor = current_floors[active]
+        direction = directions[active]
+        # see if anybody can be dropped off
+        drop_off = occupant_ends[active] == floor[:, None]
+        drop_counts = drop_off.sum(axis=1)
+        occupant_count = occupant_counts[active]
+        # see if anybody can be picked up
+        up_queue = (active * floors + floor) * 2
+        down_queue = up_queue + 1
+        waiting_up = queue_tail[up_queue] - queue_head[up_queue]
+        waiting_down = queue_tail[down_queue] - queue_head[down_queue]
+        at_top = floor == floor_counts[active] - 1
+        at_bottom = floor == 0
+        # at the end of the shaft everybody is picked up, only one of the queues can have anyone in it there
+        change_direction = (waiting_up + waiting_down > 0) & np.where(direction, at_top, at_bottom)
+        room = np.maximum(capacities[active] - occupant_count + drop_counts, 0)
+        pick_up_up = np.where(direction | change_direction, np.minimum(room, waiting_up), 0)
+        pick_up_down = np.where(~direction | change_direction, np.minimum(room - pick_up_up, waiting_down), 0)
+        pick_up_counts = pick_up_up + pick_up_down
+
+        open_doors = (pick_up_counts > 0) | (drop_counts > 0)
+        idle = ~open_doors & (total_waiting[active] == 0) & (occupant_count == 0)
+        move = ~open_doors & ~idle
+
+        if move.any():
+            moving = active[move]
+            moving_floor = floor[move]
+            empty_lift = occupant_count[move] == 0
+            empty_floor = (waiting_up + waiting_down)[move] == 0
+            # only lifts that are empty on an empty floor need to look at the rest of the building
+            none_above = np.zeros(len(moving), dtype=bool)
+            none_below = np.zeros(len(moving), dtype=bool)
+            looking = np.flatnonzero(empty_lift & empty_floor)
+            if len(looking) > 0:
+                building = waiting.reshape(scenario_count, floors)[moving[looking]] > 0
+                above = floor_numbers > moving_floor[looking, None]
+                none_above[looking] = ~(building & above).any(axis=1)
+                none_below[looking] = ~(building & ~above).any(axis=1)
+            new_direction = kernel(direction[move], at_top[move], at_bottom[move], empty_lift, empty_floor,
+                                   none_above, none_below)
+            directions[moving] = new_direction
+            current_floors[moving] = moving_floor + np.where(new_direction, 1, -1)
+            current_times[moving] = times[move] + floor_time
+            last_opened_doors[moving] = False
+
+        if idle.any():
+            idling = active[idle]
+            idle_times = times[idle]
+            # nothing changes until somebody arrives so skip to them
+            has_future = next_arrival[idling] < offsets[idling + 1]
+            next_times = arrival_times[np.minimum(next_arrival[idling], len(arrival_times) - 1)]
+            if event_driven:
+                current_times[idling] = np.where(has_future, np.maximum(idle_times + 1, next_times), idle_times + 1)
+            else:
+                current_times[idling] = idle_times + 1
+            last_opened_doors[idling] = False
+
+        if open_doors.any():
+            opening = active[open_doors]
+            opening_times = times[open_doors]
+            # drop off
+            drop_rows, drop_slots = np.nonzero(drop_off[open_doors])
+            dropped = occupants[opening[drop_rows], drop_slots]
+            finish_times[dropped] = opening_times[drop_rows]
+            occupants[opening[drop_rows], drop_slots] = -1
+            occupant_ends[opening[drop_rows], drop_slots] = -1
+            # pick up the first users of each queue, grouped by lift so they line up with the free slots
+            up_counts = pick_up_up[open_doors]
+            down_counts = pick_up_down[open_doors]
+            rows = np.arange(len(opening))
+            owners = np.concatenate((np.repeat(rows, up_counts), np.repeat(rows, down_counts)))
+            boarded = queue_users[np.concatenate((expand_ranges(queue_head[up_queue[open_doors]], up_counts),
+                                                  expand_ranges(queue_head[down_queue[open_doors]], down_counts)))]
+            order = np.argsort(owners, kind="stable")
+            owners = owners[order]
+            boarded = boarded[order]
+            counts = up_counts + down_counts
+            free = occupants[opening] < 0
+            slot_rows, slot_columns = np.nonzero(free & (np.cumsum(free, axis=1) <= counts[:, None]))
+            occupants[opening[slot_rows], slot_columns] = boarded
+            occupant_ends[opening[slot_rows], slot_columns] = end_floors[boarded]
+            start_traveling_times[boarded] = opening_times[owners]
+            queue_head[up_queue[open_doors]] += up_counts
+            queue_head[down_queue[open_doors]] += down_counts
+            waiting[opening * floors + floor[open_doors]] -= counts
+            total_waiting[opening] -= counts
+
+            dropped_counts = drop_counts[open_doors]
+            occupant_counts[opening] += counts - dropped_counts
+            finished_users[opening] += dropped_counts
+            # calculate time taken
+            current_times[opening] = opening_times + np.where(last_opened_doors[opening], 0, first_pickup_time) + \
+                extra_pickup_time * (counts + dropped_counts)
+            last_opened_doors[opening] = True
+
+        active = active[finished_users[active] < sizes[active]]
+
+    # write the times back to each table
+    for index, users in enumerate(scenarios):
+        users.start_traveling_times[:] = start_traveling_times[offsets[index]:offsets[index + 1]]
+        users.finish_times[:] = finish_times[offsets[index]:offsets[index + 1]]
+    return scenarios
+
+
+def run_simulations(algorithm: BaseLiftAlgorithm, simulation_ids: List[int],
+                    event_driven: bool = True) -> List[UserTable]:
+    """
+    Runs saved simulations together with simulate_batch
+    :param algorithm: algorithm to use, must have a kernel in direction_kernels
+    :param simulation_ids: simulations to run
+    :param event_driven: when a lift is idle jump straight to the next arrival
+    :return: simulated users of each simulation with times
+    """
+    with open("data/constants.json", "r") as f:
+        constants = json.load(f)
+    scenarios = []
+    floor_counts = []
+    capacities = []
+    for simulation_id in simulation_ids:
+        users, total_floors, capacity = simulation_handler.open_simulation(simulation_id)
+        scenarios.append(users)
+        floor_counts.append(total_floors)
+        capacities.append(capacity)
+    return simulate_batch(algorithm, scenarios, floor_counts, capacities, constants, event_driven)
@@ -0,0 +1,157 @@
+import argparse
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Tuple
+
+import batch_engine
+import result_cache
+import simulation_handler
+from lift_algorithms import registry
+from user import UserTable
+
+
+def get_simulation_ids(selections: List[str]) -> List[int]:
+    """
+    Turns simulation ids and glob patterns of simulation files into a sorted list of ids
+    :param selections: ids (e.g. "3") or patterns (e.g. "simulations/simulation_1*.json")
+    :return: simulation ids
+    """
+    ids = set()
+    for selection in selections:
+        if selection.isdigit():
+            ids.add(int(selection))
+            continue
+        for path in glob.glob(selection):
+            # traces, metrics and other files kept next to the simulations are not simulations
+            match = re.fullmatch(r"simulation_(\d+)\.(lift|json)", os.path.basename(path))
+            if match:
+                ids.add(int(match.group(1)))
+    return sorted(ids)
+
+
+def run_job(simulation_id: int, algorithm_name: str, use_cache: bool = True) -> Tuple[UserTable, bool]:
+    """
+    Runs one simulation in a worker process. The output is returned instead of saved so only one process writes to
+    the simulation files
+    :param simulation_id: simulation to run
+    :param algorithm_name: name of the algorithm to run it with
+    :param use_cache: use the output of an earlier run of the same users and algorithm version, see result_cache
+    :return: simulated users with times and whether they came from the cache
+    """
+    if use_cache:
+        users, _, cached = result_cache.run_cached_simulation(algorithm_name, simulation_id)
+        return users, cached
+    return simulation_handler.run_simulation(registry.create_algorithm(algorithm_name), simulation_id), False
+
+
+def run_batch(simulation_ids: List[int], algorithm_names: List[str], workers: int | None = None,
+              use_cache: bool = True) -> Dict[Tuple[int, str], str | None]:
+    """
+    Runs every simulation with every algorithm across a pool of processes and saves the outputs
+    :param simulation_ids: simulations to run
+    :param algorithm_names: algorithms to run each simulation with
+    :param workers: how many processes to use, defaults to one per core
+    :param use_cache: skip runs that are already in result_cache
+    :return: the error for each (simulation, algorithm) pair or None if it succeeded
+    """
+    for name in algorithm_names:
+        registry.get_algorithm_class(name)
+    results = {}
+    total_jobs = len(simulation_ids) * len(algorithm_names)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_job, simulation_id, name, use_cache): (simulation_id, name)
+                   for simulation_id in simulation_ids for name in algorithm_names}
+        for finished, future in enumerate(as_completed(futures), 1):
+            simulation_id, name = futures[future]
+            try:
+                # save from this process only so the simulation files are never written to at the same time
+                users, cached = future.result()
+                simulation_handler.save_output(users, simulation_id, registry.create_algorithm(name))
+                results[(simulation_id, name)] = None
+                status = "cached" if cached else "saved"
+            except Exception as e:
+                results[(simulation_id, name)] = str(e)
+                status = f"failed: {e}"
+            print(f"[{finished}/{total_jobs}] {time.perf_counter() - start:.1f}s simulation {simulation_id} "
+                  f"{name} {status}", flush=True)
+    return results
+
+
+def run_lockstep_batch(simulation_ids: List[int], algorithm_names: List[str],
+                       use_cache: bool = True) -> Dict[Tuple[int, str], str | None]:
+    """
+    Runs every simulation with every algorithm in this process, all simulations of an algorithm together with
+    batch_engine, and saves the outputs
+    :param simulation_ids: simulations to run
+    :param algorithm_names: algorithms to run each simulation with, each must be in batch_engine.direction_kernels
+    :param use_cache: only run the simulations whose outputs are not already in result_cache
+    :return: the error for each (simulation, algorithm) pair or None if it succeeded
+    """
+    for name in algorithm_names:
+        registry.get_algorithm_class(name)
+    with open("data/constants.json", "r") as f:
+        constants = json.load(f)
+    results = {}
+    start = time.perf_counter()
+    for name in algorithm_names:
+        cached_outputs = {}
+        keys = {}
+        use_algorithm_cache = use_cache and result_cache.is_cacheable(name)
+        if use_algorithm_cache:
+            for simulation_id in simulation_ids:
+                users, total_floors, capacity = simulation_handler.open_simulation(simulation_id)
+                keys[simulation_id], cached_metrics = result_cache.fill_from_cache(users, total_floors, capacity,
+                                                                                   name, constants, "lockstep")
+                if cached_metrics is not None:
+                    cached_outputs[simulation_id] = users
+        run_ids = [simulation_id for simulation_id in simulation_ids if simulation_id not in cached_outputs]
+        try:
+            outputs = batch_engine.run_simulations(registry.create_algorithm(name), run_ids) if run_ids else []
+        except Exception as e:
+            results.update({(simulation_id, name): str(e) for simulation_id in simulation_ids})
+            print(f"{time.perf_counter() - start:.1f}s {name} failed: {e}", flush=True)
+            continue
+        for simulation_id, users in zip(run_ids, outputs):
+            if use_algorithm_cache:
+                result_cache.store(name, keys[simulation_id], users, "lockstep")
+            cached_outputs[simulation_id] = users
+        saved = 0
+        for simulation_id in simulation_ids:
+            try:
+                simulation_handler.save_output(cached_outputs[simulation_id], simulation_id,
+                                               registry.create_algorithm(name))
+                results[(simulation_id, name)] = None
+                saved += 1
+            except Exception as e:
+                results[(simulation_id, name)] = str(e)
+                print(f"{time.perf_counter() - start:.1f}s simulation {simulation_id} {name} failed: {e}", flush=True)
+        print(f"{time.perf_counter() - start:.1f}s {name} saved {saved} simulations, "
+              f"{len(simulation_ids) - len(run_ids)} from the cache", flush=True)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run many simulations with many algorithms in parallel")
+    parser.add_argument("-s", "--simulations", nargs="+", required=True,
+                        help="simulation ids or glob patterns of simulation files")
+    parser.add_argument("-a", "--algorithms", nargs="+", default=registry.get_algorithm_names(),
+                        help="algorithms to run (default: all)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("-l", "--lockstep", action="store_true",
+                        help="run all simulations of an algorithm at once with numpy instead of a process pool")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="run every simulation again even if its output is cached")
+    args = parser.parse_args()
+
+    if args.lockstep:
+        batch_results = run_lockstep_batch(get_simulation_ids(args.simulations), args.algorithms, not args.no_cache)
+    else:
+        batch_results = run_batch(get_simulation_ids(args.simulations), args.algorithms, args.workers,
+                                  not args.no_cache)
+    failed = sum(error is not None for error in batch_results.values())
+    print(f"Finished {len(batch_results)} runs, {failed} failed")
@@ -0,0 +1,268 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Iterator
+
+import scenario_generator
+import simulation_handler
+from lift_algorithms import registry
+from lift_algorithms.lift import BaseLiftAlgorithm
+
+# default grid of scenarios, every combination is benchmarked with every algorithm
+default_floors = [10, 50, 100]
+default_users = [1_000, 10_000, 100_000]
+default_capacities = [4, 16]
+# how each metric should move, True if a bigger number is better
+metric_directions = {"steps_per_second": True, "us_per_decision": False, "run_seconds": False,
+                     "load_seconds": False, "case_memory_mb": False}
+# timings and memory smaller than these are too noisy to call a regression
+min_regression_seconds = 0.001
+min_regression_mb = 1
+# every scenario arrives over this many time units per user
+time_per_user = 4
+
+
+class DecisionTimer:
+    """Wraps the calculate method of an algorithm so every decision is counted and timed"""
+    decisions: int = 0
+    nanoseconds: int = 0
+
+    def __init__(self, algorithm: BaseLiftAlgorithm):
+        calculate = algorithm.calculate
+
+        def timed_calculate(*args):
+            start = time.perf_counter_ns()
+            action = calculate(*args)
+            self.nanoseconds += time.perf_counter_ns() - start
+            self.decisions += 1
+            return action
+
+        algorithm.calculate = timed_calculate
+
+
+@contextmanager
+def working_folder(folder: str) -> Iterator[None]:
+    """
+    Runs code inside another folder so the benchmark simulations and their index are kept away from the real ones
+    """
+    previous = os.getcwd()
+    os.chdir(folder)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def get_memory_mb() -> float:
+    """
+    :return: the most memory this process has used in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes and macos reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def create_scenarios(folder: str, floors: List[int], users: List[int], capacities: List[int],
+                     seed: int) -> Dict[tuple, int]:
+    """
+    Generates the same scenarios every time for the grid
+    :param folder: folder the benchmark runs in
+    :return: simulation id of each (floors, users, capacity)
+    """
+    os.makedirs(f"{folder}/data", exist_ok=True)
+    shutil.copy("data/constants.json", f"{folder}/data/constants.json")
+    scenario_ids = {}
+    with working_folder(folder):
+        for floor_count, user_count, capacity in itertools.product(floors, users, capacities):
+            chunks = scenario_generator.generate_chunks(floor_count, user_count, user_count * time_per_user,
+                                                        seed=seed)
+            scenario_ids[(floor_count, user_count, capacity)] = simulation_handler.save_simulation(
+                chunks, floor_count, capacity, {"benchmark seed": seed})
+    return scenario_ids
+
+
+def run_case(folder: str, simulation_id: int, algorithm_name: str, repeat: int) -> Dict[str, float]:
+    """
+    Benchmarks one algorithm on one scenario in a fresh process so the peak memory belongs to this case only
+    :param folder: folder the benchmark runs in
+    :param simulation_id: scenario to run
+    :param algorithm_name: algorithm to run it with
+    :param repeat: how many times to run it, the fastest run is kept
+    :return: the metrics of the case
+    """
+    os.chdir(folder)
+    start_memory_mb = get_memory_mb()
+    with open("data/constants.json", "r") as f:
+        constants = json.load(f)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        users, total_floors, capacity = simulation_handler.open_simulation(simulation_id)
+        load_seconds = time.perf_counter() - start
+
+        algorithm = registry.create_algorithm(algorithm_name)
+        timer = DecisionTimer(algorithm)
+        start = time.perf_counter()
+        simulation_handler.simulate(algorithm, users, total_floors, capacity, constants)
+        run_seconds = time.perf_counter() - start
+        if best is None or run_seconds < best["run_seconds"]:
+            best = {"steps": timer.decisions, "run_seconds": run_seconds,
+                    "steps_per_second": timer.decisions / max(run_seconds, 1e-9),
+                    "us_per_decision": timer.nanoseconds / max(timer.decisions, 1) / 1000}
+        best["load_seconds"] = min(best.get("load_seconds", load_seconds), load_seconds)
+    best["start_memory_mb"] = start_memory_mb
+    best["peak_memory_mb"] = get_memory_mb()
+    # memory used by the case on top of the interpreter and imports
+    best["case_memory_mb"] = best["peak_memory_mb"] - start_memory_mb
+    return best
+
+
+def run_benchmarks(floors: List[int], users: List[int], capacities: List[int], algorithm_names: List[str],
+                   seed: int = 0, repeat: int = 3) -> Dict:
+    """
+    Benchmarks every algorithm on every scenario in the grid
+    :param floors: floor counts to try
+    :param users: user counts to try
+    :param capacities: lift capacities to try
+    :param algorithm_names: algorithms to benchmark
+    :param seed: seed the scenarios are generated with
+    :param repeat: how many times each case is run
+    :return: the benchmark settings and the metrics of every case
+    """
+    for name in algorithm_names:
+        registry.get_algorithm_class(name)
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        scenario_ids = create_scenarios(folder, floors, users, capacities, seed)
+        for (floor_count, user_count, capacity), simulation_id in scenario_ids.items():
+            for name in algorithm_names:
+                # a new process for every case so memory and caches from other cases do not count
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    metrics = executor.submit(run_case, folder, simulation_id, name, repeat).result()
+                result = {"floors": floor_count, "users": user_count, "capacity": capacity, "algorithm": name,
+                          **metrics}
+                results.append(result)
+                print(format_result(result), flush=True)
+    return {"commit": get_commit(), "python": platform.python_version(), "machine": platform.machine(),
+            "created": time.time(), "seed": seed, "repeat": repeat, "results": results}
+
+
+def get_commit() -> str | None:
+    """
+    :return: the git commit being benchmarked if there is one
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_case_key(result: Dict) -> tuple:
+    """
+    :return: what identifies a case between benchmark files
+    """
+    return result["floors"], result["users"], result["capacity"], result["algorithm"]
+
+
+def format_result(result: Dict) -> str:
+    """
+    :return: one line of text showing the metrics of a case
+    """
+    return (f"{result['algorithm']:>6} floors {result['floors']:>4} users {result['users']:>8} "
+            f"capacity {result['capacity']:>3}: {result['steps_per_second']:>12,.0f} steps/s "
+            f"{result['us_per_decision']:>8.2f} us/decision load {result['load_seconds'] * 1000:>8.2f} ms "
+            f"peak {result['peak_memory_mb']:>7.1f} MB ({result['case_memory_mb']:.1f} MB for the case)")
+
+
+def find_regressions(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Compares benchmark results to an earlier run
+    :param results: results of this run
+    :param baseline: results of the earlier run
+    :param threshold: how much worse a metric can get as a fraction, e.g. 0.1 for 10%
+    :return: a description of every metric that got worse by more than the threshold
+    """
+    baseline_cases = {get_case_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        old_result = baseline_cases.get(get_case_key(result))
+        if old_result is None:
+            continue
+        for metric, bigger_is_better in metric_directions.items():
+            old, new = old_result[metric], result[metric]
+            if old <= 0 or (metric.endswith("seconds") and max(old, new) < min_regression_seconds) or (
+                    metric.endswith("mb") and max(old, new) < min_regression_mb):
+                continue
+            change = (old - new) / old if bigger_is_better else (new - old) / old
+            if change > threshold:
+                regressions.append(f"{result['algorithm']} floors {result['floors']} users {result['users']} "
+                                   f"capacity {result['capacity']}: {metric} {old:.4g} -> {new:.4g} "
+                                   f"({change:.0%} worse)")
+    return regressions
+
+
+def plot_scaling(results: Dict, metric: str = "steps_per_second"):
+    """
+    Plots how a metric changes with the number of users for each algorithm, floor count and capacity
+    """
+    import matplotlib.pyplot as plt
+
+    lines = {}
+    for result in results["results"]:
+        key = f"{result['algorithm']} {result['floors']} floors capacity {result['capacity']}"
+        lines.setdefault(key, []).append((result["users"], result[metric]))
+    for key, points in lines.items():
+        points.sort()
+        plt.plot([users for users, _ in points], [value for _, value in points], marker="o", label=key)
+    plt.xscale("log")
+    plt.xlabel("Users")
+    plt.ylabel(metric)
+    plt.title(f"{metric} by scenario size")
+    plt.legend()
+    plt.show()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the simulation engine and lift algorithms")
+    parser.add_argument("-f", "--floors", type=int, nargs="+", default=default_floors, help="floor counts")
+    parser.add_argument("-u", "--users", type=int, nargs="+", default=default_users, help="user counts")
+    parser.add_argument("-c", "--capacities", type=int, nargs="+", default=default_capacities,
+                        help="lift capacities")
+    parser.add_argument("-a", "--algorithms", nargs="+", default=registry.get_algorithm_names(),
+                        help="algorithms to benchmark (default: all)")
+    parser.add_argument("--seed", type=int, default=0, help="seed the scenarios are generated with")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs of each case, the fastest is kept")
+    parser.add_argument("-o", "--output", help="file to write the results to as json")
+    parser.add_argument("-b", "--baseline", help="earlier results to check for regressions against")
+    parser.add_argument("-t", "--threshold", type=float, default=0.1,
+                        help="how much worse a metric can get before it is a regression (default: 0.1)")
+    parser.add_argument("-p", "--plot", action="store_true", help="plot steps per second against users")
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmarks(args.floors, args.users, args.capacities, args.algorithms, args.seed,
+                                       args.repeat)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(benchmark_results, f, indent=2)
+        print(f"Results saved to {args.output}")
+    if args.plot:
+        plot_scaling(benchmark_results)
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            found = find_regressions(benchmark_results, json.load(f), args.threshold)
+        for regression in found:
+            print(f"Regression: {regression}")
+        print(f"{len(found)} regressions over {args.threshold:.0%}")
+        sys.exit(1 if len(found) > 0 else 0)
@@ -0,0 +1,151 @@
+import struct
+from array import array
+from typing import BinaryIO, Dict, Iterator, Tuple
+
+import numpy as np
+
+# kinds of event, every event is stored as the same five numbers: kind, time, a, b, c
+moved_up = 1
+moved_down = 2
+doors_opened = 3
+step_finished = 4
+lift_idle = 5
+# how each kind of event is shown, only used when the trace is read
+event_formats = {
+    moved_up: "Going up to floor: {a}",
+    moved_down: "Going down to floor: {a}",
+    doors_opened: "took on: {a}. dropped off: {b}. there are now {c} users in the lift",
+    step_finished: "current time: {time}. users left: {a}",
+    lift_idle: "idle until: {a}",
+}
+# events that are turned on and off together
+categories: Dict[str, Tuple[int, ...]] = {"movement": (moved_up, moved_down), "doors": (doors_opened,),
+                                          "steps": (step_finished, lift_idle)}
+event_dtype = np.dtype([("kind", "=i8"), ("time", "=i8"), ("a", "=i8"), ("b", "=i8"), ("c", "=i8")])
+event_struct = struct.Struct("=5q")
+
+
+class EventTracer:
+    """
+    Records simulation events as fixed shape records of five numbers into a ring buffer that keeps the latest
+    capacity events, or into a binary file. Nothing is formatted until the trace is read. The simulation checks the
+    category flags (movement, doors, steps) before recording anything
+    """
+    movement: bool = False
+    doors: bool = False
+    steps: bool = False
+    capacity: int
+    buffer: array
+    count: int  # events recorded since the buffer was last cleared
+    file: BinaryIO | None = None
+    path: str | None = None
+
+    def __init__(self, capacity: int = 1_000_000):
+        self.capacity = capacity
+        self.clear()
+
+    def is_enabled(self) -> bool:
+        """
+        :return: if any category is being recorded
+        """
+        return self.movement or self.doors or self.steps
+
+    def set_category(self, category: str, enabled: bool):
+        """
+        Turns recording a category of events on or off
+        """
+        if category not in categories:
+            raise Exception(f"Category {category} not found.")
+        setattr(self, category, enabled)
+        if self.is_enabled() and len(self.buffer) == 0:
+            self.clear()
+
+    def set_file(self, path: str | None):
+        """
+        Sends events to a binary file instead of the ring buffer
+        :param path: file to append events to, None to go back to the ring buffer
+        """
+        if self.file is not None:
+            self.file.close()
+        self.file = open(path, "ab") if path is not None else None
+        self.path = path
+
+    def record(self, kind: int, time: int, a: int = 0, b: int = 0, c: int = 0):
+        """
+        Adds an event to the trace
+        :param kind: kind of event, e.g. moved_up
+        :param time: simulation time of the event
+        :param a: first value of the event, see event_formats
+        :param b: second value of the event
+        :param c: third value of the event
+        """
+        if self.file is not None:
+            self.file.write(event_struct.pack(kind, time, a, b, c))
+        else:
+            index = (self.count % self.capacity) * 5
+            buffer = self.buffer
+            buffer[index] = kind
+            buffer[index + 1] = time
+            buffer[index + 2] = a
+            buffer[index + 3] = b
+            buffer[index + 4] = c
+        self.count += 1
+
+    def flush(self):
+        """
+        Makes sure recorded events are in the file
+        """
+        if self.file is not None:
+            self.file.flush()
+
+    def clear(self):
+        """
+        Removes every event from the ring buffer. The buffer is only made once something is being recorded
+        """
+        self.buffer = array("q", bytes(self.capacity * event_dtype.itemsize)) if self.is_enabled() else array("q")
+        self.count = 0
+
+    def get_events(self) -> np.ndarray:
+        """
+        :return: the events in the ring buffer, oldest first, as event_dtype records
+        """
+        events = np.frombuffer(self.buffer, dtype=event_dtype)
+        if self.count <= self.capacity:
+            return events[:self.count].copy()
+        return np.roll(events, -(self.count % self.capacity))
+
+
+def read_file(path: str) -> np.ndarray:
+    """
+    :return: the events in a trace file as event_dtype records
+    """
+    return np.fromfile(path, dtype=event_dtype)
+
+
+def format_event(event: np.void) -> str:
+    """
+    :return: text describing one event
+    """
+    kind = int(event["kind"])
+    category = next(name for name, kinds in categories.items() if kind in kinds)
+    return f"[{category}] " + event_formats[kind].format(time=int(event["time"]), a=int(event["a"]),
+                                                         b=int(event["b"]), c=int(event["c"]))
+
+
+def format_events(events: np.ndarray) -> Iterator[str]:
+    """
+    :return: text describing each event
+    """
+    for event in events:
+        yield format_event(event)
+
+
+tracer = EventTracer()
+
+
+def get_tracer() -> EventTracer | None:
+    """
+    The simulation checks this once per run and skips every event when it is None
+    :return: the tracer if any category is being recorded
+    """
+    return tracer if tracer.is_enabled() else None
@@ -0,0 +1,141 @@
+from typing import Dict, List, Iterator, Iterable
+
+from user import User
+
+# users in the order they joined, kept in a dict so anyone can be removed in O(1) while len and iterating work the same
+# as for a list. Used for the users waiting on a floor and the users in a lift
+OrderedUsers = Dict[User, None]
+
+
+class FloorQueues:
+    """
+    Holds the users waiting on each floor. Keeps an index of which floors have people waiting, updated as users arrive
+    and get on the lift, so algorithms can find waiting users without looking at every floor
+    """
+    floors: List[OrderedUsers]
+    destinations: List[Dict[int, int]]  # how many users waiting on each floor are going to each floor
+    versions: List[int]  # changes whenever a user arrives at or leaves a floor, so summaries of it can be reused
+    total_waiting: int
+    occupied_floors: int
+    occupied_tree: List[int]  # fenwick tree of floors that have someone waiting (1 indexed)
+
+    def __init__(self, total_floors: int):
+        self.floors = [{} for floor in range(total_floors)]
+        self.destinations = [{} for floor in range(total_floors)]
+        self.versions = [0] * total_floors
+        self.total_waiting = 0
+        self.occupied_floors = 0
+        self.occupied_tree = [0] * (total_floors + 1)
+
+    def __len__(self) -> int:
+        return len(self.floors)
+
+    def __getitem__(self, floor: int) -> OrderedUsers:
+        return self.floors[floor]
+
+    def __iter__(self) -> Iterator[OrderedUsers]:
+        return iter(self.floors)
+
+    def add_user(self, user: User):
+        """
+        Adds a newly arrived user to the floor they start on
+        :param user: user that has arrived
+        """
+        floor = self.floors[user.start_floor]
+        if len(floor) == 0:
+            self.update_occupied(user.start_floor, 1)
+        floor[user] = None
+        destinations = self.destinations[user.start_floor]
+        destinations[user.end_floor] = destinations.get(user.end_floor, 0) + 1
+        self.versions[user.start_floor] += 1
+        self.total_waiting += 1
+
+    def remove_users(self, floor: int, users: Iterable[User]):
+        """
+        Removes users that have got on the lift from a floor, taking time only for the users removed
+        :param floor: floor the users are leaving
+        :param users: users to remove
+        """
+        queue = self.floors[floor]
+        if len(queue) == 0:
+            return
+        destinations = self.destinations[floor]
+        for user in users:
+            if user in queue:
+                del queue[user]
+                destinations[user.end_floor] -= 1
+                if destinations[user.end_floor] == 0:
+                    del destinations[user.end_floor]
+                self.total_waiting -= 1
+        self.versions[floor] += 1
+        if len(queue) == 0:
+            self.update_occupied(floor, -1)
+
+    def get_total_waiting(self) -> int:
+        """
+        :return: how many users are waiting on all floors
+        """
+        return self.total_waiting
+
+    def get_waiting_count(self, floor: int) -> int:
+        """
+        :return: how many users are waiting on the given floor
+        """
+        return len(self.floors[floor])
+
+    def get_next_floor_above(self, floor: int) -> int | None:
+        """
+        Finds the closest floor above the given floor that has someone waiting
+        :param floor: floor to search from
+        :return: the floor or None if nobody is waiting above
+        """
+        occupied_below = self.count_occupied_floors(floor + 1)
+        if occupied_below == self.occupied_floors:
+            return None
+        return self.find_occupied_floor(occupied_below + 1)
+
+    def get_next_floor_below(self, floor: int) -> int | None:
+        """
+        Finds the closest floor below the given floor that has someone waiting
+        :param floor: floor to search from
+        :return: the floor or None if nobody is waiting below
+        """
+        occupied_below = self.count_occupied_floors(floor)
+        if occupied_below == 0:
+            return None
+        return self.find_occupied_floor(occupied_below)
+
+    def update_occupied(self, floor: int, change: int):
+        """
+        Marks a floor as having people waiting (change = 1) or being empty (change = -1)
+        """
+        self.occupied_floors += change
+        index = floor + 1
+        while index < len(self.occupied_tree):
+            self.occupied_tree[index] += change
+            index += index & -index
+
+    def count_occupied_floors(self, floor: int) -> int:
+        """
+        :return: how many floors below the given floor have someone waiting
+        """
+        count = 0
+        index = min(floor, len(self.floors))
+        while index > 0:
+            count += self.occupied_tree[index]
+            index -= index & -index
+        return count
+
+    def find_occupied_floor(self, number: int) -> int:
+        """
+        :param number: which occupied floor to find counting from the bottom starting at 1
+        :return: the floor
+        """
+        position = 0
+        step = 1 << (len(self.floors).bit_length() - 1) if len(self.floors) > 0 else 0
+        while step > 0:
+            if position + step <= len(self.floors) and self.occupied_tree[position + step] < number:
+                position += step
+                number -= self.occupied_tree[position]
+            step >>= 1
+        return position
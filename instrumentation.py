@@ -0,0 +1,305 @@
+import json
+from typing import List, Dict
+
+from lift_algorithms.lift import LiftAction, Action
+
+# upper bounds in seconds of the decision time histogram
+decision_buckets = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2, 1e-1)
+
+
+class Subscriber:
+    """
+    Receives events from the hot paths of the simulation (simulate and SimulationGUI.update). Override the events
+    that are needed, times are in nanoseconds
+    """
+
+    def start(self, algorithm: str, source: str):
+        """
+        A run started
+        :param algorithm: name of the algorithm
+        :param source: what is running it, "engine", "multi_car", "feed" or "gui"
+        """
+        pass
+
+    def load(self, nanoseconds: int, user_count: int):
+        """
+        The simulation was loaded
+        """
+        pass
+
+    def decision(self, action: LiftAction, nanoseconds: int, waiting: int, occupants: int):
+        """
+        The algorithm made a decision
+        :param action: the action it chose
+        :param nanoseconds: how long calculate took
+        :param waiting: users waiting on the floors
+        :param occupants: users in the lift
+        """
+        pass
+
+    def doors(self, nanoseconds: int, boarded: int, alighted: int):
+        """
+        The doors opened and the queues and lift occupants were updated
+        :param nanoseconds: how long updating the users took
+        :param boarded: users that got in
+        :param alighted: users that got out
+        """
+        pass
+
+    def idle(self, skipped_time: int):
+        """
+        The lift had nothing to do
+        :param skipped_time: simulation time that passed before the next decision
+        """
+        pass
+
+    def finish(self, end_time: int, nanoseconds: int):
+        """
+        A run finished
+        :param end_time: simulation time at the end
+        :param nanoseconds: how long the run took
+        """
+        pass
+
+
+class Hooks:
+    """Passes events on to every subscriber"""
+    subscribers: List[Subscriber]
+
+    def __init__(self):
+        self.subscribers = []
+
+    def start(self, algorithm: str, source: str):
+        for subscriber in self.subscribers:
+            subscriber.start(algorithm, source)
+
+    def load(self, nanoseconds: int, user_count: int):
+        for subscriber in self.subscribers:
+            subscriber.load(nanoseconds, user_count)
+
+    def decision(self, action: LiftAction, nanoseconds: int, waiting: int, occupants: int):
+        for subscriber in self.subscribers:
+            subscriber.decision(action, nanoseconds, waiting, occupants)
+
+    def doors(self, nanoseconds: int, boarded: int, alighted: int):
+        for subscriber in self.subscribers:
+            subscriber.doors(nanoseconds, boarded, alighted)
+
+    def idle(self, skipped_time: int):
+        for subscriber in self.subscribers:
+            subscriber.idle(skipped_time)
+
+    def finish(self, end_time: int, nanoseconds: int):
+        for subscriber in self.subscribers:
+            subscriber.finish(end_time, nanoseconds)
+
+
+hooks = Hooks()
+
+
+def subscribe(subscriber: Subscriber):
+    """
+    Starts sending simulation events to a subscriber
+    """
+    hooks.subscribers.append(subscriber)
+
+
+def unsubscribe(subscriber: Subscriber):
+    """
+    Stops sending simulation events to a subscriber
+    """
+    hooks.subscribers.remove(subscriber)
+
+
+def get_hooks() -> Hooks | None:
+    """
+    The hot paths check this once and skip every event when it is None, so instrumentation costs nothing when nobody
+    is subscribed
+    :return: the hooks if anything is subscribed
+    """
+    return hooks if len(hooks.subscribers) > 0 else None
+
+
+class MetricsCollector(Subscriber):
+    """Adds up the events of one or more runs and exports them as a json summary or prometheus text"""
+    algorithm: str = ""
+    source: str = ""
+    runs: int
+    load_nanoseconds: int
+    users: int
+    decisions: int
+    decision_nanoseconds: int
+    max_decision_nanoseconds: int
+    decision_histogram: List[int]  # decisions that took at most each of decision_buckets
+    decision_budget: float | None  # seconds each decision should take at most
+    decisions_over_budget: int
+    actions: Dict[str, int]
+    doors_opened: int
+    door_nanoseconds: int
+    boarded: int
+    alighted: int
+    idle_ticks: int
+    idle_time: int
+    waiting_total: int
+    max_waiting: int
+    occupants_total: int
+    max_occupants: int
+    end_time: int
+    run_nanoseconds: int
+
+    def __init__(self, decision_budget: float | None = None):
+        """
+        :param decision_budget: seconds each decision should take at most, decisions that take longer are counted
+        """
+        self.runs = 0
+        self.load_nanoseconds = 0
+        self.users = 0
+        self.decisions = 0
+        self.decision_nanoseconds = 0
+        self.max_decision_nanoseconds = 0
+        self.decision_histogram = [0] * len(decision_buckets)
+        self.decision_budget = decision_budget
+        self.decisions_over_budget = 0
+        self.actions = {action.name: 0 for action in Action}
+        self.doors_opened = 0
+        self.door_nanoseconds = 0
+        self.boarded = 0
+        self.alighted = 0
+        self.idle_ticks = 0
+        self.idle_time = 0
+        self.waiting_total = 0
+        self.max_waiting = 0
+        self.occupants_total = 0
+        self.max_occupants = 0
+        self.end_time = 0
+        self.run_nanoseconds = 0
+
+    def start(self, algorithm: str, source: str):
+        self.algorithm = algorithm
+        self.source = source
+        self.runs += 1
+
+    def load(self, nanoseconds: int, user_count: int):
+        self.load_nanoseconds += nanoseconds
+        self.users += user_count
+
+    def decision(self, action: LiftAction, nanoseconds: int, waiting: int, occupants: int):
+        self.decisions += 1
+        self.decision_nanoseconds += nanoseconds
+        self.max_decision_nanoseconds = max(self.max_decision_nanoseconds, nanoseconds)
+        seconds = nanoseconds / 1e9
+        for index, bucket in enumerate(decision_buckets):
+            if seconds <= bucket:
+                self.decision_histogram[index] += 1
+                break
+        if self.decision_budget is not None and seconds > self.decision_budget:
+            self.decisions_over_budget += 1
+        self.actions[action.action.name] += 1
+        self.waiting_total += waiting
+        self.max_waiting = max(self.max_waiting, waiting)
+        self.occupants_total += occupants
+        self.max_occupants = max(self.max_occupants, occupants)
+
+    def doors(self, nanoseconds: int, boarded: int, alighted: int):
+        self.doors_opened += 1
+        self.door_nanoseconds += nanoseconds
+        self.boarded += boarded
+        self.alighted += alighted
+
+    def idle(self, skipped_time: int):
+        self.idle_ticks += 1
+        self.idle_time += skipped_time
+
+    def finish(self, end_time: int, nanoseconds: int):
+        self.end_time = max(self.end_time, end_time)
+        self.run_nanoseconds += nanoseconds
+
+    def get_summary(self) -> Dict:
+        """
+        :return: everything collected with times in seconds
+        """
+        decisions = max(self.decisions, 1)
+        run_seconds = self.run_nanoseconds / 1e9
+        decision_seconds = self.decision_nanoseconds / 1e9
+        door_seconds = self.door_nanoseconds / 1e9
+        return {
+            "algorithm": self.algorithm, "source": self.source, "runs": self.runs, "users": self.users,
+            "load_seconds": self.load_nanoseconds / 1e9, "run_seconds": run_seconds,
+            "decisions": self.decisions, "decision_seconds": decision_seconds,
+            "mean_decision_us": self.decision_nanoseconds / decisions / 1000,
+            "max_decision_us": self.max_decision_nanoseconds / 1000,
+            "decision_histogram": {str(bucket): count for bucket, count in
+                                   zip(decision_buckets, self.decision_histogram)},
+            "decision_budget_us": None if self.decision_budget is None else self.decision_budget * 1e6,
+            "decisions_over_budget": self.decisions_over_budget,
+            "actions": dict(self.actions),
+            "doors_opened": self.doors_opened, "door_update_seconds": door_seconds,
+            "boarded": self.boarded, "alighted": self.alighted,
+            "idle_ticks": self.idle_ticks, "idle_time": self.idle_time,
+            "mean_waiting": self.waiting_total / decisions, "max_waiting": self.max_waiting,
+            "mean_occupants": self.occupants_total / decisions, "max_occupants": self.max_occupants,
+            "end_time": self.end_time,
+            # where the run time went, the rest is the simulation loop itself
+            "other_seconds": max(run_seconds - decision_seconds - door_seconds, 0),
+        }
+
+    def write_json(self, path: str):
+        """
+        Saves the summary as json
+        """
+        with open(path, "w") as f:
+            json.dump(self.get_summary(), f, indent=2)
+
+    def get_prometheus_text(self) -> str:
+        """
+        :return: the metrics in the prometheus text format
+        """
+        labels = f'algorithm="{self.algorithm}",source="{self.source}"'
+        lines = []
+
+        def add(name: str, metric_type: str, description: str, values: List[tuple]):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for suffix, extra_labels, value in values:
+                lines.append(f"{name}{suffix}{{{labels}{extra_labels}}} {value}")
+
+        add("lift_runs_total", "counter", "Simulation runs.", [("", "", self.runs)])
+        add("lift_load_seconds_total", "counter", "Time spent loading simulations.",
+            [("", "", self.load_nanoseconds / 1e9)])
+        add("lift_run_seconds_total", "counter", "Time spent running simulations.",
+            [("", "", self.run_nanoseconds / 1e9)])
+        cumulative = 0
+        buckets = []
+        for bucket, count in zip(decision_buckets, self.decision_histogram):
+            cumulative += count
+            buckets.append(("_bucket", f',le="{bucket}"', cumulative))
+        buckets.append(("_bucket", ',le="+Inf"', self.decisions))
+        add("lift_decision_seconds", "histogram", "Time spent in algorithm.calculate.",
+            buckets + [("_sum", "", self.decision_nanoseconds / 1e9), ("_count", "", self.decisions)])
+        if self.decision_budget is not None:
+            add("lift_decision_budget_seconds", "gauge", "Time each decision should take at most.",
+                [("", "", self.decision_budget)])
+            add("lift_decisions_over_budget_total", "counter", "Decisions that took longer than the budget.",
+                [("", "", self.decisions_over_budget)])
+        add("lift_actions_total", "counter", "Actions chosen by the algorithm.",
+            [("", f',action="{action}"', count) for action, count in self.actions.items()])
+        add("lift_doors_opened_total", "counter", "Times the doors opened.", [("", "", self.doors_opened)])
+        add("lift_door_update_seconds_total", "counter", "Time spent updating queues and occupants at the doors.",
+            [("", "", self.door_nanoseconds / 1e9)])
+        add("lift_users_boarded_total", "counter", "Users that got in the lift.", [("", "", self.boarded)])
+        add("lift_users_alighted_total", "counter", "Users that got out of the lift.", [("", "", self.alighted)])
+        add("lift_idle_ticks_total", "counter", "Decisions where the lift had nothing to do.",
+            [("", "", self.idle_ticks)])
+        add("lift_idle_time_total", "counter", "Simulation time the lift spent idle.", [("", "", self.idle_time)])
+        add("lift_waiting_users_max", "gauge", "Most users waiting at once.", [("", "", self.max_waiting)])
+        add("lift_waiting_users_mean", "gauge", "Mean users waiting at each decision.",
+            [("", "", self.waiting_total / max(self.decisions, 1))])
+        add("lift_occupants_max", "gauge", "Most users in the lift at once.", [("", "", self.max_occupants)])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """
+        Saves the metrics as a prometheus text file
+        """
+        with open(path, "w") as f:
+            f.write(self.get_prometheus_text())
@@ -1,8 +1,6 @@
-from typing import List
-
+from floor_queues import FloorQueues, OrderedUsers
 from lift_algorithms.SCAN import ScanAlgorithm
 from lift_algorithms.lift import LiftAction, Action, get_can_drop_off
-from user import User
 
 
 class LookAlgorithm(ScanAlgorithm):
@@ -12,7 +10,7 @@ class LookAlgorithm(ScanAlgorithm):
         super().__init__()
         self.name = "LOOK"
 
-    def calculate(self, lift_occupants: List[User], floors: List[List[User]], current_time: int,
+    def calculate(self, lift_occupants: OrderedUsers, floors: FloorQueues, current_time: int,
                   current_floor: int) -> LiftAction:
         """works out the next best move the algorithm can make"""
 
@@ -30,7 +28,7 @@ class LookAlgorithm(ScanAlgorithm):
 
         return output
 
-    def should_change_direction(self, floors: List[List[User]], current_floor: int, lift_occupants: List[User]) -> bool:
+    def should_change_direction(self, floors: FloorQueues, current_floor: int, lift_occupants: OrderedUsers) -> bool:
         """adds an extra reason to change the current direction over SCAN algorithm"""
         # see if anybody can be dropped off
         drop_off = get_can_drop_off(current_floor, lift_occupants)
@@ -40,15 +38,16 @@ class LookAlgorithm(ScanAlgorithm):
                 # makesure that nobody is about to get on and go up
                 going_up = all(user.end_floor > user.end_floor for user in floors[current_floor])
                 # check if floors above have people waiting
-                empty_above = all(len(floors[floor]) == 0 for floor in range(current_floor + 1, len(floors)))
+                empty_above = floors.get_next_floor_above(current_floor) is None
                 if going_up and empty_above:
                     return True
             else:
                 # makesure that nobody is about to get on and go down
                 going_down = all(user.end_floor < user.end_floor for user in floors[current_floor])
                 # check if people are waiting below
-                empty_above = all(len(floors[floor]) == 0 for floor in range(current_floor, -1, -1))
-                if going_down and empty_above:
+                empty_below = floors.get_waiting_count(current_floor) == 0 and floors.get_next_floor_below(
+                    current_floor) is None
+                if going_down and empty_below:
                     return True
 
         return super().should_change_direction(floors, current_floor, lift_occupants)
@@ -0,0 +1,411 @@
+import bisect
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from floor_queues import FloorQueues, OrderedUsers
+from lift_algorithms.LOOK import LookAlgorithm
+from lift_algorithms.lift import LiftAction, Action, BaseLiftAlgorithm, get_can_drop_off
+
+# users waiting in one queue: (start floor * 2 + going down, ((floor going to, how many), ...) sorted by floor,
+#  how many are waiting, floors they have to travel added up, hash of the queue id and floors going to)
+Queue = Tuple[int, Tuple[Tuple[int, int], ...], int, int, int]
+# (floor, going up, last action opened the doors, floors the users in the lift are going to sorted, queues sorted,
+#  users waiting, hashes of the queues combined). States are looked up by the combined hash and the queues are only
+#  compared on a hit
+State = Tuple[int, bool, bool, Tuple[int, ...], Tuple[Queue, ...], int, int]
+# the action, how many users going up get in and how many going down get in
+Step = Tuple[Action, int, int]
+# part of the time budget spent searching
+search_share = 0.8
+
+
+class LookaheadAlgorithm(BaseLiftAlgorithm):
+    """
+    Lift algorithm that tries every sequence of actions a few steps ahead and picks the one with the least projected
+    time spent by everyone waiting and in the lift, within the rules LOOK follows. The search deepens one step at a
+    time until its work budget runs out, so the same users always get the same decisions. A time budget can be given
+    as a safety cap for real time use, a decision that runs out of time or cannot search one step ahead is made the
+    way LOOK would make it, which makes runs depend on how fast the computer is.
+    What the lift can see is summed up as how many users on each floor are going to each floor, and states are scored
+    in a transposition cache that is kept between decisions, so the part of the search the lift moves into is not
+    done again
+    """
+    max_depth: int
+    work_budget: int  # states each decision can search, weighted by how many queues they have
+    time_budget: float | None  # seconds each decision can take at most, None to never stop on time
+    max_cache_entries: int
+    floor_count: int
+    floor_time: int
+    first_pickup_time: int
+    extra_pickup_time: int
+    # queues, score and best step of each state and depth, oldest first
+    cache: OrderedDict[tuple, Tuple[Tuple[Queue, ...], float, Step | None]]
+    floor_queues: FloorQueues | None  # floors the queue summaries were made from
+    queue_summaries: Dict[int, Tuple[int, List[Queue]]]  # version of each floor and the queues waiting on it
+    look: LookAlgorithm
+    direction: bool  # true == up
+    last_opened: bool
+    deadline: float
+    work_left: int
+    out_of_time: bool
+    # how the searches went
+    decisions: int
+    depth_total: int
+    cache_hits: int
+    fallbacks: int  # decisions made by LOOK
+
+    def __init__(self, max_depth: int = 12, work_budget: int = 200, time_budget: float | None = None,
+                 max_cache_entries: int = 200_000, constants: Dict[str, int] | None = None):
+        if constants is None:
+            with open("data/constants.json", "r") as f:
+                constants = json.load(f)
+        self.name = "LOOKAHEAD"
+        self.max_depth = max_depth
+        self.work_budget = work_budget
+        self.time_budget = time_budget
+        # a decision cut short by the time budget depends on how fast the computer is
+        self.deterministic = time_budget is None
+        self.max_cache_entries = max_cache_entries
+        self.floor_count = 0
+        self.floor_time = constants["time between floors"]
+        self.first_pickup_time = constants["first pickup time"]
+        self.extra_pickup_time = constants["extra pickup time"]
+        self.cache = OrderedDict()
+        self.floor_queues = None
+        self.queue_summaries = {}
+        self.look = LookAlgorithm()
+        self.direction = True
+        self.last_opened = False
+        self.deadline = 0
+        self.work_left = 0
+        self.out_of_time = False
+        self.decisions = 0
+        self.depth_total = 0
+        self.cache_hits = 0
+        self.fallbacks = 0
+
+    def set_capacity(self, capacity: int):
+        """
+        Used to set the maximum capacity of the lift algorithm
+        :param capacity: capacity of the lift algorithm
+        """
+        self.capacity = capacity
+        self.look.set_capacity(capacity)
+        self.cache.clear()
+
+    def calculate(self, lift_occupants: OrderedUsers, floors: FloorQueues, current_time: int,
+                  current_floor: int) -> LiftAction:
+        """works out the next best move the algorithm can make"""
+        # the search stops early enough to finish the state it is on and build the action inside the budget
+        self.deadline = time.perf_counter_ns() + int(self.time_budget * search_share * 1e9) \
+            if self.time_budget is not None else float("inf")
+        if floors.get_total_waiting() == 0 and len(lift_occupants) == 0:
+            self.last_opened = False
+            return LiftAction(Action.idle, [], [])
+        # scores only hold for one building and lift capacity
+        if len(floors) != self.floor_count:
+            self.cache.clear()
+            self.floor_count = len(floors)
+        # the oldest scores are dropped a few at a time, clearing a full cache at once takes longer than a decision
+        while len(self.cache) > self.max_cache_entries:
+            self.cache.popitem(last=False)
+
+        self.out_of_time = False
+        self.work_left = self.work_budget
+        state = self.get_state(lift_occupants, floors, current_floor)
+        step = None
+        depth = 0
+        while state is not None and depth < self.max_depth:
+            _, found = self.search(state, depth + 1)
+            if self.out_of_time:
+                break
+            step = found
+            depth += 1
+        self.decisions += 1
+        self.depth_total += depth
+        if step is None:
+            return self.get_look_action(lift_occupants, floors, current_time, current_floor)
+
+        action, getting_up, getting_down = step
+        self.last_opened = action == Action.open_doors
+        if action == Action.open_doors:
+            return LiftAction(Action.open_doors,
+                              self.get_boarding(floors[current_floor], current_floor, getting_up, getting_down),
+                              get_can_drop_off(current_floor, lift_occupants))
+        self.direction = action == Action.move_up
+        return LiftAction(action)
+
+    def get_look_action(self, lift_occupants: OrderedUsers, floors: FloorQueues, current_time: int,
+                        current_floor: int) -> LiftAction:
+        """
+        :return: the action LOOK would take, used when there is no time to search
+        """
+        self.fallbacks += 1
+        self.look.direction = self.direction
+        output = self.look.calculate(lift_occupants, floors, current_time, current_floor)
+        self.direction = self.look.direction
+        self.last_opened = output.action == Action.open_doors
+        return output
+
+    def get_boarding(self, waiting: OrderedUsers, floor: int, getting_up: int, getting_down: int) -> List:
+        """
+        :return: the users that get in, going up and going down the shortest trips get in first as the search expects
+            and users going to the same floor get in in the order they arrived
+        """
+        wanted = {}
+        for queue, count in ((floor * 2, getting_up), (floor * 2 + 1, getting_down)):
+            if count > 0:
+                for end_floor, taken in self.get_queue_boarding(self.get_floor_queues(floor).get(queue), count)[0]:
+                    wanted[end_floor] = taken
+        boarding = []
+        remaining = getting_up + getting_down
+        for user in waiting:
+            if remaining == 0:
+                break
+            if wanted.get(user.end_floor, 0) > 0:
+                wanted[user.end_floor] -= 1
+                remaining -= 1
+                boarding.append(user)
+        return boarding
+
+    def get_floor_queues(self, floor: int) -> Dict[int, Queue]:
+        """
+        :return: the queues waiting on a floor from the last summary of it
+        """
+        return {queue[0]: queue for queue in self.queue_summaries[floor][1]}
+
+    @staticmethod
+    def get_queue_boarding(queue: Queue, count: int) -> Tuple[List[Tuple[int, int]], Queue | None]:
+        """
+        Takes the users with the shortest trips out of a queue
+        :param queue: queue to take from
+        :param count: how many users get in
+        :return: the floors the users getting in are going to with how many and what is left of the queue
+        """
+        queue_id, destinations, waiting, travel, _ = queue
+        start_floor = queue_id >> 1
+        # going down the nearest floors are at the end
+        ordered = destinations[::-1] if queue_id & 1 else destinations
+        boarding = []
+        left = count
+        for end_floor, number in ordered:
+            if left == 0:
+                break
+            taken = min(left, number)
+            boarding.append((end_floor, taken))
+            left -= taken
+        if count == waiting:
+            return boarding, None
+        remaining = dict(destinations)
+        for end_floor, taken in boarding:
+            remaining[end_floor] -= taken
+            travel -= abs(end_floor - start_floor) * taken
+        left_destinations = tuple((end_floor, number) for end_floor, number in sorted(remaining.items()) if number > 0)
+        return boarding, (queue_id, left_destinations, waiting - count, travel, hash((queue_id, left_destinations)))
+
+    def get_state(self, lift_occupants: OrderedUsers, floors: FloorQueues, current_floor: int) -> State | None:
+        """
+        Summaries of the floors are kept between decisions and only made again for floors where someone arrived or
+        left, so this takes time for the floors with someone waiting rather than every user
+        :return: the compact signature of what the lift can see, the same signature always scores the same. None if
+            the time budget ran out
+        """
+        if floors is not self.floor_queues:
+            self.floor_queues = floors
+            self.queue_summaries.clear()
+        queues = []
+        queues_key = 0
+        floor = floors.get_next_floor_above(-1) if floors.get_total_waiting() > 0 else None
+        while floor is not None:
+            if time.perf_counter_ns() > self.deadline:
+                self.out_of_time = True
+                return None
+            summary = self.queue_summaries.get(floor)
+            if summary is None or summary[0] != floors.versions[floor]:
+                summary = (floors.versions[floor], self.get_summary(floor, floors.destinations[floor]))
+                self.queue_summaries[floor] = summary
+            for queue in summary[1]:
+                queues.append(queue)
+                queues_key ^= queue[4]
+            floor = floors.get_next_floor_above(floor)
+        return (current_floor, self.direction, self.last_opened, tuple(sorted(user.end_floor for user in lift_occupants)),
+                tuple(queues), floors.get_total_waiting(), queues_key)
+
+    @staticmethod
+    def get_summary(floor: int, destinations: Dict[int, int]) -> List[Queue]:
+        """
+        :return: the queues going up and down from a floor
+        """
+        queues = []
+        for queue_id, going in ((floor * 2, [end_floor for end_floor in destinations if end_floor > floor]),
+                                (floor * 2 + 1, [end_floor for end_floor in destinations if end_floor < floor])):
+            if len(going) > 0:
+                going.sort()
+                queue_destinations = tuple((end_floor, destinations[end_floor]) for end_floor in going)
+                queues.append((queue_id, queue_destinations, sum(destinations[end_floor] for end_floor in going),
+                               sum(abs(end_floor - floor) * destinations[end_floor] for end_floor in going),
+                               hash((queue_id, queue_destinations))))
+        return queues
+
+    def get_children(self, state: State) -> List[Tuple[Step, State, int]]:
+        """
+        :return: every step that can be taken from a state, the state after it and the time everyone spends on it.
+            Opening the doors comes first then moving in the current direction so ties keep the lift going. Moving
+            when LOOK would stop and turning round when LOOK would not are left out, otherwise a short search would
+            rather go back and forth than make everyone wait for the doors. What is left to choose is who gets in, when
+            to turn round early and which way to go
+        """
+        floor, going_up, last_opened, occupants, queues, total_waiting, queues_key = state
+        people = len(occupants) + total_waiting
+        children = []
+        # open the doors, everyone going to the floor gets out and the shortest trips going up, down or both get in
+        staying = tuple(end_floor for end_floor in occupants if end_floor != floor)
+        dropped = len(occupants) - len(staying)
+        room = self.capacity - len(staying)
+        index = bisect.bisect_left(queues, (floor * 2,))
+        up_queue = queues[index] if index < len(queues) and queues[index][0] == floor * 2 else None
+        down_index = index + (up_queue is not None)
+        down_queue = queues[down_index] if down_index < len(queues) and queues[down_index][0] == floor * 2 + 1 \
+            else None
+        waiting_up = up_queue[2] if up_queue is not None else 0
+        waiting_down = down_queue[2] if down_queue is not None else 0
+        up_first = min(room, waiting_up)
+        down_first = min(room, waiting_down)
+        options = sorted({(up_first, min(room - up_first, waiting_down)), (min(room - down_first, waiting_up), down_first),
+                          (up_first, 0), (0, down_first), (0, 0)}, reverse=True)
+        for getting_up, getting_down in options:
+            if dropped + getting_up + getting_down == 0:
+                continue
+            new_occupants = list(staying)
+            floor_queues = []
+            new_key = queues_key
+            for queue, count in ((up_queue, getting_up), (down_queue, getting_down)):
+                if count == 0:
+                    if queue is not None:
+                        floor_queues.append(queue)
+                    continue
+                boarding, left = self.get_queue_boarding(queue, count)
+                for end_floor, taken in boarding:
+                    new_occupants.extend((end_floor,) * taken)
+                new_key ^= queue[4]
+                if left is not None:
+                    floor_queues.append(left)
+                    new_key ^= left[4]
+            new_occupants.sort()
+            duration = (0 if last_opened else self.first_pickup_time) + self.extra_pickup_time * (
+                    dropped + getting_up + getting_down)
+            # users getting out stop counting when the doors open
+            children.append(((Action.open_doors, getting_up, getting_down),
+                             (floor, going_up, True, tuple(new_occupants),
+                              queues[:index] + tuple(floor_queues) + queues[down_index + (down_queue is not None):],
+                              total_waiting - getting_up - getting_down, new_key),
+                             duration * (people - dropped)))
+
+        # move, like LOOK the lift never turns round while someone in it is going further and otherwise only after
+        # opening the doors or when there is nothing left ahead of it
+        def is_ahead(stop: int) -> bool:
+            return stop > floor if going_up else stop < floor
+
+        can_turn = not any(is_ahead(end_floor) for end_floor in occupants) and (
+                last_opened or not any(is_ahead(queue[0] >> 1) for queue in queues))
+        # like LOOK the lift always stops to let users out and to let users in that are going the way it can go
+        waiting_ahead, waiting_behind = (waiting_up, waiting_down) if going_up else (waiting_down, waiting_up)
+        if not last_opened and (dropped > 0 or room > 0 and (waiting_ahead > 0 or can_turn and waiting_behind > 0)):
+            return children
+        moves = [(Action.move_up, floor + 1), (Action.move_down, floor - 1)]
+        if not going_up:
+            moves.reverse()
+        if not can_turn:
+            moves.pop()
+        for action, new_floor in moves:
+            if 0 <= new_floor < self.floor_count:
+                children.append(((action, 0, 0), (new_floor, action == Action.move_up, False, occupants, queues,
+                                                  total_waiting, queues_key), self.floor_time * people))
+        return children
+
+    def get_estimate(self, state: State) -> float:
+        """
+        Every user is taken to be reached the way LOOK would reach them, carrying on in the current direction to the
+        furthest floor anyone is waiting at or going to and then turning round, stopping on the way at every floor
+        someone is waiting at or someone in the lift is going to. Users in the lift have that long left to travel and
+        waiting users have to wait that long then travel to their floor stopping at the floors in between. Counting the
+        stops keeps the estimate falling by about as much as the time a step takes, otherwise a short search never sees
+        the point of opening the doors
+        :return: an estimate of the time everyone still has to spend, 0 if the time budget ran out
+        """
+        floor, going_up, last_opened, occupants, queues, _, _ = state
+        stop_floors = set(occupants)
+        top = max(floor, occupants[-1]) if len(occupants) > 0 else floor
+        bottom = min(floor, occupants[0]) if len(occupants) > 0 else floor
+        for queue_id, destinations, _, _, _ in queues:
+            stop_floors.add(queue_id >> 1)
+            top = max(top, queue_id >> 1, destinations[-1][0])
+            bottom = min(bottom, queue_id >> 1, destinations[0][0])
+
+        def get_sweep_distance(target: int) -> int:
+            if going_up:
+                return target - floor if target >= floor else top - floor + top - target
+            return floor - target if target <= floor else floor - bottom + target - bottom
+
+        # how far along the sweep each stop is, the doors are already open at the current floor after opening them
+        sweep_stops = sorted(get_sweep_distance(stop_floor) for stop_floor in stop_floors
+                             if not (last_opened and stop_floor == floor))
+        floor_stops = sorted(stop_floors)
+
+        def get_arrival_time(target: int) -> int:
+            distance = get_sweep_distance(target)
+            return distance * self.floor_time + bisect.bisect_right(sweep_stops, distance) * self.first_pickup_time
+
+        estimate = sum(get_arrival_time(end_floor) for end_floor in occupants)
+        estimate += len(occupants) * self.extra_pickup_time
+        for index, (queue_id, _, waiting, travel, _) in enumerate(queues):
+            if index & 63 == 63 and time.perf_counter_ns() > self.deadline:
+                self.out_of_time = True
+                return 0
+            start_floor = queue_id >> 1
+            estimate += (get_arrival_time(start_floor) + self.extra_pickup_time * 2) * waiting
+            # the floors in between are counted up to how far the users travel on average
+            end_floor = start_floor + (-1 if queue_id & 1 else 1) * (travel // waiting)
+            low, high = min(start_floor, end_floor), max(start_floor, end_floor)
+            stops = bisect.bisect_right(floor_stops, high) - bisect.bisect_right(floor_stops, low)
+            estimate += travel * self.floor_time + stops * self.first_pickup_time * waiting
+        return estimate
+
+    def search(self, state: State, depth: int) -> Tuple[float, Step | None]:
+        """
+        Depth first search of every sequence of steps from a state, reusing scores from the cache. Each state searched
+        or estimated takes one more than its number of queues from the work budget
+        :param state: state to search from
+        :param depth: how many steps to look ahead
+        :return: the least projected time and the first step of the sequence that gets it
+        """
+        floor, going_up, last_opened, occupants, queues, _, queues_key = state
+        # only scores searched to the same depth can be compared, deeper searches add up more time
+        key = (floor, going_up, last_opened, occupants, queues_key, depth)
+        cached = self.cache.get(key)
+        # two different states can have the same hash
+        if cached is not None and cached[0] == queues:
+            self.cache_hits += 1
+            return cached[1], cached[2]
+        if len(occupants) == 0 and len(queues) == 0:
+            return 0, (Action.idle, 0, 0)
+        self.work_left -= len(queues) + 1
+        if self.work_left < 0 or time.perf_counter_ns() > self.deadline:
+            self.out_of_time = True
+            return 0, None
+        if depth == 0:
+            return self.get_estimate(state), None
+
+        best_score = float("inf")
+        best_step = None
+        for step, child, cost in self.get_children(state):
+            score, _ = self.search(child, depth - 1)
+            if self.out_of_time:
+                return 0, None
+            if cost + score < best_score:
+                best_score = cost + score
+                best_step = step
+        self.cache[key] = (queues, best_score, best_step)
+        return best_score, best_step
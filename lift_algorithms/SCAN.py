@@ -1,7 +1,5 @@
-from typing import List
-
+from floor_queues import FloorQueues, OrderedUsers
 from lift_algorithms.lift import LiftAction, Action, BaseLiftAlgorithm, get_can_drop_off
-from simulation_handler import User
 
 
 class ScanAlgorithm(BaseLiftAlgorithm):
@@ -14,34 +12,34 @@ class ScanAlgorithm(BaseLiftAlgorithm):
         self.direction = True
         self.name = "SCAN"
 
-    def calculate(self, lift_occupants: List[User], floors: List[List[User]], current_time: int,
+    def calculate(self, lift_occupants: OrderedUsers, floors: FloorQueues, current_time: int,
                   current_floor: int) -> LiftAction:
         """works out the next best move the algorithm can make"""
         # see if anybody can be dropped off
         drop_off = get_can_drop_off(current_floor, lift_occupants)
         # see if anybody can be picked up
         pick_up = []
+        # does not depend on the user so only work it out once
+        change_direction = len(floors[current_floor]) > 0 and self.should_change_direction(floors, current_floor,
+                                                                                            lift_occupants)
         for user in floors[current_floor]:
             # stop trying to pickup if there is no room
             if len(pick_up) + len(lift_occupants) - len(drop_off) >= self.capacity:
                 break
             # if lift is going up and there is a user that also wants to take them up
-            if user.end_floor > current_floor and self.direction or self.should_change_direction(floors, current_floor,
-                                                                                                 lift_occupants):
+            if user.end_floor > current_floor and self.direction or change_direction:
                 pick_up.append(user)
             # if lift is going down and there is a user that also wants to go down take them or the lift is about to go up
-            elif user.end_floor < current_floor and not self.direction or self.should_change_direction(floors,
-                                                                                                       current_floor,
-                                                                                                       lift_occupants):
+            elif user.end_floor < current_floor and not self.direction or change_direction:
                 pick_up.append(user)
 
         # based on if lift can do somthing at the floor decide what to do next
         if len(pick_up) > 0 or len(drop_off) > 0:
             return LiftAction(Action.open_doors, pick_up, drop_off)
 
-        # make sure there is a person to move to
-        if all(len(floor) == 0 for floor in floors) and len(lift_occupants) == 0:
-            return LiftAction(Action.wait, [], [])
+        # make sure there is a person to move to otherwise wait for the next user to arrive
+        if floors.get_total_waiting() == 0 and len(lift_occupants) == 0:
+            return LiftAction(Action.idle, [], [])
 
         # otherwise move
         if self.should_change_direction(floors, current_floor, lift_occupants):
@@ -51,7 +49,7 @@ class ScanAlgorithm(BaseLiftAlgorithm):
         else:
             return LiftAction(Action.move_down)
 
-    def should_change_direction(self, floors: List[List[User]], current_floor: int, lift_occupants: List[User]) -> bool:
+    def should_change_direction(self, floors: FloorQueues, current_floor: int, lift_occupants: OrderedUsers) -> bool:
         if self.direction:
             return current_floor == len(floors) - 1
         else:
@@ -0,0 +1,61 @@
+import numpy as np
+
+from user import User
+
+
+class CarBank:
+    """
+    State of every car in a bank of lifts. Stored as arrays so a dispatcher can look at all the cars at once
+    """
+    floors: np.ndarray
+    directions: np.ndarray  # 1 == up, -1 == down, 0 == idle
+    occupants: np.ndarray  # how many users are in each car
+    waiting: np.ndarray  # how many users assigned to each car have not been picked up yet
+    capacity: int
+    total_floors: int
+
+    def __init__(self, car_count: int, start_floor: int, capacity: int, total_floors: int):
+        self.floors = np.full(car_count, start_floor, dtype=np.int64)
+        self.directions = np.zeros(car_count, dtype=np.int64)
+        self.occupants = np.zeros(car_count, dtype=np.int64)
+        self.waiting = np.zeros(car_count, dtype=np.int64)
+        self.capacity = capacity
+        self.total_floors = total_floors
+
+    def __len__(self) -> int:
+        return len(self.floors)
+
+
+class BaseDispatcher:
+    """Decides which car in a bank of lifts answers each new hall call. Each car then runs its own lift algorithm"""
+    name: str
+
+    def assign(self, user: User, cars: CarBank) -> int:
+        """
+        Picks the car that will collect a user that has just arrived
+        :param user: the new user
+        :param cars: current state of all the cars
+        :return: index of the chosen car
+        """
+        pass
+
+
+class NearestCarDispatcher(BaseDispatcher):
+    """
+    Sends each call to the car with the lowest estimated cost. The cost is the distance to the user plus a penalty
+    when the car is heading away from them and for every user the car already has to deal with
+    """
+    load_weight: float
+
+    def __init__(self, load_weight: float = 1):
+        self.name = "nearest car"
+        self.load_weight = load_weight
+
+    def assign(self, user: User, cars: CarBank) -> int:
+        """works out the cheapest car for the user"""
+        distance = np.abs(cars.floors - user.start_floor)
+        heading_away = ((cars.directions > 0) & (cars.floors > user.start_floor)) | (
+                (cars.directions < 0) & (cars.floors < user.start_floor))
+        cost = distance + heading_away * 2 * (cars.total_floors - 1) + self.load_weight * (
+                cars.occupants + cars.waiting)
+        return int(np.argmin(cost))
@@ -1,16 +1,19 @@
 from enum import Enum
 from typing import List
+from floor_queues import FloorQueues, OrderedUsers
 from user import User
 
 
 class Action(Enum):
     """
-    the 4 options a lift algorithm has
+    the 5 options a lift algorithm has
     """
     move_up = 1
     move_down = 2
     open_doors = 3
     wait = 4
+    # like wait but tells the simulation nothing will change until the next user arrives
+    idle = 5
 
 
 class LiftAction:
@@ -27,7 +30,7 @@ class LiftAction:
         self.remove = remove
 
 
-def get_can_drop_off(current_floor: int, lift_occupants: List[User]) -> List[User]:
+def get_can_drop_off(current_floor: int, lift_occupants: OrderedUsers) -> List[User]:
     """returns list of users that could be dropped of at the current floor"""
     drop_off = []
     for lift_occupant in lift_occupants:
@@ -40,6 +43,8 @@ class BaseLiftAlgorithm:
     """Basic parts needed for a lift algorithm to be able to be simulated. When simulating a lift it is assumed that a class inherited from this one"""
     capacity: int
     name: str
+    # the same users always get the same decisions, algorithms that depend on how long they take to decide are not
+    deterministic: bool = True
 
     def set_capacity(self, capacity: int):
         """
@@ -48,12 +53,13 @@ class BaseLiftAlgorithm:
         """
         self.capacity = capacity
 
-    def calculate(self, lift_occupants: List[User], floors: List[List[User]], current_time: int,
+    def calculate(self, lift_occupants: OrderedUsers, floors: FloorQueues, current_time: int,
                   current_floor: int) -> LiftAction:
         """
-        Main part of the lift algorithm. The lift is given the state of the system and needs to return its next action based on how the algorithm works
+        Main part of the lift algorithm. The lift is given the state of the system and needs to return its next action based on how the algorithm works.
+        Return Action.idle instead of Action.wait when the algorithm will keep waiting until a new user arrives so the simulation can skip ahead
         :param lift_occupants:
-        :param floors:
+        :param floors: users waiting on each floor along with an index of which floors have people waiting
         :param current_time:
         :param current_floor:
         :return:
@@ -0,0 +1,55 @@
+import importlib
+import os
+from typing import Dict, List, Type
+
+from lift_algorithms.lift import BaseLiftAlgorithm
+
+# name of every algorithm and the module it is in, the modules are only imported when the algorithm is used.
+# Every module in lift_algorithms with an upper case name (e.g. LOOK.py) is an algorithm with that name
+algorithm_modules: Dict[str, str] = {
+    name[:-3]: f"lift_algorithms.{name[:-3]}" for name in sorted(os.listdir(os.path.dirname(__file__)))
+    if name.endswith(".py") and name[:-3].isupper()
+}
+# algorithms that have been imported
+algorithm_classes: Dict[str, Type[BaseLiftAlgorithm]] = {}
+
+
+def register_algorithm(name: str, module: str):
+    """
+    Adds an algorithm that is not in the lift_algorithms folder
+    :param name: name the algorithm is chosen by
+    :param module: module the algorithm class is in, e.g. "my_lifts.express"
+    """
+    algorithm_modules[name] = module
+    algorithm_classes.pop(name, None)
+
+
+def get_algorithm_names() -> List[str]:
+    """
+    :return: name of every algorithm that can be used
+    """
+    return list(algorithm_modules)
+
+
+def get_algorithm_class(name: str) -> Type[BaseLiftAlgorithm]:
+    """
+    Imports the module of an algorithm the first time it is used and finds the lift algorithm defined in it
+    :return: the class of the algorithm
+    """
+    if name not in algorithm_classes:
+        if name not in algorithm_modules:
+            raise Exception(f"Algorithm {name} not found.")
+        module = importlib.import_module(algorithm_modules[name])
+        found = [value for value in vars(module).values() if isinstance(value, type) and
+                 issubclass(value, BaseLiftAlgorithm) and value.__module__ == module.__name__]
+        if len(found) != 1:
+            raise Exception(f"Module {module.__name__} must define exactly one lift algorithm.")
+        algorithm_classes[name] = found[0]
+    return algorithm_classes[name]
+
+
+def create_algorithm(name: str) -> BaseLiftAlgorithm:
+    """
+    :return: a new instance of an algorithm
+    """
+    return get_algorithm_class(name)()
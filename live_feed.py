@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import socket
+import stat
+import sys
+import time
+from typing import Iterator, Iterable, List, Tuple, Dict, TextIO
+
+import instrumentation
+from floor_queues import FloorQueues, OrderedUsers
+from lift_algorithms import registry
+from lift_algorithms.lift import LiftAction, Action, BaseLiftAlgorithm
+from user import User
+
+
+class Feed:
+    """
+    Reads arrivals from lines of text only when the lift needs to know about them, so a live feed is followed as it
+    happens and a recorded log of any length is never loaded at once. Each line is "time,start floor,end floor" for a
+    user arriving, or just "time" to say nobody else arrives before then so the lift can carry on without waiting for
+    the next arrival. Lines must be in time order, blank lines and lines starting with # are skipped
+    """
+    lines: Iterator[str]
+    total_floors: int
+    pending: User | None  # the first arrival read that has not happened yet
+    known_time: int  # every arrival before this time has been read
+    closed: bool
+    user_count: int
+
+    def __init__(self, lines: Iterable[str], total_floors: int):
+        self.lines = iter(lines)
+        self.total_floors = total_floors
+        self.pending = None
+        self.known_time = 0
+        self.closed = False
+        self.user_count = 0
+
+    def read(self):
+        """
+        Reads the next line, waiting for it if the feed is live
+        """
+        line = next(self.lines, None)
+        if line is None:
+            self.closed = True
+            return
+        parts = line.replace(",", " ").split()
+        if len(parts) == 0 or parts[0].startswith("#"):
+            return
+        if len(parts) not in (1, 3):
+            raise Exception(f"Feed line {line.strip()} should be time,start floor,end floor or time.")
+        arrival_time = int(parts[0])
+        if arrival_time < self.known_time:
+            raise Exception(f"Feed line {line.strip()} is before time {self.known_time}.")
+        self.known_time = arrival_time
+        if len(parts) == 1:
+            return
+        start_floor, end_floor = int(parts[1]), int(parts[2])
+        if not (0 <= start_floor < self.total_floors and 0 <= end_floor < self.total_floors) or \
+                start_floor == end_floor:
+            raise Exception(f"Feed line {line.strip()} is not a trip between two floors of the building.")
+        self.pending = User(self.user_count, start_floor, end_floor, arrival_time)
+        self.user_count += 1
+
+    def get_arrivals(self, current_time: int) -> List[User]:
+        """
+        :return: every user that arrived by the current time and has not been returned yet
+        """
+        arrivals = []
+        while True:
+            if self.pending is not None:
+                if self.pending.start_time > current_time:
+                    return arrivals
+                arrivals.append(self.pending)
+                self.pending = None
+            elif self.closed or self.known_time > current_time:
+                return arrivals
+            else:
+                self.read()
+
+    def get_next_arrival_time(self) -> int | None:
+        """
+        Waits for the next user to arrive
+        :return: when they arrive or None if the feed ended
+        """
+        while self.pending is None and not self.closed:
+            self.read()
+        return self.pending.start_time if self.pending is not None else None
+
+    def is_finished(self) -> bool:
+        return self.closed and self.pending is None
+
+
+def run_feed(algorithm: BaseLiftAlgorithm, feed: Feed, total_floors: int, capacity: int, constants: Dict[str, int],
+             event_driven: bool = True) -> Iterator[Tuple[int, int, LiftAction]]:
+    """
+    Runs the lift loop over users arriving from a feed, giving each action as soon as the algorithm decides it. Works
+    the same as simulate so a recorded log gives the same times, but users are forgotten once they get out so memory
+    only depends on how many users are in the building
+    :param algorithm: algorithm to use
+    :param feed: where the users arrive from
+    :param total_floors: number of floors in the building
+    :param capacity: capacity of the lift
+    :param constants: the timing constants from data/constants.json
+    :param event_driven: when the lift is idle wait for the next arrival instead of stepping one time unit at a time
+    :return: the time, the floor the lift was at and the action for every decision, users getting out have their times
+    """
+    algorithm.set_capacity(capacity)
+    current_time = 0
+    current_floor = constants["start floor"]
+    lift_occupants: OrderedUsers = {}
+    floors = FloorQueues(total_floors)
+    last_action: LiftAction = LiftAction(Action.wait)
+    hooks = instrumentation.get_hooks()
+    if hooks is not None:
+        hooks.start(algorithm.name, "feed")
+        run_start = time.perf_counter_ns()
+
+    while True:
+        for user in feed.get_arrivals(current_time):
+            floors.add_user(user)
+        if feed.is_finished() and floors.get_total_waiting() == 0 and len(lift_occupants) == 0:
+            break
+
+        if hooks is not None:
+            decision_start = time.perf_counter_ns()
+        completed_action: LiftAction = algorithm.calculate(lift_occupants, floors, current_time, current_floor)
+        if hooks is not None:
+            hooks.decision(completed_action, time.perf_counter_ns() - decision_start, floors.get_total_waiting(),
+                           len(lift_occupants))
+        decision_time, decision_floor = current_time, current_floor
+
+        # apply changes from action
+        if completed_action.action == Action.wait:
+            current_time += 1
+        elif completed_action.action == Action.idle:
+            idle_start = current_time
+            # nothing changes until somebody arrives so wait for them
+            next_arrival_time = feed.get_next_arrival_time() if event_driven else None
+            if next_arrival_time is not None:
+                current_time = max(current_time + 1, next_arrival_time)
+            else:
+                current_time += 1
+            if hooks is not None:
+                hooks.idle(current_time - idle_start)
+        elif completed_action.action == Action.move_up:
+            current_floor += 1
+            current_time += constants["time between floors"]
+        elif completed_action.action == Action.move_down:
+            current_floor -= 1
+            current_time += constants["time between floors"]
+        elif completed_action.action == Action.open_doors:
+            if hooks is not None:
+                doors_start = time.perf_counter_ns()
+            for user in completed_action.add:
+                user.set_user_start_traveling(current_time)
+            for user in completed_action.remove:
+                user.set_user_end_traveling(current_time)
+            floors.remove_users(current_floor, completed_action.add)
+            for user in completed_action.add:
+                lift_occupants[user] = None
+            for user in completed_action.remove:
+                lift_occupants.pop(user, None)
+            if hooks is not None:
+                hooks.doors(time.perf_counter_ns() - doors_start, len(completed_action.add),
+                            len(completed_action.remove))
+            people_change = len(completed_action.add) + len(completed_action.remove)
+            current_time += (constants["first pickup time"] if last_action.action != Action.open_doors else 0) + \
+                constants["extra pickup time"] * people_change
+        last_action = completed_action
+        yield decision_time, decision_floor, completed_action
+
+    if hooks is not None:
+        hooks.finish(current_time, time.perf_counter_ns() - run_start)
+
+
+def open_source(source: str) -> TextIO:
+    """
+    :param source: "-" for stdin, the path of a local socket to connect to or the path of a named pipe or file
+    :return: the lines of the source
+    """
+    if source == "-":
+        return sys.stdin
+    if os.path.exists(source) and stat.S_ISSOCK(os.stat(source).st_mode):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(source)
+        return connection.makefile("r")
+    return open(source, "r")
+
+
+def format_action(decision_time: int, floor: int, action: LiftAction) -> str:
+    """
+    :return: the action as a line of json, users getting in and out are given by the order they arrived in the feed
+    """
+    line = {"time": decision_time, "floor": floor, "action": action.action.name}
+    if action.action == Action.open_doors:
+        line["in"] = [user.id for user in action.add]
+        line["out"] = [user.id for user in action.remove]
+    return json.dumps(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a lift algorithm on users arriving from a live feed")
+    parser.add_argument("-a", "--algorithm", choices=registry.get_algorithm_names(), default="LOOK",
+                        help="algorithm to run")
+    parser.add_argument("-f", "--floors", type=int, required=True, help="floors in the building")
+    parser.add_argument("-c", "--capacity", type=int, required=True, help="capacity of the lift")
+    parser.add_argument("-s", "--source", default="-",
+                        help="where arrivals come from: - for stdin, a local socket, a named pipe or a file")
+    args = parser.parse_args()
+
+    with open("data/constants.json", "r") as f:
+        feed_constants = json.load(f)
+    served = 0
+    total_time = 0
+    for action_time, action_floor, lift_action in run_feed(registry.create_algorithm(args.algorithm),
+                                                           Feed(open_source(args.source), args.floors),
+                                                           args.floors, args.capacity, feed_constants):
+        print(format_action(action_time, action_floor, lift_action), flush=True)
+        if lift_action.action == Action.open_doors:
+            served += len(lift_action.remove)
+            total_time += sum(user.finish_time - user.start_time for user in lift_action.remove)
+    print(f"Served {served} users, mean total time {total_time / max(served, 1):.1f}", file=sys.stderr)
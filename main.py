@@ -1,21 +1,21 @@
-import logging
 import os
 
-import simulation_gui
+import event_trace
+import instrumentation
+import results_store
 import simulation_handler
 import statistics
-from lift_algorithms.LOOK import LookAlgorithm
+from action_trace import ActionTrace
+from lift_algorithms import registry
 from lift_algorithms.lift import BaseLiftAlgorithm
 
-from lift_algorithms.SCAN import ScanAlgorithm
-
 
 def get_sim_id() -> str | None:
     """
     asks the user to enter a simulation id
     :return: simulation id or None if no simulation id
     """
-    ids = [sim.split("_")[1].split(".")[0] for sim in os.listdir("simulations")]
+    ids = [str(simulation_id) for simulation_id in results_store.get_scenario_ids()]
     print("Simulation IDs: {}".format(", ".join(ids)))
     chosen_id = input(f"Choose a simulation id:")
     if chosen_id not in ids:
@@ -25,8 +25,6 @@ def get_sim_id() -> str | None:
 
 
 if __name__ == '__main__':
-    # enables  logging
-    logging.basicConfig(level=logging.ERROR)
     # give users simple cli to control what to do
     while True:
         user_input = input("""
@@ -35,7 +33,7 @@ What do you want to do?:
     1 - create simulation
     2 - run simulation
     3 - view statistics
-    4 - toggle logging
+    4 - event tracing
 """)
 
         if user_input == '0':
@@ -48,59 +46,108 @@ What do you want to do?:
             if chosen_id is None:
                 continue
             # ask for algorithm
-            chosen_algorithm = input("Choose a simulation to run (LOOK or SCAN)")
-
-            if chosen_algorithm == "LOOK" or chosen_algorithm == "1":
-                algorithm: BaseLiftAlgorithm = LookAlgorithm()
-            elif chosen_algorithm == "SCAN" or chosen_algorithm == "2":
-                algorithm: BaseLiftAlgorithm = ScanAlgorithm()
-            else:
+            algorithm_names = registry.get_algorithm_names()
+            for number, name in enumerate(algorithm_names, 1):
+                print(f"{number} - {name}")
+            chosen_algorithm = input(f"Choose a simulation to run ({' or '.join(algorithm_names)})")
+            # algorithms can also be chosen by their number in the list shown
+            if chosen_algorithm.isdigit() and 0 < int(chosen_algorithm) <= len(algorithm_names):
+                chosen_algorithm = algorithm_names[int(chosen_algorithm) - 1]
+            if chosen_algorithm not in algorithm_names:
                 print("Invalid algorithm")
                 continue
+            algorithm: BaseLiftAlgorithm = registry.create_algorithm(chosen_algorithm)
             is_gui = input("Would you like to run in GUI mode? (y/n)")
+            metrics = None
+            if input("Collect metrics about the run? (y/n)") == "y":
+                # algorithms with a time budget for each decision get checked against it
+                metrics = instrumentation.MetricsCollector(getattr(algorithm, "time_budget", None))
+                instrumentation.subscribe(metrics)
             # run correct algorithm
             if is_gui == "y":
+                # pygame is only loaded when the gui is used
+                import simulation_gui
+
                 print("Visualizing simulation...")
                 print(
                     "Use SPACE to pause, LEFT ARROW to slow down, RIGHT ARROW to speed up, I to toggle info about users")
                 try:
-                    simulation_gui.SimulationGUI(algorithm, int(chosen_id))
+                    replay = "n"
+                    if os.path.exists(simulation_handler.get_trace_path(int(chosen_id), algorithm.name)):
+                        replay = input("Replay the recorded run instead of running the algorithm? (y/n)")
+                    if replay == "y":
+                        start_time = input("Time to start from? (default 0)")
+                        print("Use , and . to jump 10, [ and ] to jump 100, HOME and END, click or drag to scrub")
+                        simulation_gui.ReplayGUI(algorithm, int(chosen_id),
+                                                 float(start_time) if start_time.isdigit() else 0)
+                    else:
+                        simulation_gui.SimulationGUI(algorithm, int(chosen_id))
                 except Exception as e:
                     print(f"Simulation Failed: {e}")
 
             elif is_gui == "n":
+                cars = input("How many lift cars? (default 1)")
+                car_count = int(cars) if cars.isdigit() and int(cars) > 0 else 1
+                trace = None
+                if car_count == 1 and input("Record the run so it can be replayed? (y/n)") == "y":
+                    trace = ActionTrace()
                 try:
-                    simulation_output = simulation_handler.run_simulation(algorithm, int(chosen_id))
-                    simulation_handler.save_output(simulation_output, int(chosen_id), algorithm)
-                    print(f"Simulation output saved for {algorithm.name} algorithm")
+                    if car_count == 1:
+                        simulation_output = simulation_handler.run_simulation(algorithm, int(chosen_id), trace=trace)
+                        if trace is not None:
+                            trace.save(simulation_handler.get_trace_path(int(chosen_id), algorithm.name))
+                    else:
+                        simulation_output = simulation_handler.run_multi_car_simulation(algorithm, int(chosen_id),
+                                                                                        car_count)
+                    simulation_handler.save_output(simulation_output, int(chosen_id), algorithm, car_count)
+                    print(f"Simulation output saved for {simulation_handler.get_output_name(algorithm, car_count)}")
                 except Exception as e:
                     print(f"Simulation Failed: {e}")
+            if metrics is not None:
+                instrumentation.unsubscribe(metrics)
+                metrics_path = simulation_handler.get_metrics_path(int(chosen_id), algorithm.name)
+                metrics.write_json(f"{metrics_path}.json")
+                metrics.write_prometheus(f"{metrics_path}.prom")
+                print(f"Metrics saved to {metrics_path}.json and {metrics_path}.prom")
         elif user_input == '3':
             # ask the user for id
             chosen_id = get_sim_id()
             if chosen_id is None:
                 continue
             # ask for type of stats
-            statistics_type = input("Choose a statistics type (1 - individual, 2 - compared):")
+            statistics_type = input("Choose a statistics type (1 - individual, 2 - compared, 3 - gap to optimal):")
             # get stats on that id
             if statistics_type == "1":
-                try:
-                    statistics.show_statistics_of_algorithm(int(chosen_id), "SCAN")
-                except Exception as e:
-                    print(e)
-                try:
-                    statistics.show_statistics_of_algorithm(int(chosen_id), "LOOK")
-                except Exception as e:
-                    print(e)
+                for name in registry.get_algorithm_names():
+                    try:
+                        statistics.show_statistics_of_algorithm(int(chosen_id), name)
+                    except Exception as e:
+                        print(e)
 
             elif statistics_type == "2":
                 statistics.show_compare_statistics(int(chosen_id))
+            elif statistics_type == "3":
+                statistics.show_gaps(int(chosen_id))
             else:
                 print("Invalid statistics type")
         elif user_input == '4':
-            if logging.getLogger().isEnabledFor(logging.INFO):
-                logging.getLogger().setLevel(logging.ERROR)
-                print("logging disabled")
+            tracer = event_trace.tracer
+            print("Categories: " + ", ".join(
+                f"{category} ({'on' if getattr(tracer, category) else 'off'})" for category in event_trace.categories))
+            print(f"Recording to: {tracer.path or 'memory'}. Events recorded: {tracer.count}")
+            choice = input("Enter a category to toggle it, 'file' to record to a file, 'memory' to record to "
+                           "memory or 'show' to show the latest events:")
+            if choice in event_trace.categories:
+                tracer.set_category(choice, not getattr(tracer, choice))
+                print(f"{choice} {'enabled' if getattr(tracer, choice) else 'disabled'}")
+            elif choice == "file":
+                tracer.set_file(input("Trace file path:"))
+            elif choice == "memory":
+                tracer.set_file(None)
+            elif choice == "show":
+                events = event_trace.read_file(tracer.path) if tracer.path is not None else tracer.get_events()
+                shown = input("How many events? (default 50)")
+                for line in event_trace.format_events(events[-(int(shown) if shown.isdigit() else 50):]):
+                    print(line)
             else:
-                logging.getLogger().setLevel(logging.INFO)
-                print("logging enabled")
+                print("Invalid choice")
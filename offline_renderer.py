@@ -0,0 +1,222 @@
+import argparse
+import math
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Tuple
+
+import pygame
+
+from lift_algorithms import registry
+from lift_algorithms.lift import BaseLiftAlgorithm
+from simulation_gui import SimulationGUI
+
+# outputs ending in one of these are encoded to a video with ffmpeg, anything else is a folder of png frames
+video_extensions = (".mp4", ".mkv", ".webm", ".mov", ".avi")
+
+
+class OfflineRenderer(SimulationGUI):
+    """
+    Renders a simulation without a window at a fixed frame rate, as fast as possible, saving each frame as a png or
+    sending it to ffmpeg instead of showing it
+    """
+    output: str | None
+    start_frame: int
+    end_frame: int | None
+    frame_count: int = 0
+    encoder: subprocess.Popen | None = None
+
+    def __init__(self, algorithm: BaseLiftAlgorithm, simulation_id: int, output: str | None, frame_rate: int = 30,
+                 speed: float = 2, start_frame: int = 0, end_frame: int | None = None, show_user_info: bool = False):
+        """
+        :param algorithm: algorithm to run
+        :param simulation_id: simulation to render
+        :param output: folder for png frames or video file, None to only count the frames
+        :param frame_rate: frames per second of the output
+        :param speed: simulation time per second of output
+        :param start_frame: first frame to save, earlier frames are simulated but not drawn
+        :param end_frame: frame to stop before, None to render until every user has finished
+        :param show_user_info: write the info of each user on them
+        """
+        # the dummy driver lets pygame draw without a screen
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        self.output = output
+        self.frame_rate = frame_rate
+        self.simulation_speed = speed
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.show_user_info = show_user_info
+        super().__init__(algorithm, simulation_id)
+
+    def run_main_loop(self):
+        try:
+            while len(self.finished_users) != self.total_users and (
+                    self.end_frame is None or self.frame_count < self.end_frame):
+                self.update()
+                if self.output is not None and self.frame_count >= self.start_frame:
+                    self.render()
+                    self.save_frame()
+                self.frame_count += 1
+        finally:
+            self.close_encoder()
+            pygame.quit()
+
+    def save_frame(self):
+        """
+        Saves the window as the next frame of the output
+        """
+        if not is_video(self.output):
+            pygame.image.save(self.win, get_frame_path(self.output, self.frame_count))
+            return
+        if self.encoder is None:
+            self.encoder = start_encoder(self.output, self.win.get_size(), self.frame_rate)
+        self.encoder.stdin.write(pygame.image.tobytes(self.win, "RGB"))
+
+    def close_encoder(self):
+        """
+        Waits for ffmpeg to finish writing the video
+        """
+        if self.encoder is None:
+            return
+        self.encoder.stdin.close()
+        if self.encoder.wait() != 0:
+            raise Exception(f"ffmpeg failed to write {self.output}.")
+        self.encoder = None
+
+
+def is_video(output: str) -> bool:
+    """
+    :return: if the output is a video file rather than a folder of frames
+    """
+    return os.path.splitext(output)[1].lower() in video_extensions
+
+
+def get_frame_path(folder: str, frame: int) -> str:
+    """
+    :return: path of a png frame
+    """
+    return f"{folder}/frame_{frame:06d}.png"
+
+
+def get_ffmpeg() -> str:
+    """
+    :return: path of the local ffmpeg
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise Exception("ffmpeg not found, install it or render to a folder of png frames.")
+    return ffmpeg
+
+
+def start_encoder(path: str, size: Tuple[int, int], frame_rate: int) -> subprocess.Popen:
+    """
+    Starts ffmpeg reading raw rgb frames from its stdin
+    :param path: video file to write
+    :param size: width and height of the frames
+    :param frame_rate: frames per second of the video
+    :return: the ffmpeg process
+    """
+    return subprocess.Popen([get_ffmpeg(), "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                             "-s", f"{size[0]}x{size[1]}", "-r", str(frame_rate), "-i", "-", "-pix_fmt", "yuv420p",
+                             path], stdin=subprocess.PIPE)
+
+
+def join_videos(parts: List[str], path: str):
+    """
+    Joins videos with the same settings end to end without encoding them again, then deletes the parts
+    :param parts: videos in order
+    :param path: video file to write
+    """
+    list_path = f"{path}.parts.txt"
+    with open(list_path, "w") as f:
+        for part in parts:
+            f.write(f"file '{os.path.abspath(part)}'\n")
+    try:
+        result = subprocess.run([get_ffmpeg(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                                 "-i", list_path, "-c", "copy", path])
+        if result.returncode != 0:
+            raise Exception(f"ffmpeg failed to write {path}.")
+    finally:
+        os.remove(list_path)
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+
+
+def render_chunk(algorithm: BaseLiftAlgorithm, simulation_id: int, output: str | None, frame_rate: int, speed: float,
+                 start_frame: int = 0, end_frame: int | None = None, show_user_info: bool = False) -> int:
+    """
+    Renders part of a simulation in a worker process
+    :return: how many frames the simulation was stepped through
+    """
+    renderer = OfflineRenderer(algorithm, simulation_id, output, frame_rate, speed, start_frame, end_frame,
+                               show_user_info)
+    return renderer.frame_count
+
+
+def render_simulation(algorithm: BaseLiftAlgorithm, simulation_id: int, output: str, frame_rate: int = 30,
+                      speed: float = 2, workers: int | None = None, show_user_info: bool = False) -> int:
+    """
+    Renders a whole simulation to png frames or a video. With more than one worker the frames are split into chunks
+    that are rendered at the same time, each worker simulates up to the start of its chunk without drawing
+    :param algorithm: algorithm to run
+    :param simulation_id: simulation to render
+    :param output: folder for png frames or video file (.mp4, .mkv ...)
+    :param frame_rate: frames per second of the output
+    :param speed: simulation time per second of output
+    :param workers: how many processes to use, defaults to one per core
+    :param show_user_info: write the info of each user on them
+    :return: how many frames were rendered
+    """
+    if is_video(output):
+        get_ffmpeg()
+    else:
+        os.makedirs(output, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    # pygame is only ever started in the workers so a later window in this process is not headless
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        if workers == 1:
+            return executor.submit(render_chunk, algorithm, simulation_id, output, frame_rate, speed, 0, None,
+                                   show_user_info).result()
+
+        # the length of the simulation is found first so it can be split evenly
+        total_frames = executor.submit(render_chunk, algorithm, simulation_id, None, frame_rate, speed).result()
+        chunk_size = max(math.ceil(total_frames / workers), 1)
+        chunks = [(chunk_start, min(chunk_start + chunk_size, total_frames))
+                  for chunk_start in range(0, total_frames, chunk_size)]
+        base, extension = os.path.splitext(output)
+        chunk_outputs = [f"{base}.part{index}{extension}" if is_video(output) else output
+                         for index in range(len(chunks))]
+        futures = {executor.submit(render_chunk, algorithm, simulation_id, chunk_output, frame_rate, speed,
+                                   chunk_start, chunk_end, show_user_info): (chunk_start, chunk_end)
+                   for chunk_output, (chunk_start, chunk_end) in zip(chunk_outputs, chunks)}
+        for finished, future in enumerate(as_completed(futures), 1):
+            future.result()
+            chunk_start, chunk_end = futures[future]
+            print(f"[{finished}/{len(chunks)}] {time.perf_counter() - start:.1f}s frames {chunk_start}-{chunk_end - 1} "
+                  f"rendered", flush=True)
+
+    if is_video(output):
+        join_videos(chunk_outputs, output)
+    return total_frames
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render a simulation to png frames or a video without a window")
+    parser.add_argument("-s", "--simulation", type=int, required=True, help="simulation id")
+    parser.add_argument("-a", "--algorithm", default="LOOK", choices=registry.get_algorithm_names(),
+                        help="algorithm to run")
+    parser.add_argument("-o", "--output", required=True,
+                        help="folder for png frames or video file ending in " + ", ".join(video_extensions))
+    parser.add_argument("--fps", type=int, default=30, help="frames per second of the output")
+    parser.add_argument("--speed", type=float, default=2, help="simulation time per second of output")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("-i", "--info", action="store_true", help="show the info of each user")
+    args = parser.parse_args()
+
+    frames = render_simulation(registry.create_algorithm(args.algorithm), args.simulation, args.output, args.fps,
+                               args.speed, args.workers, args.info)
+    print(f"Rendered {frames} frames to {args.output}")
@@ -0,0 +1,504 @@
+import argparse
+import heapq
+import json
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import results_store
+import simulation_handler
+from floor_queues import FloorQueues, OrderedUsers
+from lift_algorithms import registry
+from lift_algorithms.lift import BaseLiftAlgorithm, LiftAction, Action
+from user import UserTable
+
+# one step of a schedule: the action, how many users going up get in and how many going down get in
+Step = Tuple[Action, int, int]
+
+
+class ScheduleAlgorithm(BaseLiftAlgorithm):
+    """
+    Follows a schedule found by the solver so it can be run by simulate like any other algorithm. Users going the
+    same way from a floor get in in the order they arrived and everyone is let out at their floor
+    """
+    steps: List[Step]
+    next_step: int
+
+    def __init__(self, steps: List[Step]):
+        self.steps = steps
+        self.next_step = 0
+        self.name = "OPTIMAL"
+
+    def calculate(self, lift_occupants: OrderedUsers, floors: FloorQueues, current_time: int,
+                  current_floor: int) -> LiftAction:
+        """returns the next step of the schedule"""
+        action, going_up, going_down = self.steps[self.next_step]
+        self.next_step += 1
+        if action != Action.open_doors:
+            return LiftAction(action)
+        up = [user for user in floors[current_floor] if user.end_floor >= user.start_floor][:going_up]
+        down = [user for user in floors[current_floor] if user.end_floor < user.start_floor][:going_down]
+        return LiftAction(Action.open_doors, up + down,
+                          [user for user in lift_occupants if user.end_floor == current_floor])
+
+
+class SearchNode:
+    """State of the lift part way through a schedule"""
+    time: int
+    floor: int
+    last_opened: bool
+    occupants: Tuple[int, ...]  # users in the lift going to each floor
+    occupant_count: int
+    heads: Tuple[int, ...]  # first user of each queue that has not got in, as a position in ScheduleSearch.queue_users
+    tails: Tuple[int, ...]  # first user of each queue that has not arrived
+    arrived: int  # users that have arrived, in arrival order
+    finished: int
+    cost: int  # total time of finished users minus the start time of users in the lift
+    boarded_cost: int  # least time spent getting in and travelling of every user that has got in
+    bound: int  # the lowest total time any schedule from here can have
+    parent: "SearchNode | None"
+    step: Step | None  # step that led here from the parent
+
+    def get_key(self) -> tuple:
+        """
+        :return: what identifies the state, two nodes with the same key have the same schedules ahead of them
+        """
+        return (self.time, self.floor, self.last_opened, self.occupants, self.heads,
+                self.step[0] if self.step is not None else None)
+
+
+class ScheduleSearch:
+    """
+    Branch and bound over the schedules of one lift knowing every arrival in advance. The search keeps the best
+    schedule found, starting from the best registered algorithm, and remembers the lowest cost every state was
+    reached with so it is never searched twice. Schedules searched open the doors to let out everyone going to the
+    floor and take in the first users going up, going down or both in the order they arrived (FIFO schedules), never
+    move straight back to the floor they just left and only wait for the next arrival. The bound the search proves is
+    only for these schedules, letting a later user get in first can be better, so the bound of the root node is the
+    lower bound for every schedule
+    """
+    total_floors: int
+    capacity: int
+    floor_time: int
+    first_pickup_time: int
+    extra_pickup_time: int
+    start_floor: int
+    user_count: int
+    # users of each (floor, up or down) queue one after another in arrival order
+    queue_users: np.ndarray
+    queue_starts: List[int]
+    queue_end_floors: List[int]
+    queue_time_sums: List[int]  # start times of queue_users[:i] added up
+    queue_least_costs: List[int]  # least time to get in and travel of queue_users[:i] added up
+    # users in arrival order
+    arrival_times: List[int]
+    arrival_floors: List[int]
+    arrival_queues: List[int]
+    total_least_cost: int
+    best: SearchNode | None
+    best_cost: int
+    costs: Dict[tuple, int]
+    max_states: int
+    nodes: int
+
+    def __init__(self, users: UserTable, total_floors: int, capacity: int, constants: Dict[str, int],
+                 max_states: int):
+        self.total_floors = total_floors
+        self.capacity = capacity
+        self.floor_time = constants["time between floors"]
+        self.first_pickup_time = constants["first pickup time"]
+        self.extra_pickup_time = constants["extra pickup time"]
+        self.start_floor = constants["start floor"]
+        self.user_count = len(users)
+        self.max_states = max_states
+
+        start_floors = users.start_floors.astype(np.int64)
+        end_floors = users.end_floors.astype(np.int64)
+        start_times = users.start_times
+        queue_of = start_floors * 2 + (end_floors < start_floors)
+        # least time each user can spend getting in and travelling once the lift reaches them
+        least_costs = self.extra_pickup_time + np.abs(end_floors - start_floors) * self.floor_time
+        self.queue_users = np.lexsort((start_times, queue_of))
+        queue_sizes = np.bincount(queue_of, minlength=total_floors * 2)
+        self.queue_starts = np.concatenate(([0], np.cumsum(queue_sizes))).tolist()
+        self.queue_end_floors = end_floors[self.queue_users].tolist()
+        self.queue_time_sums = np.concatenate(([0], np.cumsum(start_times[self.queue_users]))).tolist()
+        self.queue_least_costs = np.concatenate(([0], np.cumsum(least_costs[self.queue_users]))).tolist()
+        arrivals = np.argsort(start_times, kind="stable")
+        self.arrival_times = start_times[arrivals].tolist()
+        self.arrival_floors = start_floors[arrivals].tolist()
+        self.arrival_queues = queue_of[arrivals].tolist()
+        self.total_least_cost = int(least_costs.sum())
+        self.best = None
+        self.best_cost = 0
+        self.costs = {}
+        self.nodes = 0
+
+    def create_root(self) -> SearchNode:
+        """
+        :return: the lift at the start of the simulation
+        """
+        node = SearchNode()
+        node.floor = self.start_floor
+        node.last_opened = False
+        node.occupants = (0,) * self.total_floors
+        node.occupant_count = 0
+        node.heads = tuple(self.queue_starts[:-1])
+        node.finished = 0
+        node.cost = 0
+        node.boarded_cost = 0
+        node.parent = None
+        node.step = None
+        self.set_time(node, 0, node.heads, 0)
+        return node
+
+    def set_time(self, node: SearchNode, new_time: int, tails: Tuple[int, ...], arrived: int):
+        """
+        Moves a node to a new time, adding everyone who arrived, and works out its bound
+        :param tails: tails of the node before
+        :param arrived: users that had arrived before
+        """
+        arrival_times = self.arrival_times
+        if arrived < self.user_count and arrival_times[arrived] <= new_time:
+            new_tails = list(tails)
+            while arrived < self.user_count and arrival_times[arrived] <= new_time:
+                new_tails[self.arrival_queues[arrived]] += 1
+                arrived += 1
+            tails = tuple(new_tails)
+        node.time = new_time
+        node.tails = tails
+        node.arrived = arrived
+        node.bound = self.get_bound(node)
+
+    def get_bound(self, node: SearchNode) -> int:
+        """
+        The lift has to stop at every floor someone in it is going to and every floor someone is waiting on. Each stop
+        is at least as late as the lift could get there and the k-th different floor it stops at is at least k moves
+        and k - 1 door openings away. After that every waiting user still has to get in and travel, and users that
+        have not arrived yet are counted as if nobody else was using the lift
+        :return: the lowest total time of any schedule carrying on from a node
+        """
+        current_time = node.time
+        floor = node.floor
+        floor_time = self.floor_time
+        bound = node.cost + self.total_least_cost - node.boarded_cost
+        # users that have to be stopped for on each floor
+        stops = {}
+        for end_floor, count in enumerate(node.occupants):
+            if count:
+                stops[end_floor] = count
+        time_sums = self.queue_time_sums
+        for queue, (head, tail) in enumerate(zip(node.heads, node.tails)):
+            if tail > head:
+                stops[queue >> 1] = stops.get(queue >> 1, 0) + tail - head
+                bound -= time_sums[tail] - time_sums[head]
+        if len(stops) > 0:
+            # each stop as if the lift went straight there
+            reach = sum(count * (current_time + abs(floor - stop) * floor_time) for stop, count in stops.items())
+            # the most users are stopped for first
+            stop_gap = floor_time + self.extra_pickup_time
+            ordered = sum(count * (current_time + rank * stop_gap + max(rank - 1, 0) * self.first_pickup_time)
+                          for rank, count in enumerate(sorted(stops.values(), reverse=True)))
+            bound += max(reach, ordered)
+        # users that have not arrived yet may only be reachable after they arrive
+        arrival_times = self.arrival_times
+        arrival_floors = self.arrival_floors
+        latest = current_time + (self.total_floors - 1) * floor_time
+        index = node.arrived
+        while index < self.user_count and arrival_times[index] < latest:
+            bound += max(current_time + abs(floor - arrival_floors[index]) * floor_time - arrival_times[index], 0)
+            index += 1
+        return bound
+
+    def create_child(self, node: SearchNode, step: Step, new_time: int, floor: int) -> SearchNode:
+        """
+        :return: a copy of a node after a step that does not open the doors
+        """
+        child = SearchNode()
+        child.floor = floor
+        child.last_opened = False
+        child.occupants = node.occupants
+        child.occupant_count = node.occupant_count
+        child.heads = node.heads
+        child.finished = node.finished
+        child.cost = node.cost
+        child.boarded_cost = node.boarded_cost
+        child.parent = node
+        child.step = step
+        self.set_time(child, new_time, node.tails, node.arrived)
+        return child
+
+    def open_doors(self, node: SearchNode, going_up: int, going_down: int) -> SearchNode:
+        """
+        :return: a node after letting out everyone going to the floor and taking in the first users of each queue
+        """
+        floor = node.floor
+        dropped = node.occupants[floor]
+        occupants = list(node.occupants)
+        occupants[floor] = 0
+        heads = list(node.heads)
+        cost = node.cost + dropped * node.time
+        boarded_cost = node.boarded_cost
+        for queue, count in ((floor * 2, going_up), (floor * 2 + 1, going_down)):
+            if count == 0:
+                continue
+            head = heads[queue]
+            for end_floor in self.queue_end_floors[head:head + count]:
+                occupants[end_floor] += 1
+            cost -= self.queue_time_sums[head + count] - self.queue_time_sums[head]
+            boarded_cost += self.queue_least_costs[head + count] - self.queue_least_costs[head]
+            heads[queue] = head + count
+
+        child = SearchNode()
+        child.floor = floor
+        child.last_opened = True
+        child.occupants = tuple(occupants)
+        child.occupant_count = node.occupant_count - dropped + going_up + going_down
+        child.heads = tuple(heads)
+        child.finished = node.finished + dropped
+        child.cost = cost
+        child.boarded_cost = boarded_cost
+        child.parent = node
+        child.step = (Action.open_doors, going_up, going_down)
+        duration = (0 if node.last_opened else self.first_pickup_time) + self.extra_pickup_time * (
+                dropped + going_up + going_down)
+        self.set_time(child, node.time + duration, node.tails, node.arrived)
+        return child
+
+    def expand(self, node: SearchNode) -> List[SearchNode]:
+        """
+        :return: the nodes after every step that can be taken from a node
+        """
+        children = []
+        floor = node.floor
+        # open the doors
+        dropped = node.occupants[floor]
+        room = self.capacity - node.occupant_count + dropped
+        waiting_up = node.tails[floor * 2] - node.heads[floor * 2]
+        waiting_down = node.tails[floor * 2 + 1] - node.heads[floor * 2 + 1]
+        up_first = min(room, waiting_up)
+        down_first = min(room, waiting_down)
+        options = {(up_first, 0), (0, down_first), (up_first, min(room - up_first, waiting_down)),
+                   (min(room - down_first, waiting_up), down_first), (0, 0)}
+        for going_up, going_down in options:
+            if dropped + going_up + going_down > 0:
+                children.append(self.open_doors(node, going_up, going_down))
+        # move, but not straight back
+        previous = node.step[0] if node.step is not None else None
+        if floor < self.total_floors - 1 and previous != Action.move_down:
+            children.append(self.create_child(node, (Action.move_up, 0, 0), node.time + self.floor_time, floor + 1))
+        if floor > 0 and previous != Action.move_up:
+            children.append(self.create_child(node, (Action.move_down, 0, 0), node.time + self.floor_time,
+                                              floor - 1))
+        # wait for the next user
+        if node.arrived < self.user_count:
+            children.append(self.create_child(node, (Action.idle, 0, 0), self.arrival_times[node.arrived], floor))
+        return children
+
+    def dive(self, node: SearchNode, deadline: float):
+        """
+        Finishes the schedule from a node the way a collective lift would, going on in one direction while anyone in
+        the lift or waiting needs it and picking up users going the same way, to find better schedules to beat
+        :param node: node to start from
+        :param deadline: when the search has to stop
+        """
+        going_up = node.step is None or node.step[0] != Action.move_down
+        while node.finished < self.user_count:
+            if node.bound >= self.best_cost or time.perf_counter() > deadline:
+                return
+            floor = node.floor
+            stops = [count > 0 or tail > head for count, head, tail in
+                     zip(node.occupants, node.heads[::2], node.tails[::2])]
+            for stop, (head, tail) in enumerate(zip(node.heads[1::2], node.tails[1::2])):
+                stops[stop] = stops[stop] or tail > head
+            stops_above = any(stops[floor + 1:])
+            stops_below = any(stops[:floor])
+            if going_up and not stops_above and stops_below:
+                going_up = False
+            elif not going_up and not stops_below and stops_above:
+                going_up = True
+            room = self.capacity - node.occupant_count + node.occupants[floor]
+            waiting_up = node.tails[floor * 2] - node.heads[floor * 2]
+            waiting_down = node.tails[floor * 2 + 1] - node.heads[floor * 2 + 1]
+            # with nothing ahead everyone waiting can get in
+            nothing_ahead = not (stops_above if going_up else stops_below)
+            boarding_up = min(room, waiting_up) if going_up or nothing_ahead else 0
+            boarding_down = min(room - boarding_up, waiting_down) if not going_up or nothing_ahead else 0
+            if node.occupants[floor] + boarding_up + boarding_down > 0:
+                node = self.open_doors(node, boarding_up, boarding_down)
+            elif stops_above or stops_below:
+                node = self.create_child(node, (Action.move_up if going_up else Action.move_down, 0, 0),
+                                         node.time + self.floor_time, floor + (1 if going_up else -1))
+            elif node.arrived < self.user_count:
+                node = self.create_child(node, (Action.idle, 0, 0), self.arrival_times[node.arrived], floor)
+            else:
+                return
+        if node.cost < self.best_cost:
+            self.best = node
+            self.best_cost = node.cost
+
+    def search(self, time_budget: float, dive_interval: int = 1000) -> Tuple[int, bool]:
+        """
+        Best first search, always carrying on from the node with the lowest bound, until every schedule that could beat
+        the best one has been tried or the time or memory budget runs out. Every dive_interval nodes a dive from the
+        current node looks for a better schedule to beat
+        :param time_budget: seconds the search can take
+        :param dive_interval: nodes searched between dives
+        :return: the lower bound on FIFO schedules and if the best schedule is known to be the best FIFO schedule
+        """
+        deadline = time.perf_counter() + time_budget
+        root = self.create_root()
+        # (bound, -finished, order added, node) so ties go to the node closest to the end of the schedule
+        open_nodes = [(root.bound, 0, 0, root)]
+        added = 1
+        while len(open_nodes) > 0:
+            bound, _, _, node = open_nodes[0]
+            if bound >= self.best_cost:
+                break
+            if time.perf_counter() > deadline or len(self.costs) + len(open_nodes) >= self.max_states:
+                return bound, False
+            heapq.heappop(open_nodes)
+            key = node.get_key()
+            if self.costs.get(key, node.cost + 1) <= node.cost:
+                continue
+            self.costs[key] = node.cost
+            if self.nodes % dive_interval == 0:
+                self.dive(node, deadline)
+            self.nodes += 1
+            for child in self.expand(node):
+                if child.finished == self.user_count:
+                    if child.cost < self.best_cost:
+                        self.best = child
+                        self.best_cost = child.cost
+                elif child.bound < self.best_cost:
+                    heapq.heappush(open_nodes, (child.bound, -child.finished, added, child))
+                    added += 1
+        return self.best_cost, True
+
+    def get_steps(self) -> List[Step]:
+        """
+        :return: the steps to the best schedule the search found
+        """
+        steps = []
+        node = self.best
+        while node is not None and node.step is not None:
+            steps.append(node.step)
+            node = node.parent
+        return steps[::-1]
+
+
+class Solution:
+    """Best schedule found for a simulation and how good the best possible schedule could be"""
+    users: UserTable  # the users with the times of the best schedule
+    total_time: int  # total time of every user in the best schedule
+    lower_bound: int  # no schedule can have a lower total time
+    optimal: bool  # the best schedule reaches the lower bound
+    fifo_bound: int  # no FIFO schedule (see ScheduleSearch) can have a lower total time
+    fifo_optimal: bool  # the best schedule is the best FIFO schedule
+    source: str  # "search" or the name of the algorithm whose schedule was best
+    steps: List[Step] | None  # steps of the schedule if the search found it
+    nodes: int
+    seconds: float
+
+    def get_gap(self) -> float:
+        """
+        :return: how much more total time the best schedule has than the lower bound as a fraction
+        """
+        return (self.total_time - self.lower_bound) / max(self.lower_bound, 1)
+
+
+def copy_users(users: UserTable) -> UserTable:
+    """
+    :return: the same users without any times
+    """
+    return UserTable(users.ids, users.start_floors, users.end_floors, users.start_times)
+
+
+def get_total_time(users: UserTable) -> int:
+    """
+    :return: the total time every user spent waiting and in the lift
+    """
+    return int(np.sum(users.finish_times - users.start_times))
+
+
+def solve(users: UserTable, total_floors: int, capacity: int, constants: Dict[str, int],
+          time_budget: float = 10, max_states: int = 500_000) -> Solution:
+    """
+    Finds the best FIFO schedule knowing every arrival in advance, or the best one within the budget, along with a
+    lower bound on every schedule. Small scenarios are solved exactly among FIFO schedules, for bigger ones the best
+    registered algorithm is the starting point. The schedule is only known to be optimal when it reaches the bound
+    :param users: users of the simulation
+    :param total_floors: number of floors in the building
+    :param capacity: capacity of the lift
+    :param constants: the timing constants from data/constants.json
+    :param time_budget: seconds the search can take
+    :param max_states: most states remembered by the search, limits the memory it uses
+    :return: the best schedule found
+    """
+    start = time.perf_counter()
+    solution = Solution()
+    solution.steps = None
+    solution.source = ""
+    # the best algorithm is the schedule to beat, only algorithms that always decide the same way are used so the
+    # search and the schedule it saves are the same on every run
+    for name in registry.get_algorithm_names():
+        algorithm = registry.create_algorithm(name)
+        if not algorithm.deterministic:
+            continue
+        output = simulation_handler.simulate(algorithm, copy_users(users), total_floors, capacity, constants)
+        if solution.source == "" or get_total_time(output) < solution.total_time:
+            solution.users = output
+            solution.total_time = get_total_time(output)
+            solution.source = name
+    search = ScheduleSearch(users, total_floors, capacity, constants, max_states)
+    search.best_cost = solution.total_time
+
+    # the bound of the search is only for FIFO schedules, the root bound holds for any schedule
+    solution.lower_bound = search.create_root().bound
+    solution.fifo_bound, solution.fifo_optimal = search.search(time_budget)
+    if search.best is not None:
+        solution.steps = search.get_steps()
+        solution.users = simulation_handler.simulate(ScheduleAlgorithm(solution.steps), copy_users(users),
+                                                     total_floors, capacity, constants)
+        solution.total_time = get_total_time(solution.users)
+        solution.source = "search"
+        if solution.total_time != search.best_cost:
+            raise Exception("The schedule found did not give the same times when simulated.")
+    solution.optimal = solution.total_time <= solution.lower_bound
+    solution.nodes = search.nodes
+    solution.seconds = time.perf_counter() - start
+    return solution
+
+
+def solve_simulation(simulation_id: int, time_budget: float = 10, max_states: int = 500_000) -> Solution:
+    """
+    Solves a saved simulation, saving the best schedule as the OPTIMAL output and the lower bound in the index
+    :param simulation_id: simulation to solve
+    :param time_budget: seconds the search can take
+    :param max_states: most states remembered by the search
+    :return: the best schedule found
+    """
+    with open("data/constants.json", "r") as f:
+        constants = json.load(f)
+    users, total_floors, capacity = simulation_handler.open_simulation(simulation_id)
+    solution = solve(users, total_floors, capacity, constants, time_budget, max_states)
+    simulation_handler.save_output(solution.users, simulation_id, ScheduleAlgorithm(solution.steps or []))
+    results_store.record_bound(simulation_id, solution.lower_bound / max(len(users), 1), solution.optimal)
+    return solution
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Find the best schedule of a simulation knowing every arrival")
+    parser.add_argument("-s", "--simulations", type=int, nargs="+", required=True, help="simulation ids")
+    parser.add_argument("-t", "--time", type=float, default=10, help="seconds to search each simulation for")
+    parser.add_argument("-m", "--max-states", type=int, default=500_000,
+                        help="most states remembered by the search, limits memory")
+    args = parser.parse_args()
+
+    for chosen_id in args.simulations:
+        result = solve_simulation(chosen_id, args.time, args.max_states)
+        print(f"Simulation {chosen_id}: best total time {result.total_time} from {result.source}"
+              f"{' (best FIFO schedule)' if result.fifo_optimal else f', FIFO bound {result.fifo_bound}'}, lower "
+              f"bound {result.lower_bound} ({'optimal' if result.optimal else f'{result.get_gap():.1%} gap'}), "
+              f"{result.nodes} states searched in {result.seconds:.1f}s")
@@ -0,0 +1,246 @@
+import argparse
+import functools
+import inspect
+import itertools
+import json
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import batch_engine
+import results_store
+import scenario_generator
+import simulation_handler
+import statistics
+from lift_algorithms import registry
+from user import UserTable
+
+# values from data/constants.json that can be swept, the capacity and algorithm can be swept as well
+constant_names = ["time between floors", "first pickup time", "extra pickup time", "start floor"]
+# every scenario arrives over this many time units per user
+time_per_user = 4
+# time metrics configurations can be ranked by, e.g. p95_wait or mean_total
+ranking_metrics = [metric for metric in results_store.metrics if metric != "throughput"]
+
+
+def parse_values(text: str) -> List[int]:
+    """
+    :param text: comma separated values and inclusive ranges, e.g. "1,3..5" for 1, 3, 4 and 5
+    :return: the values
+    """
+    values = []
+    for part in text.split(","):
+        if ".." in part:
+            low, high = part.split("..")
+            values.extend(range(int(low), int(high) + 1))
+        else:
+            values.append(int(part))
+    return values
+
+
+def create_configurations(parameters: Dict[str, List], samples: int | None = None,
+                          seed: int | None = None) -> List[Dict]:
+    """
+    Makes every combination of the parameter values or a random sample of them
+    :param parameters: values to try for each parameter, e.g. {"capacity": [4, 8], "algorithm": ["LOOK"]}
+    :param samples: how many combinations to pick at random, None for all of them
+    :param seed: seed for picking the combinations
+    :return: the parameters of each configuration
+    """
+    names = list(parameters)
+    sizes = [len(parameters[name]) for name in names]
+    total = math.prod(sizes)
+    if samples is None or samples >= total:
+        indices = range(total)
+    else:
+        indices = np.random.default_rng(seed).choice(total, samples, replace=False)
+    configurations = []
+    for index in indices:
+        # the index is a number with a digit for each parameter
+        configuration = {}
+        for name, size in zip(reversed(names), reversed(sizes)):
+            index, value_index = divmod(int(index), size)
+            configuration[name] = parameters[name][value_index]
+        configurations.append({name: configuration[name] for name in names})
+    return configurations
+
+
+def format_configuration(configuration: Dict) -> str:
+    """
+    :return: one line of text showing the parameters of a configuration
+    """
+    return " ".join(f"{name.replace(' ', '_')}={value}" for name, value in configuration.items())
+
+
+@functools.lru_cache(maxsize=64)
+def get_scenario(total_floors: int, user_count: int, max_start_time: int, profile: str, seed: int) -> UserTable:
+    """
+    Generates a scenario once in each worker process, runs get a copy of it
+    """
+    return simulation_handler.create_simulation(total_floors, user_count, max_start_time, profile, seed)
+
+
+def create_algorithm(name: str, constants: Dict[str, int]):
+    """
+    :return: a new instance of an algorithm, algorithms that plan with the timing constants are given the ones tried
+        and algorithms with a time budget run without one so every configuration is scored on reproducible runs
+    """
+    algorithm_class = registry.get_algorithm_class(name)
+    parameters = inspect.signature(algorithm_class).parameters
+    settings = {}
+    if "constants" in parameters:
+        settings["constants"] = constants
+    if "time_budget" in parameters:
+        settings["time_budget"] = None
+    return algorithm_class(**settings)
+
+
+def run_trial(configuration: Dict, scenario_settings: Dict, scenario_indices: List[int], category: str) -> np.ndarray:
+    """
+    Runs one configuration on some of the scenarios in a worker process. Algorithms batch_engine can run go through
+    all the scenarios at once
+    :param configuration: algorithm, capacity and timing constants to use
+    :param scenario_settings: floors, users, max_start_time, profile and seed of the scenarios
+    :param scenario_indices: which scenarios to run, scenario i is generated with seed + i
+    :param category: the times to return, "wait", "in_lift" or "total"
+    :return: the times of every user in the scenarios
+    """
+    constants = {name: configuration[name] for name in constant_names}
+    scenarios = []
+    for index in scenario_indices:
+        users = get_scenario(scenario_settings["floors"], scenario_settings["users"],
+                             scenario_settings["max_start_time"], scenario_settings["profile"],
+                             scenario_settings["seed"] + index)
+        scenarios.append(UserTable(users.ids, users.start_floors, users.end_floors, users.start_times))
+    algorithm = create_algorithm(configuration["algorithm"], constants)
+    if algorithm.name in batch_engine.direction_kernels:
+        outputs = batch_engine.simulate_batch(algorithm, scenarios, scenario_settings["floors"],
+                                              configuration["capacity"], constants)
+    else:
+        outputs = [simulation_handler.simulate(create_algorithm(configuration["algorithm"], constants), users,
+                                               scenario_settings["floors"], configuration["capacity"], constants)
+                   for users in scenarios]
+    category_index = ("wait", "in_lift", "total").index(category)
+    return np.concatenate([statistics.get_statistics_of_output(users)[category_index] for users in outputs])
+
+
+def get_score(times: List[np.ndarray], metric: str) -> float:
+    """
+    :return: the metric of the times of every user across the scenarios, lower is better
+    """
+    statistic = metric.split("_")[0]
+    return statistics.get_summary(np.concatenate(times))[statistic]
+
+
+def run_sweep(configurations: List[Dict], scenario_settings: Dict, metric: str = "p95_total", scenario_count: int = 16,
+              first_scenarios: int = 2, keep_fraction: float = 1 / 3, workers: int | None = None) -> List[Dict]:
+    """
+    Runs configurations with successive halving. Every configuration is run on a few scenarios, the best ones are
+    kept and run on more scenarios and so on, so losing configurations stop early and most of the time goes to the
+    good ones
+    :param configurations: parameters of each configuration, see create_configurations
+    :param scenario_settings: floors, users, max_start_time, profile and seed of the scenarios
+    :param metric: what configurations are ranked by, one of ranking_metrics
+    :param scenario_count: how many scenarios the best configurations are run on
+    :param first_scenarios: how many scenarios every configuration is run on
+    :param keep_fraction: share of the configurations kept after each round
+    :param workers: how many processes to use, defaults to one per core
+    :return: each configuration with the number of scenarios it was run on and its score, best first
+    """
+    if metric not in ranking_metrics:
+        raise Exception(f"Metric {metric} can not be used to rank configurations.")
+    for configuration in configurations:
+        registry.get_algorithm_class(configuration["algorithm"])
+        if not 0 <= configuration["start floor"] < scenario_settings["floors"]:
+            raise Exception(f"Start floor {configuration['start floor']} is not in the building.")
+    category = metric.split("_", 1)[1]
+    times = [[] for _ in configurations]
+    results = [{**configuration, "scenarios": 0, "score": None} for configuration in configurations]
+    alive = list(range(len(configurations)))
+    done_scenarios = 0
+    round_scenarios = min(first_scenarios, scenario_count)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # only the scenarios the configurations have not been run on yet
+            new_scenarios = list(range(done_scenarios, round_scenarios))
+            futures = {executor.submit(run_trial, configurations[index], scenario_settings, new_scenarios,
+                                       category): index for index in alive}
+            for future in as_completed(futures):
+                index = futures[future]
+                times[index].append(future.result())
+                results[index]["scenarios"] = round_scenarios
+                results[index]["score"] = get_score(times[index], metric)
+            alive.sort(key=lambda index: results[index]["score"])
+            print(f"{time.perf_counter() - start:.1f}s ran {len(alive)} configurations on {round_scenarios} "
+                  f"scenarios, best {metric} {results[alive[0]]['score']:.1f}", flush=True)
+            if len(alive) == 1 or round_scenarios >= scenario_count:
+                break
+            for index in alive[max(math.ceil(len(alive) * keep_fraction), 1):]:
+                # the times of dropped configurations are not needed again
+                times[index] = []
+            alive = alive[:max(math.ceil(len(alive) * keep_fraction), 1)]
+            done_scenarios = round_scenarios
+            round_scenarios = min(math.ceil(round_scenarios / keep_fraction), scenario_count)
+    # configurations that lasted longer were compared on more scenarios so rank above the ones dropped early
+    return sorted(results, key=lambda result: (-result["scenarios"], result["score"]))
+
+
+def format_result(rank: int, result: Dict, metric: str) -> str:
+    """
+    :return: one line of text showing the rank, score and parameters of a configuration
+    """
+    configuration = {name: value for name, value in result.items() if name not in ("scenarios", "score")}
+    return (f"{rank:>4}. {metric} {result['score']:>10.1f} over {result['scenarios']:>3} scenarios: "
+            f"{format_configuration(configuration)}")
+
+
+if __name__ == '__main__':
+    with open("data/constants.json", "r") as f:
+        default_constants = json.load(f)
+    parser = argparse.ArgumentParser(description="Find the best lift capacity, timings and algorithm for a building")
+    parser.add_argument("-a", "--algorithms", nargs="+", default=registry.get_algorithm_names(),
+                        help="algorithms to try (default: all)")
+    parser.add_argument("-c", "--capacities", type=parse_values, default=[8],
+                        help="lift capacities to try, e.g. 4,8..12 (default: 8)")
+    for constant_name in constant_names:
+        parser.add_argument(f"--{constant_name.replace(' ', '-')}", type=parse_values,
+                            default=[default_constants[constant_name]],
+                            help=f"values to try (default: {default_constants[constant_name]} from constants.json)")
+    parser.add_argument("-n", "--samples", type=int, default=None,
+                        help="try this many random configurations instead of every combination")
+    parser.add_argument("-f", "--floors", type=int, default=20, help="floors in the building")
+    parser.add_argument("-u", "--users", type=int, default=1_000, help="users in each scenario")
+    parser.add_argument("-p", "--profile", choices=scenario_generator.profiles, default="uniform",
+                        help="how users arrive and where they go")
+    parser.add_argument("-s", "--scenarios", type=int, default=16,
+                        help="scenarios the best configurations are run on")
+    parser.add_argument("--first-scenarios", type=int, default=2, help="scenarios every configuration is run on")
+    parser.add_argument("-k", "--keep", type=float, default=1 / 3,
+                        help="share of the configurations kept after each round (default: 1/3)")
+    parser.add_argument("-m", "--metric", choices=ranking_metrics, default="p95_total",
+                        help="what configurations are ranked by (default: p95_total)")
+    parser.add_argument("--seed", type=int, default=0, help="seed the scenarios and samples are generated with")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("-t", "--top", type=int, default=10, help="how many of the best configurations to show")
+    parser.add_argument("-o", "--output", help="file to write every result to as json")
+    args = parser.parse_args()
+
+    swept = {"algorithm": args.algorithms, "capacity": args.capacities}
+    for constant_name in constant_names:
+        swept[constant_name] = getattr(args, constant_name.replace(" ", "_"))
+    sweep_configurations = create_configurations(swept, args.samples, args.seed)
+    print(f"Trying {len(sweep_configurations)} configurations")
+    sweep_results = run_sweep(sweep_configurations,
+                              {"floors": args.floors, "users": args.users, "max_start_time": args.users * time_per_user,
+                               "profile": args.profile, "seed": args.seed},
+                              args.metric, args.scenarios, args.first_scenarios, args.keep, args.workers)
+    for result_rank, sweep_result in enumerate(sweep_results[:args.top], 1):
+        print(format_result(result_rank, sweep_result, args.metric))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(sweep_results, f, indent=2)
+        print(f"Results saved to {args.output}")
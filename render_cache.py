@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple, TypeVar
+
+import pygame
+
+T = TypeVar("T")
+
+
+class RenderCache:
+    """
+    Keeps fonts, text and scaled images that are expensive to make so they can be reused between frames.
+    When it is full the least recently used entry is removed
+    """
+    entries: OrderedDict
+    max_entries: int
+
+    def __init__(self, max_entries: int = 4096):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+
+    def get(self, key: Hashable, create: Callable[[], T]) -> T:
+        """
+        Gets a cached value making it if it is not already in the cache
+        :param key: key of the value
+        :param create: makes the value if it is not cached
+        :return: the value
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        value = create()
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return value
+
+    def get_font(self, size: int) -> pygame.font.Font:
+        """
+        :return: monospace font of the given size
+        """
+        return self.get(("font", size), lambda: pygame.font.SysFont("monospace", size))
+
+    def get_text(self, text: str, size: int, color: Tuple[int, int, int]) -> pygame.Surface:
+        """
+        :return: the text rendered in a monospace font
+        """
+        return self.get(("text", text, size, color), lambda: self.get_font(size).render(text, True, color))
+
+    def clear(self):
+        self.entries.clear()
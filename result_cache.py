@@ -0,0 +1,306 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import results_store
+import simulation_handler
+from lift_algorithms import registry
+from user import UserTable
+
+cache_path = "simulations/cache"
+# biggest the cache can get in bytes before the least recently used entries are removed
+max_cache_size = 512 * 1024 * 1024
+# module that runs the simulation for each engine an output can come from
+engine_modules = {"engine": "simulation_handler", "lockstep": "batch_engine"}
+# version of each algorithm and engine worked out in this process
+algorithm_versions: Dict[Tuple[str, str], str] = {}
+
+
+def get_module_path(module: str, root: str) -> str | None:
+    """
+    :return: the source file of a module in this repository, None if it is not part of it
+    """
+    base = os.path.join(root, *module.split("."))
+    for path in (base + ".py", os.path.join(base, "__init__.py")):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def get_source_files(modules: List[str], root: str) -> List[str]:
+    """
+    Finds the source of the given modules and of every module of this repository they import, directly or through
+    other modules
+    :return: the paths sorted
+    """
+    found = set()
+    pending = [path for path in (get_module_path(module, root) for module in modules) if path is not None]
+    while len(pending) > 0:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.add(path)
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), path)
+        package = os.path.relpath(os.path.dirname(path), root).replace(os.sep, ".")
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                imported = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                if node.level > 0:
+                    parent = package.split(".") if package != "." else []
+                    parent = parent[:len(parent) - node.level + 1]
+                    base = ".".join(parent + ([node.module] if node.module else []))
+                else:
+                    base = node.module
+                # from a import b can be a module b or a name in a
+                imported = [base] + [f"{base}.{alias.name}" for alias in node.names]
+            else:
+                continue
+            for module in imported:
+                module_path = get_module_path(module, root) if module else None
+                if module_path is not None and module_path not in found:
+                    pending.append(module_path)
+    return sorted(found)
+
+
+def get_algorithm_version(name: str, engine: str = "engine") -> str:
+    """
+    Hashes the source of an algorithm's module, the engine that runs it and every module of this repository either of
+    them imports, so the version changes whenever code that can change the algorithm's output does
+    :param name: name of the algorithm
+    :param engine: what ran the algorithm, one of engine_modules
+    :return: the version of the algorithm
+    """
+    if (name, engine) not in algorithm_versions:
+        if name not in registry.algorithm_modules:
+            raise Exception(f"Algorithm {name} not found.")
+        root = os.path.dirname(os.path.abspath(__file__))
+        if get_module_path(registry.algorithm_modules[name], root) is None:
+            raise Exception(f"Source of algorithm {name} not found.")
+        digest = hashlib.sha256()
+        for path in get_source_files([registry.algorithm_modules[name], engine_modules[engine]], root):
+            digest.update(os.path.relpath(path, root).encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        algorithm_versions[(name, engine)] = digest.hexdigest()[:16]
+    return algorithm_versions[(name, engine)]
+
+
+def is_cacheable(name: str) -> bool:
+    """
+    :return: if the outputs of an algorithm can be cached, an algorithm that can decide differently on the same users
+        would always give the first output it was run with
+    """
+    return registry.create_algorithm(name).deterministic
+
+
+def get_key(users: UserTable, total_floors: int, capacity: int, algorithm_name: str,
+            constants: Dict[str, int], engine: str = "engine") -> str:
+    """
+    :return: hash of everything the output of a run depends on: the users, the building, the algorithm and its
+        version, the engine that ran it and the timing constants
+    """
+    digest = hashlib.sha256()
+    for column in (users.ids, users.start_floors, users.end_floors, users.start_times):
+        digest.update(np.ascontiguousarray(column, dtype="<i8").tobytes())
+    digest.update(json.dumps([total_floors, capacity, algorithm_name, engine,
+                              get_algorithm_version(algorithm_name, engine), constants], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def get_entry_path(algorithm_name: str, key: str, engine: str = "engine") -> str:
+    """
+    :return: path of a cached run, named so entries can be found by algorithm, engine and version without opening
+        them
+    """
+    return os.path.join(cache_path,
+                        f"{algorithm_name}.{engine}.{get_algorithm_version(algorithm_name, engine)}.{key}.npz")
+
+
+def get_entries() -> List[Tuple[str, str, str, str]]:
+    """
+    :return: the path, algorithm name, engine and version of every cached run. Runs cached before engines were part
+        of the name have an empty engine
+    """
+    if not os.path.exists(cache_path):
+        return []
+    entries = []
+    for file in os.listdir(cache_path):
+        # split from the right as registered algorithm names can have a "." in them
+        parts = file.rsplit(".", 4)
+        if len(parts) == 5 and parts[4] == "npz" and parts[1] in engine_modules:
+            entries.append((os.path.join(cache_path, file), parts[0], parts[1], parts[2]))
+            continue
+        parts = file.rsplit(".", 3)
+        if len(parts) == 4 and parts[3] == "npz":
+            entries.append((os.path.join(cache_path, file), parts[0], "", parts[1]))
+    return entries
+
+
+def load(algorithm_name: str, key: str, engine: str = "engine") -> Tuple[np.ndarray, np.ndarray,
+                                                                        Dict[str, float]] | None:
+    """
+    Finds a cached run and marks it as recently used
+    :return: when each user got in and out of the lift and the summary metrics of the run, or None if it is not cached
+    """
+    path = get_entry_path(algorithm_name, key, engine)
+    try:
+        with np.load(path) as data:
+            start_traveling_times, finish_times, values = data["start_traveling_times"], data["finish_times"], \
+                data["metrics"]
+        # the modified time is when the entry was last used
+        os.utime(path)
+    except (FileNotFoundError, KeyError, ValueError, OSError):
+        return None
+    return start_traveling_times, finish_times, dict(zip(results_store.metrics, values.tolist()))
+
+
+def store(algorithm_name: str, key: str, users: UserTable, engine: str = "engine") -> Dict[str, float]:
+    """
+    Caches the output of a run, removing entries from older versions of the algorithm and the least recently used
+    entries when the cache is too big
+    :return: the summary metrics of the run
+    """
+    values = results_store.get_metrics(users.start_times, users.start_traveling_times, users.finish_times)
+    os.makedirs(cache_path, exist_ok=True)
+    path = get_entry_path(algorithm_name, key, engine)
+    # written under another name first so other processes never load half an entry
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as f:
+        np.savez(f, start_traveling_times=users.start_traveling_times, finish_times=users.finish_times,
+                 metrics=np.array(values, dtype=np.float64))
+    os.replace(temporary_path, path)
+    invalidate(algorithm_name, engine, get_algorithm_version(algorithm_name, engine))
+    evict(max_cache_size)
+    return dict(zip(results_store.metrics, values))
+
+
+def invalidate(algorithm_name: str | None = None, engine: str | None = None, keep_version: str | None = None) -> int:
+    """
+    Removes cached runs
+    :param algorithm_name: only remove runs of this algorithm, None for every algorithm
+    :param engine: only remove runs from this engine, None for every engine
+    :param keep_version: keep the runs of this version of the algorithm
+    :return: how many runs were removed
+    """
+    removed = 0
+    for path, name, entry_engine, version in get_entries():
+        if (algorithm_name is None or name == algorithm_name) and (engine is None or entry_engine == engine) and \
+                version != keep_version:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def remove_stale() -> int:
+    """
+    Removes the cached runs of algorithms that no longer exist, can not be cached or whose code has changed since
+    :return: how many runs were removed
+    """
+    removed = 0
+    for path, name, engine, version in get_entries():
+        if name not in registry.algorithm_modules or engine not in engine_modules or \
+                version != get_algorithm_version(name, engine) or not is_cacheable(name):
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def evict(max_size: int):
+    """
+    Removes the least recently used runs until the cache is no bigger than max_size bytes
+    """
+    sizes = []
+    for path, _, _, _ in get_entries():
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        sizes.append((stat.st_mtime, stat.st_size, path))
+    total_size = sum(size for _, size, _ in sizes)
+    for _, size, path in sorted(sizes):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+def fill_from_cache(users: UserTable, total_floors: int, capacity: int, algorithm_name: str,
+                    constants: Dict[str, int], engine: str = "engine") -> Tuple[str, Dict[str, float] | None]:
+    """
+    Fills in the times of the users from the cache if the same users have already been run with the same version of
+    the algorithm, engine, capacity and constants
+    :return: the key of the run and its summary metrics, or None for the metrics if it is not cached
+    """
+    key = get_key(users, total_floors, capacity, algorithm_name, constants, engine)
+    cached = load(algorithm_name, key, engine)
+    if cached is None or len(cached[0]) != len(users):
+        return key, None
+    users.start_traveling_times[:] = cached[0]
+    users.finish_times[:] = cached[1]
+    return key, cached[2]
+
+
+def run_cached_simulation(algorithm_name: str, simulation_id: int) -> Tuple[UserTable, Dict[str, float], bool]:
+    """
+    Runs a simulation with an algorithm, or uses the cached output when the run has been done before. Algorithms are
+    made with their default settings from the registry and algorithms that are not deterministic are always run
+    :param algorithm_name: name of the algorithm to run
+    :param simulation_id: simulation to run
+    :return: simulated users with times, the summary metrics of the run and whether it came from the cache
+    """
+    with open("data/constants.json", "r") as f:
+        constants = json.load(f)
+    users, total_floors, capacity = simulation_handler.open_simulation(simulation_id)
+    if not is_cacheable(algorithm_name):
+        users = simulation_handler.simulate(registry.create_algorithm(algorithm_name), users, total_floors, capacity,
+                                            constants)
+        return users, dict(zip(results_store.metrics, results_store.get_metrics(
+            users.start_times, users.start_traveling_times, users.finish_times))), False
+    key, cached_metrics = fill_from_cache(users, total_floors, capacity, algorithm_name, constants)
+    if cached_metrics is not None:
+        return users, cached_metrics, True
+    users = simulation_handler.simulate(registry.create_algorithm(algorithm_name), users, total_floors, capacity,
+                                        constants)
+    return users, store(algorithm_name, key, users), False
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Show or clear the cache of simulation outputs")
+    parser.add_argument("-c", "--clear", nargs="*", metavar="ALGORITHM",
+                        help="remove the cached runs of these algorithms, or of every algorithm if none are given")
+    parser.add_argument("-p", "--prune", action="store_true",
+                        help="remove the cached runs of algorithms whose code has changed")
+    parser.add_argument("-m", "--max-size", type=float, default=None,
+                        help="remove the least recently used runs until the cache is at most this many MB")
+    args = parser.parse_args()
+
+    if args.clear is not None:
+        cleared = sum(invalidate(name) for name in args.clear) if len(args.clear) > 0 else invalidate()
+        print(f"Removed {cleared} cached runs")
+    if args.prune:
+        print(f"Removed {remove_stale()} stale cached runs")
+    if args.max_size is not None:
+        evict(int(args.max_size * 1024 * 1024))
+    cache_entries = get_entries()
+    counts = {}
+    for _, entry_name, _, _ in cache_entries:
+        counts[entry_name] = counts.get(entry_name, 0) + 1
+    cache_size = sum(os.path.getsize(entry_path) for entry_path, _, _, _ in cache_entries)
+    print(f"{len(cache_entries)} cached runs using {cache_size / 1024 / 1024:.1f}MB: "
+          f"{', '.join(f'{name} {count}' for name, count in sorted(counts.items())) or 'empty'}")
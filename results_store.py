@@ -0,0 +1,213 @@
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+import simulation_file
+import simulation_paths
+import statistics
+
+index_path = "simulations/index.db"
+# summary metrics saved for every algorithm run, e.g. p95_wait or mean_total
+metrics = [f"{statistic}_{category}" for category in ("wait", "in_lift", "total") for statistic in
+           ("mean", "p50", "p90", "p95", "p99", "max")] + ["throughput"]
+
+
+def connect() -> sqlite3.Connection:
+    """
+    Opens the index, creating it from the existing simulation files the first time
+    :return: connection to the index
+    """
+    if not os.path.exists("simulations"):
+        os.makedirs("simulations")
+    connection = sqlite3.connect(index_path, timeout=60, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("""CREATE TABLE IF NOT EXISTS scenarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, floors INTEGER, capacity INTEGER, user_count INTEGER,
+        generator TEXT, created REAL)""")
+    connection.execute(f"""CREATE TABLE IF NOT EXISTS runs (
+        scenario_id INTEGER, algorithm TEXT, user_count INTEGER, {", ".join(f"{metric} REAL" for metric in metrics)},
+        created REAL, PRIMARY KEY (scenario_id, algorithm))""")
+    connection.execute("CREATE INDEX IF NOT EXISTS scenarios_floors ON scenarios (floors)")
+    connection.execute("CREATE INDEX IF NOT EXISTS runs_algorithm ON runs (algorithm, scenario_id)")
+    connection.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+    # lower bound on the mean total time of any schedule, found by optimal_solver.py
+    connection.execute("""CREATE TABLE IF NOT EXISTS bounds (
+        scenario_id INTEGER PRIMARY KEY, mean_total REAL, optimal INTEGER, created REAL)""")
+    # the first process to get here indexes the simulations that were saved before the index existed
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        if connection.execute("SELECT value FROM settings WHERE key = 'indexed'").fetchone() is None:
+            index_existing_simulations(connection)
+            connection.execute("INSERT INTO settings VALUES ('indexed', '1')")
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    return connection
+
+
+def index_existing_simulations(connection: sqlite3.Connection):
+    """
+    Adds every simulation file and its outputs to the index
+    :param connection: connection to the index inside a transaction
+    """
+    ids = set()
+    for name in os.listdir("simulations"):
+        match = re.fullmatch(r"simulation_(\d+)\.(lift|json)", name)
+        if match:
+            ids.add(int(match.group(1)))
+    for simulation_id in sorted(ids):
+        try:
+            path = simulation_paths.get_simulation_path(simulation_id)
+            json_path = simulation_paths.get_json_simulation_path(simulation_id)
+            if os.path.exists(path):
+                floors, capacity, user_count = simulation_file.read_header(path)
+            else:
+                with open(json_path, "r") as f:
+                    json_data = json.load(f)
+                floors, capacity = json_data["floors"], json_data["lift capacity"]
+                user_count = sum(key.isdigit() for key in json_data)
+            connection.execute("INSERT INTO scenarios VALUES (?, ?, ?, ?, NULL, ?)",
+                               (simulation_id, floors, capacity, user_count, time.time()))
+            for name, output in simulation_file.read_all_outputs(path, json_path).items():
+                insert_run(connection, simulation_id, name, *output)
+        except Exception as e:
+            print(f"Could not index simulation {simulation_id}: {e}")
+
+
+def add_scenario(floors: int, capacity: int, generator: Dict | None = None) -> int:
+    """
+    Adds a scenario to the index giving it a new id. Safe to call from many processes at once
+    :param floors: number of floors in the scenario
+    :param capacity: capacity of the lift
+    :param generator: parameters the scenario was generated with
+    :return: id of the scenario
+    """
+    with closing(connect()) as connection:
+        cursor = connection.execute(
+            "INSERT INTO scenarios (floors, capacity, user_count, generator, created) VALUES (?, ?, NULL, ?, ?)",
+            (floors, capacity, json.dumps(generator) if generator is not None else None, time.time()))
+        return cursor.lastrowid
+
+
+def remove_scenario(scenario_id: int):
+    """
+    Removes a scenario that could not be saved from the index
+    """
+    with closing(connect()) as connection:
+        connection.execute("DELETE FROM scenarios WHERE id = ?", (scenario_id,))
+
+
+def set_user_count(scenario_id: int, user_count: int):
+    """
+    Records how many users a scenario has once they have all been written
+    """
+    with closing(connect()) as connection:
+        connection.execute("UPDATE scenarios SET user_count = ? WHERE id = ?", (user_count, scenario_id))
+
+
+def record_run(scenario_id: int, algorithm: str, start_times: np.ndarray, start_traveling_times: np.ndarray,
+               finish_times: np.ndarray):
+    """
+    Saves summary metrics for the output of an algorithm, replacing any earlier run of the same algorithm
+    :param scenario_id: id of the scenario
+    :param algorithm: name the output was saved under
+    :param start_times: when each user arrived
+    :param start_traveling_times: when each user got in the lift
+    :param finish_times: when each user got out of the lift
+    """
+    with closing(connect()) as connection:
+        insert_run(connection, scenario_id, algorithm, start_times, start_traveling_times, finish_times)
+
+
+def insert_run(connection: sqlite3.Connection, scenario_id: int, algorithm: str, start_times: np.ndarray,
+               start_traveling_times: np.ndarray, finish_times: np.ndarray):
+    """
+    Works out the summary metrics of an output and writes them to the index
+    """
+    values = get_metrics(start_times, start_traveling_times, finish_times)
+    connection.execute(f"INSERT OR REPLACE INTO runs VALUES (?, ?, ?, {', '.join('?' for metric in metrics)}, ?)",
+                       (scenario_id, algorithm, len(start_times), *values, time.time()))
+
+
+def get_metrics(start_times: np.ndarray, start_traveling_times: np.ndarray, finish_times: np.ndarray) -> List[float]:
+    """
+    :return: the summary metrics of an output in the order of metrics
+    """
+    values = []
+    for times in statistics.get_times(start_times, start_traveling_times, finish_times):
+        summary = statistics.get_summary(times)
+        values.extend(summary[statistic] for statistic in ("mean", "p50", "p90", "p95", "p99", "max"))
+    values.append(statistics.get_throughput(start_times, finish_times))
+    return values
+
+
+def get_scenario_ids() -> List[int]:
+    """
+    :return: id of every indexed scenario
+    """
+    with closing(connect()) as connection:
+        return [row[0] for row in connection.execute("SELECT id FROM scenarios ORDER BY id")]
+
+
+def get_runs(scenario_id: int) -> Dict[str, Dict[str, float]]:
+    """
+    :return: the summary metrics of every algorithm run on a scenario
+    """
+    with closing(connect()) as connection:
+        rows = connection.execute(f"SELECT algorithm, {', '.join(metrics)} FROM runs WHERE scenario_id = ?",
+                                  (scenario_id,)).fetchall()
+    return {row[0]: dict(zip(metrics, row[1:])) for row in rows}
+
+
+def record_bound(scenario_id: int, mean_total: float, optimal: bool):
+    """
+    Saves the lower bound the solver found for a scenario, replacing any earlier one
+    :param scenario_id: id of the scenario
+    :param mean_total: no schedule can have a lower mean total time
+    :param optimal: if the bound is the mean total time of the best schedule
+    """
+    with closing(connect()) as connection:
+        connection.execute("INSERT OR REPLACE INTO bounds VALUES (?, ?, ?, ?)",
+                           (scenario_id, mean_total, int(optimal), time.time()))
+
+
+def get_bound(scenario_id: int) -> Tuple[float, bool] | None:
+    """
+    :return: the lower bound on the mean total time of a scenario and if it is optimal, None if it was not solved
+    """
+    with closing(connect()) as connection:
+        row = connection.execute("SELECT mean_total, optimal FROM bounds WHERE scenario_id = ?",
+                                 (scenario_id,)).fetchone()
+    return (row[0], bool(row[1])) if row is not None else None
+
+
+def find_scenarios_where_better(algorithm: str, other_algorithm: str, metric: str = "p95_wait",
+                                floors: int | None = None) -> List[int]:
+    """
+    Finds scenarios where one algorithm beat another, e.g. all 50 floor scenarios where LOOK beat SCAN on p95 wait
+    :param algorithm: the algorithm that should be better
+    :param other_algorithm: the algorithm it is compared to
+    :param metric: the metric to compare, lower is better except for throughput
+    :param floors: only look at scenarios with this many floors
+    :return: ids of the scenarios
+    """
+    if metric not in metrics:
+        raise Exception(f"Metric {metric} not found.")
+    comparison = ">" if metric == "throughput" else "<"
+    query = f"""SELECT scenarios.id FROM runs AS first
+        JOIN runs AS second ON second.scenario_id = first.scenario_id AND second.algorithm = ?
+        JOIN scenarios ON scenarios.id = first.scenario_id
+        WHERE first.algorithm = ? AND first.{metric} {comparison} second.{metric}"""
+    parameters = [other_algorithm, algorithm]
+    if floors is not None:
+        query += " AND scenarios.floors = ?"
+        parameters.append(floors)
+    with closing(connect()) as connection:
+        return [row[0] for row in connection.execute(query + " ORDER BY scenarios.id", parameters)]
@@ -0,0 +1,89 @@
+from typing import Iterator
+
+import numpy as np
+
+import simulation_file
+
+# how users arrive over the simulation and where they go
+#   uniform: users arrive at any time and travel between random floors
+#   poisson: users arrive as a poisson process and travel between random floors
+#   up_peak: morning rush, most users arrive at the lobby and go up
+#   two_way: lunch time, users go both to and from the lobby
+#   down_peak: evening rush, most users go down to the lobby
+profiles = ("uniform", "poisson", "up_peak", "two_way", "down_peak")
+# share of users going (up from the lobby, down to the lobby) for each profile, the rest travel between random floors
+lobby_traffic = {"uniform": (0, 0), "poisson": (0, 0), "up_peak": (0.85, 0.05), "two_way": (0.45, 0.45),
+                 "down_peak": (0.05, 0.85)}
+# centre of the rush as a fraction of the simulation length
+peak_centres = {"up_peak": 0.4, "two_way": 0.5, "down_peak": 0.6}
+peak_spread = 0.15
+
+
+def generate_chunks(total_floors: int, user_count: int, max_start_time: int, profile: str = "uniform",
+                    seed: int | None = None, chunk_size: int = 1_000_000, lobby_floor: int = 0) -> Iterator[
+        np.ndarray]:
+    """
+    Randomly generates the users of a simulation a chunk at a time. The same seed and chunk size always gives the
+    same users
+    :param total_floors: total number of floors in the simulation
+    :param user_count: how many users to simulate
+    :param max_start_time: how long it can take for a user to spawn
+    :param profile: how users arrive and where they go, one of profiles
+    :param seed: seed for the random numbers, None for a random simulation
+    :param chunk_size: how many users to create at once
+    :param lobby_floor: the floor rush hour traffic goes to and from
+    :return: scenario records for each chunk of users
+    """
+    # checked before anything is generated so a bad setting fails before the simulation is given an id and a file
+    if total_floors < 2:
+        raise Exception("A simulation needs at least 2 floors.")
+    if profile not in profiles:
+        raise Exception(f"Profile {profile} not found.")
+    if user_count < 0 or max_start_time < 0:
+        raise Exception("User count and maximum start time can not be negative.")
+    if not 0 <= lobby_floor < total_floors:
+        raise Exception(f"Lobby floor must be between 0 and {total_floors - 1}.")
+    return create_chunks(total_floors, user_count, max_start_time, profile, seed, chunk_size, lobby_floor)
+
+
+def create_chunks(total_floors: int, user_count: int, max_start_time: int, profile: str, seed: int | None,
+                  chunk_size: int, lobby_floor: int) -> Iterator[np.ndarray]:
+    """
+    Generates the chunks of users for generate_chunks once its settings have been checked
+    """
+    chunk_seeds = np.random.SeedSequence(seed).spawn((user_count + chunk_size - 1) // chunk_size)
+    poisson_time = 0.0
+    for chunk_index, chunk_start in enumerate(range(0, user_count, chunk_size)):
+        rng = np.random.default_rng(chunk_seeds[chunk_index])
+        size = min(chunk_size, user_count - chunk_start)
+        records = np.empty(size, dtype=simulation_file.scenario_dtype)
+        records["id"] = np.arange(chunk_start, chunk_start + size)
+
+        # pick floors, adding an offset means the end floor is never the start floor
+        start_floors = rng.integers(0, total_floors, size)
+        end_floors = (start_floors + rng.integers(1, total_floors, size)) % total_floors
+        up_share, down_share = lobby_traffic[profile]
+        traffic = rng.random(size)
+        going_up = traffic < up_share
+        going_down = (traffic >= up_share) & (traffic < up_share + down_share)
+        other_floors = (lobby_floor + rng.integers(1, total_floors, size)) % total_floors
+        start_floors[going_up] = lobby_floor
+        end_floors[going_up] = other_floors[going_up]
+        start_floors[going_down] = other_floors[going_down]
+        end_floors[going_down] = lobby_floor
+        records["start_floor"] = start_floors
+        records["end_floor"] = end_floors
+
+        # pick arrival times
+        if profile == "uniform":
+            records["start_time"] = rng.integers(0, max_start_time + 1, size)
+        elif profile == "poisson":
+            # gaps between arrivals are exponential with a rate that spreads users over the whole simulation
+            arrivals = poisson_time + np.cumsum(rng.exponential(max_start_time / max(user_count, 1), size))
+            poisson_time = arrivals[-1]
+            # the last few arrivals can fall after the end of the simulation
+            records["start_time"] = np.minimum(np.floor(arrivals), max_start_time)
+        else:
+            arrivals = rng.normal(peak_centres[profile] * max_start_time, peak_spread * max_start_time, size)
+            records["start_time"] = np.clip(np.rint(arrivals), 0, max_start_time)
+        yield records
@@ -0,0 +1,176 @@
+import json
+import os
+from typing import Iterable, Tuple, Dict
+
+import numpy as np
+
+# Layout of a .lift simulation file, every number is a little endian 64 bit int:
+#   header: magic, floors, lift capacity, user count
+#   scenario: one fixed width record per user (scenario_dtype)
+#   outputs: any number of sections appended after the scenario, each one is
+#       output magic, name length, name (padded to 8 bytes), row count, one record per user (output_dtype)
+#   a later output with the same name replaces an earlier one
+simulation_magic = b"LIFTSIM1"
+output_magic = b"LIFTOUT1"
+header_size = 32
+scenario_dtype = np.dtype([("id", "<i8"), ("start_floor", "<i4"), ("end_floor", "<i4"), ("start_time", "<i8")])
+output_dtype = np.dtype([("start_traveling_time", "<i8"), ("finish_time", "<i8")])
+
+
+def write_simulation(path: str, total_floors: int, lift_capacity: int, chunks: Iterable[np.ndarray]) -> int:
+    """
+    Writes a new simulation file streaming the users to disk a chunk at a time
+    :param path: file to write
+    :param total_floors: number of floors in the simulation
+    :param lift_capacity: capacity of the lift
+    :param chunks: arrays of scenario_dtype records
+    :return: how many users were written
+    """
+    user_count = 0
+    with open(path, "wb") as f:
+        f.write(simulation_magic + np.array([total_floors, lift_capacity, 0], dtype="<i8").tobytes())
+        for chunk in chunks:
+            f.write(np.ascontiguousarray(chunk, dtype=scenario_dtype).tobytes())
+            user_count += len(chunk)
+        # fill in the user count now it is known
+        f.seek(len(simulation_magic) + 16)
+        f.write(np.array([user_count], dtype="<i8").tobytes())
+    return user_count
+
+
+def read_header(path: str) -> Tuple[int, int, int]:
+    """
+    :return: the floors, lift capacity and user count of a simulation file
+    """
+    with open(path, "rb") as f:
+        header = f.read(header_size)
+    if len(header) != header_size or header[:len(simulation_magic)] != simulation_magic:
+        raise Exception("Simulation file not valid.")
+    floors, lift_capacity, user_count = np.frombuffer(header, dtype="<i8", offset=len(simulation_magic)).tolist()
+    return floors, lift_capacity, user_count
+
+
+def read_simulation(path: str) -> Tuple[np.ndarray, int, int]:
+    """
+    Memory maps the users of a simulation file so nothing is read until it is used
+    :param path: file to read
+    :return: scenario_dtype records, floors and lift capacity
+    """
+    floors, lift_capacity, user_count = read_header(path)
+    return map_records(path, scenario_dtype, header_size, user_count), floors, lift_capacity
+
+
+def append_output(path: str, name: str, start_traveling_times: np.ndarray, finish_times: np.ndarray):
+    """
+    Adds the output of an algorithm to the end of a simulation file without touching what is already there
+    :param path: simulation file
+    :param name: name of the algorithm
+    :param start_traveling_times: when each user got in the lift in scenario order
+    :param finish_times: when each user got out of the lift in scenario order
+    """
+    user_count = read_header(path)[2]
+    if len(start_traveling_times) != user_count or len(finish_times) != user_count:
+        raise Exception("Output does not match the simulation.")
+    records = np.empty(user_count, dtype=output_dtype)
+    records["start_traveling_time"] = start_traveling_times
+    records["finish_time"] = finish_times
+    encoded_name = name.encode()
+    padding = b"\0" * (-len(encoded_name) % 8)
+    # drop a section that was only partly written so the new one can be found after it
+    end = find_sections(path)[1]
+    with open(path, "r+b") as f:
+        f.truncate(end)
+        f.seek(end)
+        f.write(output_magic + np.array([len(encoded_name)], dtype="<i8").tobytes() + encoded_name + padding +
+                np.array([user_count], dtype="<i8").tobytes() + records.tobytes())
+
+
+def read_outputs(path: str) -> Dict[str, np.ndarray]:
+    """
+    Finds every algorithm output in a simulation file and memory maps them. Only the section headers are read
+    :param path: simulation file
+    :return: output_dtype records for each algorithm name
+    """
+    sections, _ = find_sections(path)
+    return {name: map_records(path, output_dtype, offset, count) for name, (offset, count) in sections.items()}
+
+
+def find_sections(path: str) -> Tuple[Dict[str, Tuple[int, int]], int]:
+    """
+    Reads the section headers of a simulation file up to the last section that was completely written
+    :param path: simulation file
+    :return: the data offset and row count of each algorithm output and where the last complete section ends
+    """
+    user_count = read_header(path)[2]
+    file_size = os.path.getsize(path)
+    offset = header_size + user_count * scenario_dtype.itemsize
+    sections = {}
+    with open(path, "rb") as f:
+        # anything after the last complete section was only partly written and is ignored
+        while offset + 16 <= file_size:
+            f.seek(offset)
+            section = f.read(16)
+            if section[:len(output_magic)] != output_magic:
+                raise Exception("Simulation file not valid.")
+            name_length = int(np.frombuffer(section, dtype="<i8", offset=8)[0])
+            padded_length = name_length + (-name_length % 8)
+            data_offset = offset + 24 + padded_length
+            if data_offset > file_size:
+                break
+            name = f.read(name_length).decode()
+            f.seek(offset + 16 + padded_length)
+            row_count = int(np.frombuffer(f.read(8), dtype="<i8")[0])
+            if data_offset + row_count * output_dtype.itemsize > file_size:
+                break
+            sections[name] = (data_offset, row_count)
+            offset = data_offset + row_count * output_dtype.itemsize
+    return sections, offset
+
+
+def read_all_outputs(path: str, json_path: str) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Reads the output of every algorithm from a simulation file, or from a simulation in the old json format if there
+    is no simulation file yet
+    :param path: simulation file
+    :param json_path: json simulation to read when there is no simulation file
+    :return: when each user arrived, got in the lift and got out of the lift for each output name
+    """
+    if not os.path.exists(path):
+        with open(json_path, "r") as f:
+            raw_data = json.load(f)
+        outputs = {}
+        for name, output in raw_data.get("algorithm output", {}).items():
+            data = np.array(list(output.values()), dtype=np.int64).reshape(-1, 3)
+            outputs[name] = (data[:, 0], data[:, 1], data[:, 2])
+        return outputs
+    records = read_simulation(path)[0]
+    return {name: (records["start_time"], output["start_traveling_time"], output["finish_time"]) for name, output in
+            read_outputs(path).items()}
+
+
+def map_records(path: str, dtype: np.dtype, offset: int, count: int) -> np.ndarray:
+    """
+    :return: read only memory mapped view of count records starting at offset
+    """
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+
+def import_json_simulation(json_path: str, path: str):
+    """
+    Converts a simulation saved in the old json format, including any algorithm outputs, into a simulation file
+    :param json_path: json simulation to read
+    :param path: simulation file to write
+    """
+    with open(json_path, "r") as f:
+        json_data = json.load(f)
+    user_ids = [key for key in json_data if key.isdigit()]
+    records = np.empty(len(user_ids), dtype=scenario_dtype)
+    records["id"] = [int(key) for key in user_ids]
+    for index, field in enumerate(("start_floor", "end_floor", "start_time")):
+        records[field] = [json_data[key][index] for key in user_ids]
+    write_simulation(path, json_data["floors"], json_data["lift capacity"], [records])
+
+    for name, output in json_data.get("algorithm output", {}).items():
+        append_output(path, name, [output[key][1] for key in user_ids], [output[key][2] for key in user_ids])
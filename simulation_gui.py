@@ -1,14 +1,19 @@
 import json
 import math
-from copy import copy
-from typing import List, Dict, Tuple
+import time
+from typing import List, Dict, Tuple, Callable
 
+import numpy as np
 import pygame
 from pygame.time import Clock
 
+import instrumentation
 import simulation_handler
+from action_trace import ActionTrace, load_trace
+from floor_queues import FloorQueues, OrderedUsers
 from lift_algorithms.lift import BaseLiftAlgorithm, LiftAction, Action
-from user import User, UserQueue
+from render_cache import RenderCache
+from user import User, UserQueue, UserTable
 
 #simulation dimensions
 window_size = 1000
@@ -32,8 +37,12 @@ class SimulationGUI:
     user_image_width: int
     user_image_height: int
     show_user_info: bool = False
+    cache: RenderCache
+    background: pygame.Surface | None = None
+    region_signatures: Dict[int, tuple]  # what each area of the window looked like when it was last drawn
 
     constants: Dict[str, int]
+    users: UserTable
     future_users: UserQueue
     total_floors: int
     capacity: int
@@ -41,10 +50,11 @@ class SimulationGUI:
     total_users: int
     finished_users: List[User]
     current_floor: int
-    lift_occupants: List[User]
-    floors: List[List[User]]
+    lift_occupants: OrderedUsers
+    floors: FloorQueues
 
     simulation_speed: float = 2
+    frame_rate: int = 60  # how many updates make up one second of simulation at speed 1
     simulation_time: float = 0
     simulation_running: bool = True
     next_action_time: float = 0
@@ -59,28 +69,41 @@ class SimulationGUI:
         self.win = pygame.display.set_mode((window_size, window_size), pygame.HWSURFACE | pygame.DOUBLEBUF)
         self.user_image = pygame.image.load('data/user_image.png').convert_alpha()
         self.user_image_width, self.user_image_height = self.user_image.get_size()
+        self.cache = RenderCache()
 
         # load the constants
         with open("data/constants.json", "r") as f:
             self.constants = json.load(f)
 
         # set up values
-        (self.future_users, self.total_floors, self.capacity) = simulation_handler.open_simulation(simulation_id)
+        hooks = instrumentation.get_hooks()
+        if hooks is not None:
+            hooks.start(algorithm.name, "gui")
+        load_start = time.perf_counter_ns()
+        (self.users, self.total_floors, self.capacity) = simulation_handler.open_simulation(simulation_id)
+        if hooks is not None:
+            hooks.load(time.perf_counter_ns() - load_start, len(self.users))
+        self.future_users = self.users.create_queue()
         self.algorithm = algorithm
         self.algorithm.set_capacity(self.capacity)
         self.total_users = self.future_users.get_size()
         self.finished_users: List[User] = []
         self.current_floor = self.constants["start floor"]
-        self.lift_occupants = []
-        self.floors = [[] for floor in range(self.total_floors)]
+        self.lift_occupants = {}
+        self.floors = FloorQueues(self.total_floors)
 
         self.run_main_loop()
 
     def run_main_loop(self):
+        run_start = time.perf_counter_ns()
         while not self.quit:
             # check finished
             if len(self.finished_users) == self.total_users:
+                hooks = instrumentation.get_hooks()
+                if hooks is not None:
+                    hooks.finish(math.floor(self.simulation_time), time.perf_counter_ns() - run_start)
                 break
+            self.clock.tick(self.frame_rate)
             self.update()
             self.render()
             self.get_user_input()
@@ -89,31 +112,72 @@ class SimulationGUI:
 
     def render(self):
         """
-        Render everything to the pygame window then flip it
+        Redraws the parts of the window that have changed since the last frame and updates only those parts of the
+        display
         :return:
         """
-        # fill background
-        self.win.fill(background_color)
+        dirty_rects = []
+        # the background, floors and floor numbers never change so are only drawn once
+        if self.background is None:
+            self.background = self.render_background()
+            self.win.blit(self.background, (0, 0))
+            self.region_signatures = {}
+            dirty_rects.append(self.win.get_rect())
 
         # draw simulation
-        self.render_lift_shaft()
-        self.render_floors()
+        dirty_rects.extend(self.render_lift_shaft())
+        dirty_rects.extend(self.render_floors())
 
         # update display
-        pygame.display.flip()
+        if len(dirty_rects) > 0:
+            pygame.display.update(dirty_rects)
 
-    def render_lift_shaft(self):
+    def render_background(self) -> pygame.Surface:
         """
-        Renders the lift and floor numbers to the pygame window
+        Renders the parts of the window that never change
+        :return: surface the size of the window
         """
+        background = pygame.Surface((window_size, window_size))
+        background.fill(background_color)
         # render floor numbers in shaft
+        font_size = int(self.get_floor_height() * 0.9)
         for floor in range(self.total_floors):
-            font = pygame.font.SysFont("monospace", int(self.get_floor_height() * 0.9))
-            floor_label = font.render(str(self.total_floors - floor - 1), True, floor_label_color)
-            self.win.blit(floor_label, (padding + (lift_width - floor_label.get_width()) / 2,
-                                        self.get_floor_height() * floor + (
-                                                self.get_floor_height() - floor_label.get_height()) / 2))
+            floor_label = self.cache.get_text(str(self.total_floors - floor - 1), font_size, floor_label_color)
+            background.blit(floor_label, (padding + (lift_width - floor_label.get_width()) / 2,
+                                          self.get_floor_height() * floor + (
+                                                  self.get_floor_height() - floor_label.get_height()) / 2))
+        # draw floors
+        for floor in range(self.total_floors):
+            floor_y = self.get_floor_height() * (floor + 1)
+            pygame.draw.rect(background, floor_color, (
+                padding + lift_width, floor_y, window_size - (padding + lift_width),
+                self.get_floor_height() * 0.1))
+        return background
 
+    def render_region(self, key: int, area: pygame.Rect, signature: tuple, draw: Callable[[], None]) -> List[
+            pygame.Rect]:
+        """
+        Redraws an area of the window if what is in it has changed since it was last drawn
+        :param key: which area it is
+        :param area: the area of the window
+        :param signature: everything that decides what the area looks like
+        :param draw: draws the area
+        :return: the area if it was redrawn
+        """
+        if self.region_signatures.get(key) == signature:
+            return []
+        self.region_signatures[key] = signature
+        self.win.blit(self.background, area, area)
+        self.win.set_clip(area)
+        draw()
+        self.win.set_clip(None)
+        return [area]
+
+    def render_lift_shaft(self) -> List[pygame.Rect]:
+        """
+        Renders the lift and the users in it to the pygame window
+        :return: the area of the window that changed
+        """
         # render lift
         lift_y = 1000 - padding - (self.get_floor_height() * (self.current_floor + 1))
         if self.current_action.action == Action.move_down:
@@ -121,16 +185,13 @@ class SimulationGUI:
         elif self.current_action.action == Action.move_up:
             lift_y -= self.get_floor_height() * self.get_percent_through_animation()
 
-        # render the lift
-        pygame.draw.rect(self.win, lift_color, (padding, lift_y, lift_width, self.get_floor_height()))
-
         # render users in lift
         user_y = lift_y + self.get_floor_height()
         user_x = padding
         user_scale = min(self.get_floor_height() / self.user_image_height,
                          lift_width / (self.user_image_width * self.capacity))
         #work out who to show in the lift
-        rendered_users = copy(self.lift_occupants)
+        rendered_users = list(self.lift_occupants)
         opacity = -1
         if self.current_action.action == Action.open_doors:
             people_leaving: bool =  not len(self.current_action.remove) == 0
@@ -151,78 +212,113 @@ class SimulationGUI:
                     rendered_users = [user for user in rendered_users if (user not in self.current_action.remove)]
                     opacity = 255 * ( (self.get_percent_through_animation() - 0.5) * 2)
 
-        #render each of the users in the lift
+        #work out how each of the users in the lift look
+        sprites = []
         for user in rendered_users:
             # enable opacity where needed
             if self.current_action.action == Action.open_doors and (self.current_action.add is not None and user in self.current_action.add) or (self.current_action.remove is not None and user in self.current_action.remove):
-                self.render_user(user, (user_x, user_y), user_scale, opacity)
+                sprites.append(self.get_user_sprite(user, (user_x, user_y), user_scale, opacity))
             else:
-                self.render_user(user, (user_x, user_y), user_scale)
+                sprites.append(self.get_user_sprite(user, (user_x, user_y), user_scale))
             user_x += self.user_image_width * user_scale
 
-    def render_floors(self):
+        def draw():
+            pygame.draw.rect(self.win, lift_color, (padding, lift_y, lift_width, self.get_floor_height()))
+            self.draw_user_sprites(sprites)
+
+        return self.render_region(-1, pygame.Rect(0, 0, padding + lift_width, window_size), (int(lift_y), *sprites),
+                                  draw)
+
+    def render_floors(self) -> List[pygame.Rect]:
         """
-        Renders floors and waiting users to pygame window
+        Renders waiting users to pygame window
+        :return: the areas of the window that changed
         """
+        dirty_rects = []
+        # looked up for every waiting user so a busy floor does not search the list of users getting in for each one
+        boarding = set(self.current_action.add) if self.current_action.action == Action.open_doors else set()
         for floor in range(self.total_floors):
             floor_y = self.get_floor_height() * (floor + 1)
-            # draw floor
-            pygame.draw.rect(self.win, floor_color, (
-                padding + lift_width, floor_y, window_size - (padding + lift_width),
-                self.get_floor_height() * 0.1))
+            area = pygame.Rect(padding + lift_width, int(floor_y - self.get_floor_height()),
+                               window_size - (padding + lift_width),
+                               int(floor_y) - int(floor_y - self.get_floor_height()))
 
-            # draw people on the floor
+            # work out how the people on the floor look
             users = self.floors[self.total_floors - 1 - floor]
-            if len(users) == 0:
-                continue
-
-            user_x_offset = padding + lift_width + padding
-            user_width_with_spacer = self.user_image_width * 1.05
-            user_scale = min((self.get_floor_height() * 0.9) / self.user_image_height,
-                             (window_size - (2 * padding + lift_width)) / (user_width_with_spacer * len(users)))
-            for user in users:
-                # check if user should fade out
-                # check if the user is fading out
-                opacity = -1
-                if self.current_action.action == Action.open_doors and user in self.current_action.add:
-                    opacity = 255 * (1 - self.get_percent_through_animation())
-                # send the user to be rendered
-                self.render_user(user, (user_x_offset, floor_y), user_scale, opacity)
-                user_x_offset += user_width_with_spacer * user_scale
-
-    def render_user(self, user: User, feet_pos: Tuple[float, float], scale: float, opacity=-1):
-        """
-        Renders a user on the pygame window
+            sprites = []
+            if len(users) != 0:
+                user_x_offset = padding + lift_width + padding
+                user_width_with_spacer = self.user_image_width * 1.05
+                user_scale = min((self.get_floor_height() * 0.9) / self.user_image_height,
+                                 (window_size - (2 * padding + lift_width)) / (user_width_with_spacer * len(users)))
+                for user in users:
+                    # check if the user is fading out
+                    opacity = -1
+                    if user in boarding:
+                        opacity = 255 * (1 - self.get_percent_through_animation())
+                    sprites.append(self.get_user_sprite(user, (user_x_offset, floor_y), user_scale, opacity))
+                    user_x_offset += user_width_with_spacer * user_scale
+
+            dirty_rects.extend(self.render_region(floor, area, tuple(sprites),
+                                                  lambda sprites=sprites: self.draw_user_sprites(sprites)))
+        return dirty_rects
+
+    def get_user_sprite(self, user: User, feet_pos: Tuple[float, float], scale: float,
+                        opacity=-1) -> Tuple[int, int, int, int, int, Tuple[str, ...] | None]:
+        """
+        Works out how a user will look on the pygame window
         :param user: user to render
         :param feet_pos: where to render the users feet
         :param scale: how big render the user
         :param opacity: the opacity of the user
+        :return: the x, y, width, height and opacity of the user and the info shown on them
         """
-        user_surface = pygame.Surface((self.user_image_width, self.user_image_height), pygame.SRCALPHA)
         user_time = self.simulation_time - user.start_time
-        # render user image
-        user_surface.blit(self.user_image, (0, 0))
-
+        width = int(self.user_image_width * scale)
+        height = int(self.user_image_height * scale)
+        # fade the user if they are new
+        if opacity != -1:
+            alpha = int(opacity)
+        elif user_time < 1:
+            alpha = round(255 * user_time)
+        else:
+            alpha = 255
         # add relevant data if enabled
+        info = None
         if self.show_user_info:
-            font = pygame.font.SysFont("monospace", 30)
-            target_floor_text = font.render(f"End:{user.end_floor}", True, user_info_color)
-            user_id_text = font.render(f"Id:{user.id}", True, user_info_color)
-            user_time_text = font.render(f"T:{round(user_time)}", True, user_info_color)
-            user_surface.blit(target_floor_text, ((self.user_image_width - target_floor_text.get_size()[0]) / 2, 0))
-            user_surface.blit(user_id_text, ((self.user_image_width - user_id_text.get_size()[0]) / 2, 50))
-            user_surface.blit(user_time_text, ((self.user_image_width - user_time_text.get_size()[0]) / 2, 100))
+            info = (f"End:{user.end_floor}", f"Id:{user.id}", f"T:{round(user_time)}")
+        return int(feet_pos[0]), int(feet_pos[1] - self.user_image_height * scale), width, height, alpha, info
 
+    def draw_user_sprites(self, sprites: List[Tuple[int, int, int, int, int, Tuple[str, ...] | None]]):
+        """
+        Draws users to the pygame window using cached images
+        :param sprites: how each user looks from get_user_sprite
+        """
+        for x, y, width, height, alpha, info in sprites:
+            user_surface = self.cache.get(("user", width, height, info),
+                                          lambda: self.create_user_surface(width, height, info))
+            # the surface is shared so the opacity is set every time it is drawn
+            user_surface.set_alpha(alpha)
+            self.win.blit(user_surface, (x, y))
+
+    def create_user_surface(self, width: int, height: int, info: Tuple[str, ...] | None) -> pygame.Surface:
+        """
+        Renders the image of a user
+        :param width: width of the image
+        :param height: height of the image
+        :param info: lines of info to write on the user
+        :return: the image
+        """
+        user_surface = pygame.Surface((self.user_image_width, self.user_image_height), pygame.SRCALPHA)
+        # render user image
+        user_surface.blit(self.user_image, (0, 0))
+        # add relevant data if enabled
+        if info is not None:
+            for line, text in enumerate(info):
+                text_surface = self.cache.get_text(text, 30, user_info_color)
+                user_surface.blit(text_surface, ((self.user_image_width - text_surface.get_size()[0]) / 2, line * 50))
         # scale user
-        user_surface = pygame.transform.scale(user_surface,
-                                              (self.user_image_width * scale, self.user_image_height * scale))
-        # fade the user if they are new
-        if opacity != -1:
-            user_surface.set_alpha(opacity)
-        elif user_time < 1:
-            user_surface.set_alpha(round(255 * user_time))
-        # render to screen
-        self.win.blit(user_surface, (feet_pos[0], feet_pos[1] - self.user_image_height * scale))
+        return pygame.transform.scale(user_surface, (width, height))
 
     def get_floor_height(self):
         """
@@ -242,7 +338,7 @@ class SimulationGUI:
         calculates the length of the current action
         :return: length of the current action
         """
-        if self.current_action.action == Action.wait:
+        if self.current_action.action == Action.wait or self.current_action.action == Action.idle:
             return 1
         elif self.current_action.action == Action.move_up or self.current_action.action == Action.move_down:
             return self.constants["time between floors"]
@@ -258,13 +354,13 @@ class SimulationGUI:
         Updates the simulation
         :return:
         """
-        self.clock.tick(60)
+        hooks = instrumentation.get_hooks()
 
         # add new users to floors
         # see if any new lift users have arrived since the last action
         while not self.future_users.is_empty() and self.future_users.peak().start_time <= self.simulation_time:
             user: User = self.future_users.pop()
-            self.floors[user.start_floor].append(user)
+            self.floors.add_user(user)
 
 
         # if animation has finished for last simulation step get the next step
@@ -275,32 +371,45 @@ class SimulationGUI:
             elif self.current_action.action == Action.move_down:
                 self.current_floor -= 1
             elif self.current_action.action == Action.open_doors:
+                if hooks is not None:
+                    doors_start = time.perf_counter_ns()
                 # edit user timings
                 for user in self.current_action.add:
                     user.set_user_start_traveling(math.floor(self.simulation_time))
                 for user in self.current_action.remove:
                     user.set_user_end_traveling(math.floor(self.simulation_time))
                 # remove from queue
-                self.floors[self.current_floor] = [user for user in self.floors[self.current_floor] if
-                                                   user not in self.current_action.add]
-                # change lift occupants
-                self.lift_occupants.extend(self.current_action.add)
-                self.lift_occupants = [user for user in self.lift_occupants if user not in self.current_action.remove]
+                self.floors.remove_users(self.current_floor, self.current_action.add)
+                # change lift occupants, only touching the users getting in and out
+                for user in self.current_action.add:
+                    self.lift_occupants[user] = None
+                for user in self.current_action.remove:
+                    self.lift_occupants.pop(user, None)
                 # add to output
                 self.finished_users.extend(self.current_action.remove)
+                if hooks is not None:
+                    hooks.doors(time.perf_counter_ns() - doors_start, len(self.current_action.add),
+                                len(self.current_action.remove))
 
             # update old action
             self.last_action = self.current_action
             # get the next action
+            if hooks is not None:
+                decision_start = time.perf_counter_ns()
             self.current_action = self.algorithm.calculate(self.lift_occupants, self.floors,
                                                            math.floor(self.simulation_time), self.current_floor)
+            if hooks is not None:
+                hooks.decision(self.current_action, time.perf_counter_ns() - decision_start,
+                               self.floors.get_total_waiting(), len(self.lift_occupants))
+                if self.current_action.action == Action.idle:
+                    hooks.idle(self.get_action_length())
 
             # get time from action
             self.next_action_time = math.floor(self.simulation_time) + self.get_action_length()
 
         # update simulation time
         if self.simulation_running:
-            self.simulation_time += self.simulation_speed / 60
+            self.simulation_time += self.simulation_speed / self.frame_rate
 
         # update information
         pygame.display.set_caption(
@@ -309,7 +418,7 @@ class SimulationGUI:
              Paused: {not self.simulation_running}. 
              Speed: {self.simulation_speed}.
              Finished: {len(self.finished_users)}. In lift: {len(self.lift_occupants)}. 
-             Waiting: {(sum(len(floor) for floor in self.floors))}, 
+             Waiting: {self.floors.get_total_waiting()}, 
              Future: {self.future_users.get_size()}""")
 
     def get_user_input(self):
@@ -319,19 +428,175 @@ class SimulationGUI:
         """
         # listen for user input
         for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                self.quit = True
-            # keyboard
-            if event.type == pygame.KEYDOWN:
-                # pause / play simulation
-                if event.key == pygame.K_SPACE:
-                    self.simulation_running = not self.simulation_running
-                # increase/decrease simulation speed
-                if event.key == pygame.K_LEFT:
-                    self.simulation_speed -= 1
-                if event.key == pygame.K_RIGHT:
-                    self.simulation_speed += 1
-                # toggle user info
-                if event.key == pygame.K_i:
-                    self.show_user_info = not self.show_user_info
+            self.handle_event(event)
+
+    def handle_event(self, event: pygame.event.Event):
+        """
+        Controls the simulation from one input event
+        :param event: pygame event
+        """
+        if event.type == pygame.QUIT:
+            pygame.quit()
+            self.quit = True
+        # keyboard
+        if event.type == pygame.KEYDOWN:
+            # pause / play simulation
+            if event.key == pygame.K_SPACE:
+                self.simulation_running = not self.simulation_running
+            # increase/decrease simulation speed
+            if event.key == pygame.K_LEFT:
+                self.simulation_speed -= 1
+            if event.key == pygame.K_RIGHT:
+                self.simulation_speed += 1
+            # toggle user info
+            if event.key == pygame.K_i:
+                self.show_user_info = not self.show_user_info
+
+
+class ReplayGUI(SimulationGUI):
+    """
+    Shows a run recorded as an ActionTrace instead of running the algorithm again. Any time can be jumped to by
+    rebuilding the state from the keyframe before it
+    """
+    trace: ActionTrace
+    action_index: int = 0
+    start_time: float
+    # users in the order they arrive, and the position of the next one to arrive
+    arrival_order: np.ndarray
+    sorted_start_times: np.ndarray
+    next_arrival: int = 0
+    # the user object shown for each row so the same user is always the same object
+    user_views: Dict[int, User]
+
+    def __init__(self, algorithm: BaseLiftAlgorithm, simulation_id: int, start_time: float = 0):
+        """
+        :param algorithm: algorithm the trace was recorded with
+        :param simulation_id: simulation the trace was recorded on
+        :param start_time: time to start the replay at
+        """
+        self.trace = load_trace(simulation_handler.get_trace_path(simulation_id, algorithm.name))
+        if len(self.trace) == 0:
+            raise Exception("Trace has no actions.")
+        self.start_time = start_time
+        super().__init__(algorithm, simulation_id)
+
+    def run_main_loop(self):
+        self.arrival_order = np.argsort(self.users.start_times, kind="stable")
+        self.sorted_start_times = self.users.start_times[self.arrival_order]
+        self.seek(self.start_time)
+        # keep showing the end so it can be scrubbed back from
+        while not self.quit:
+            self.clock.tick(self.frame_rate)
+            self.update()
+            self.render()
+            self.get_user_input()
+
+        pygame.quit()
+
+    def get_user(self, row: int) -> User:
+        """
+        :return: the user object shown for a row
+        """
+        user = self.user_views.get(row)
+        if user is None:
+            user = self.users.get_user(row)
+            self.user_views[row] = user
+        return user
+
+    def seek(self, time: float):
+        """
+        Jumps to any time in the trace
+        :param time: time to jump to
+        """
+        self.simulation_time = min(max(time, 0), self.trace.end_time)
+        self.action_index = self.trace.get_action_index(self.simulation_time)
+        occupants, queues = self.trace.get_state(self.action_index, self.simulation_time, self.users.start_floors,
+                                                 self.sorted_start_times, self.arrival_order)
+        self.user_views = {}
+        self.lift_occupants = dict.fromkeys(self.get_user(row) for row in occupants)
+        self.floors = FloorQueues(self.total_floors)
+        for queue in queues:
+            for row in queue:
+                self.floors.add_user(self.get_user(row))
+        self.next_arrival = int(np.searchsorted(self.sorted_start_times, self.simulation_time, side="right"))
+        self.load_action()
+
+    def load_action(self):
+        """
+        Shows the action at action_index
+        """
+        _, action, self.current_floor, boarded, alighted = self.trace.get_action(self.action_index)
+        self.current_action = LiftAction(Action(action), [self.get_user(row) for row in boarded.tolist()],
+                                         [self.get_user(row) for row in alighted.tolist()])
+        self.next_action_time = self.trace.get_end_time(self.action_index)
+
+    def next_action(self):
+        """
+        Applies the current action and moves on to the next one
+        """
+        self.floors.remove_users(self.current_floor, self.current_action.add)
+        for user in self.current_action.add:
+            self.lift_occupants[user] = None
+        for user in self.current_action.remove:
+            self.lift_occupants.pop(user, None)
+            del self.user_views[user.row]
+        self.last_action = self.current_action
+        self.action_index += 1
+        self.load_action()
+
+    def get_action_length(self) -> int:
+        return max(self.next_action_time - int(self.trace.times[self.action_index]), 1)
+
+    def update(self):
+        """
+        Moves the replay on, stepping through actions in order or jumping when time goes backwards or far ahead
+        :return:
+        """
+        if self.simulation_running:
+            self.simulation_time = min(max(self.simulation_time + self.simulation_speed / self.frame_rate, 0),
+                                       self.trace.end_time)
+        if self.simulation_time < self.trace.times[self.action_index] or \
+                self.trace.get_action_index(self.simulation_time) - self.action_index > self.trace.keyframe_interval:
+            self.seek(self.simulation_time)
+
+        # add new users to floors
+        while self.next_arrival < len(self.arrival_order) and \
+                self.sorted_start_times[self.next_arrival] <= self.simulation_time:
+            self.floors.add_user(self.get_user(int(self.arrival_order[self.next_arrival])))
+            self.next_arrival += 1
+        # apply every action that has finished
+        while self.simulation_time >= self.next_action_time and self.action_index + 1 < len(self.trace):
+            self.next_action()
+
+        # update information
+        pygame.display.set_caption(
+            f"""Replay of {self.algorithm.name}.
+             Time: {int(self.simulation_time)}/{self.trace.end_time}.
+             Paused: {not self.simulation_running}.
+             Speed: {self.simulation_speed}.
+             Finished: {self.trace.get_finished_count(self.action_index)}. In lift: {len(self.lift_occupants)}.
+             Waiting: {self.floors.get_total_waiting()}""")
+
+    def handle_event(self, event: pygame.event.Event):
+        """
+        Adds jumping through the replay to the normal controls
+        :param event: pygame event
+        """
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_COMMA:
+                self.seek(self.simulation_time - 10)
+            if event.key == pygame.K_PERIOD:
+                self.seek(self.simulation_time + 10)
+            if event.key == pygame.K_LEFTBRACKET:
+                self.seek(self.simulation_time - 100)
+            if event.key == pygame.K_RIGHTBRACKET:
+                self.seek(self.simulation_time + 100)
+            if event.key == pygame.K_HOME:
+                self.seek(0)
+            if event.key == pygame.K_END:
+                self.seek(self.trace.end_time)
+        # click or drag across the window to scrub through the whole run
+        if (event.type == pygame.MOUSEBUTTONDOWN and event.button == 1) or (
+                event.type == pygame.MOUSEMOTION and event.buttons[0]):
+            self.seek(event.pos[0] / window_size * self.trace.end_time)
+        super().handle_event(event)
@@ -1,35 +1,73 @@
-import logging
+import copy
+import heapq
 import os
-from typing import List, Tuple
+import time
+from typing import List, Tuple, Dict, Iterable
 import json
-import random
 
+import numpy as np
+
+import event_trace
+import instrumentation
+import results_store
+import scenario_generator
+import simulation_file
+from action_trace import ActionTrace
+from floor_queues import FloorQueues, OrderedUsers
+from lift_algorithms.dispatcher import BaseDispatcher, CarBank, NearestCarDispatcher
 from lift_algorithms.lift import BaseLiftAlgorithm, LiftAction, Action
-from user import User, UserQueue
-
-
-def save_simulation(values: List[User], total_floors: int, lift_capacity: int):
-    """Saves to the simulation file"""
-    # create dictionary to save
-    output = {"floors": total_floors, "lift capacity": lift_capacity}
-    for value in values:
-        output[value.id] = value.get_simulation_data()
-    # make sure destination folder exists
-    if not os.path.exists("simulations"):
-        os.makedirs("simulations")
-    # write to file
-    with open(f"simulations/simulation_{len(os.listdir("simulations"))}.json", "w") as f:
-        f.write(json.dumps(output, indent=4))
-
-
-def open_simulation(simulation_id: int) -> Tuple[UserQueue, int, int]:
-    """loads the simulation json into a list of users. And the number of floors the simulation has"""
-    users = []
+from simulation_paths import get_simulation_path, get_trace_path, get_metrics_path, get_json_simulation_path
+from user import UserTable
+
+
+def save_simulation(chunks: Iterable[np.ndarray], total_floors: int, lift_capacity: int,
+                    generator: Dict | None = None) -> int:
+    """
+    Saves to the simulation file, writing the users a chunk at a time
+    :param chunks: scenario records of the users (see simulation_file.scenario_dtype)
+    :param total_floors: total number of floors in the simulation
+    :param lift_capacity: capacity of the lift
+    :param generator: parameters the simulation was generated with, saved in the index
+    :return: id of the saved simulation
+    """
+    # the index hands out ids so two processes never save to the same file
+    simulation_id = results_store.add_scenario(total_floors, lift_capacity, generator)
+    try:
+        user_count = simulation_file.write_simulation(get_simulation_path(simulation_id), total_floors, lift_capacity,
+                                                      chunks)
+    except BaseException:
+        # nothing is left behind for a simulation that could not be written
+        if os.path.exists(get_simulation_path(simulation_id)):
+            os.remove(get_simulation_path(simulation_id))
+        results_store.remove_scenario(simulation_id)
+        raise
+    results_store.set_user_count(simulation_id, user_count)
+    return simulation_id
+
+
+def open_simulation(simulation_id: int) -> Tuple[UserTable, int, int]:
+    """
+    loads the simulation file into a table of users. And the number of floors the simulation has.
+    The users are memory mapped straight from the file. Simulations in the old json format are still loaded
+    """
+    if not os.path.exists(get_simulation_path(simulation_id)):
+        return open_json_simulation(simulation_id)
+    records, floors, lift_capacity = simulation_file.read_simulation(get_simulation_path(simulation_id))
+    return UserTable(records["id"], records["start_floor"], records["end_floor"],
+                     records["start_time"]), floors, lift_capacity
+
+
+def open_json_simulation(simulation_id: int) -> Tuple[UserTable, int, int]:
+    """loads the simulation json into a table of users. And the number of floors the simulation has"""
+    ids = []
+    start_floors = []
+    end_floors = []
+    start_times = []
     floors = 0
     lift_capacity = 0
     # make sure that the file is valid
     try:
-        with open(f"simulations/simulation_{simulation_id}.json", "r") as f:
+        with open(get_json_simulation_path(simulation_id), "r") as f:
             json_data = json.load(f)
         for key in json_data:
             if key == "floors":
@@ -42,17 +80,14 @@ def open_simulation(simulation_id: int) -> Tuple[UserQueue, int, int]:
                 # check for valid data
                 if len(json_data[key]) == 3 and type(json_data[key][0]) is int and type(
                         json_data[key][1]) is int and type(json_data[key][2]) is int:
-                    users.append(User(key, json_data[key][0], json_data[key][1], json_data[key][2]))
+                    ids.append(int(key))
+                    start_floors.append(json_data[key][0])
+                    end_floors.append(json_data[key][1])
+                    start_times.append(json_data[key][2])
                 else:
                     raise Exception()
 
-        # add users to a queue in order of arrive time
-        user_queue: UserQueue = UserQueue()
-        user_quick_sort(users, 0, len(users) - 1)
-        for user in users:
-            user_queue.enqueue(user)
-
-        return user_queue, floors, lift_capacity
+        return UserTable(ids, start_floors, end_floors, start_times), floors, lift_capacity
     except FileNotFoundError:
         raise Exception("Simulation file not found.")
     except json.decoder.JSONDecodeError:
@@ -63,85 +98,108 @@ def open_simulation(simulation_id: int) -> Tuple[UserQueue, int, int]:
         raise Exception("Invalid entry in simulation file.")
 
 
-def user_quick_sort(users: List[User], low: int, high: int):
+def save_output(values: UserTable, simulation_id: int, algorithm: BaseLiftAlgorithm, cars: int = 1):
     """
-    Sorts a list of users according to their start time from highest to lowest. Using quick sort.
-    :param users: list being sorted
-    :param low: the lowest value in part of list to look at
-    :param high: the highest value in part of list to look at
+    Saves simulation output to the end of the simulation file
+    :param values: output of the simulation
+    :param simulation_id: id of the simulation
+    :param algorithm: algorithm to use to get the output
+    :param cars: how many cars the simulation was run with, outputs with more than one car are saved separately
     """
-    if low < high:
-        # find partition
-        partition: int = user_quick_sort_partition(users, low, high)
-        # sort both sides
-        user_quick_sort(users, low, partition - 1)
-        user_quick_sort(users, partition + 1, high)
+    # simulations in the old format are converted the first time an output is saved for them
+    if not os.path.exists(get_simulation_path(simulation_id)):
+        simulation_file.import_json_simulation(get_json_simulation_path(simulation_id),
+                                               get_simulation_path(simulation_id))
+    # the same output saved again is left alone rather than added to the file a second time
+    saved = simulation_file.read_outputs(get_simulation_path(simulation_id)).get(get_output_name(algorithm, cars))
+    if saved is not None and np.array_equal(saved["start_traveling_time"], values.start_traveling_times) and \
+            np.array_equal(saved["finish_time"], values.finish_times):
+        return
+    simulation_file.append_output(get_simulation_path(simulation_id), get_output_name(algorithm, cars),
+                                  values.start_traveling_times, values.finish_times)
+    results_store.record_run(simulation_id, get_output_name(algorithm, cars), values.start_times,
+                             values.start_traveling_times, values.finish_times)
 
 
-def user_quick_sort_partition(users: List[User], low: int, high: int) -> int:
+def get_output_names(simulation_id: int) -> List[str]:
     """
-    Finds the pivot point using the first value in the list
-    :param users: list being sorted
-    :param low: the lowest value in part of list to look at
-    :param high: the highest value in part of list to look at
-    :return: pivot point
+    :return: names of every algorithm output saved for a simulation
     """
-    pivot: User = users[high]
-    i: int = low - 1
-    for j in range(low, high):
-        # sort from high to low
-        if users[j].start_time >= pivot.start_time:
-            i += 1
-            # swap i and j
-            users[i], users[j] = users[j], users[i]
+    if os.path.exists(get_simulation_path(simulation_id)):
+        return list(simulation_file.read_outputs(get_simulation_path(simulation_id)))
+    with open(get_json_simulation_path(simulation_id), "r") as f:
+        return list(json.load(f).get("algorithm output", {}))
 
-    # do final swap
-    users[i + 1], users[high] = users[high], users[i + 1]
 
-    return i + 1
+def load_output(simulation_id: int, name: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Loads the output of an algorithm. Outputs in simulation files are memory mapped rather than read
+    :param simulation_id: id of the simulation
+    :param name: name the output was saved under
+    :return: when each user arrived, got in the lift and got out of the lift
+    """
+    if not os.path.exists(get_simulation_path(simulation_id)):
+        return load_json_output(simulation_id, name)
+    outputs = simulation_file.read_outputs(get_simulation_path(simulation_id))
+    if len(outputs) == 0:
+        raise Exception(f"No algorithm output found for simulation: {simulation_id}")
+    if name not in outputs:
+        raise Exception(f"Algorithm {name} not found.")
+    records = simulation_file.read_simulation(get_simulation_path(simulation_id))[0]
+    return records["start_time"], outputs[name]["start_traveling_time"], outputs[name]["finish_time"]
 
 
-def save_output(values: List[User], simulation_id: int, algorithm: BaseLiftAlgorithm):
+def load_outputs(simulation_id: int) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
     """
-    Saves simulation output to the simulation file
-    :param values: output of the simulation
+    Loads the output of every algorithm for a simulation, opening the file only once
     :param simulation_id: id of the simulation
-    :param algorithm: algorithm to use to get the output
+    :return: when each user arrived, got in the lift and got out of the lift for each output name
+    """
+    return simulation_file.read_all_outputs(get_simulation_path(simulation_id),
+                                            get_json_simulation_path(simulation_id))
+
+
+def load_json_output(simulation_id: int, name: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    # load existing file data
-    with open(f"simulations/simulation_{simulation_id}.json", "r") as f:
-        json_data = json.load(f)
-    # create dictionary to save and add to simulation info
-    output = {}
-    for value in values:
-        output[value.id] = value.get_output_data()
-    if "algorithm output" not in json_data:
-        json_data["algorithm output"] = {}
-    json_data["algorithm output"][algorithm.name] = output
-    # write all data
-    with open(f"simulations/simulation_{simulation_id}.json", "w") as f:
-        f.write(json.dumps(json_data, indent=4))
+    Loads the output of an algorithm from a simulation in the old json format
+    :param simulation_id: id of the simulation
+    :param name: name the output was saved under
+    :return: when each user arrived, got in the lift and got out of the lift
+    """
+    with open(get_json_simulation_path(simulation_id), "r") as f:
+        raw_data = json.load(f)
+    if "algorithm output" not in raw_data:
+        raise Exception(f"No algorithm output found for simulation: {simulation_id}")
+    if name not in raw_data["algorithm output"]:
+        raise Exception(f"Algorithm {name} not found.")
+    data = np.array(list(raw_data["algorithm output"][name].values()), dtype=np.int64).reshape(-1, 3)
+    return data[:, 0], data[:, 1], data[:, 2]
 
 
-def create_simulation(total_floors: int, user_count: int, max_start_time: int) -> List[User]:
+def get_output_name(algorithm: BaseLiftAlgorithm, cars: int = 1) -> str:
+    """
+    :return: the name the output of an algorithm is saved under
+    """
+    if cars == 1:
+        return algorithm.name
+    return f"{algorithm.name} ({cars} cars)"
+
+
+def create_simulation(total_floors: int, user_count: int, max_start_time: int, profile: str = "uniform",
+                      seed: int | None = None) -> UserTable:
     """
     Creates a simulation based on given parameters
     :param total_floors: total number of floors in the simulation
     :param user_count: how many users to simulate
     :param max_start_time: how long it can take for a user to spawn
-    :return: list of users for created simulation
+    :param profile: how users arrive and where they go (see scenario_generator.profiles)
+    :param seed: seed for the random numbers, None for a random simulation
+    :return: table of users for created simulation
     """
-    values = []
-    for user_id in range(user_count):
-
-        start_floor = random.randint(0, total_floors - 1)
-        end_floor = random.randint(0, total_floors - 1)
-        while start_floor == end_floor:
-            end_floor = random.randint(0, total_floors - 1)
-        start_time = random.randint(0, max_start_time)
-
-        values.append(User(user_id, start_floor, end_floor, start_time))
-    return values
+    records = np.concatenate(list(scenario_generator.generate_chunks(total_floors, user_count, max_start_time,
+                                                                     profile, seed)) or
+                             [np.zeros(0, dtype=simulation_file.scenario_dtype)])
+    return UserTable(records["id"], records["start_floor"], records["end_floor"], records["start_time"])
 
 
 def create_simulation_from_inputs():
@@ -152,80 +210,300 @@ def create_simulation_from_inputs():
     user_count = int(input("Enter the number of users: "))
     max_start_time = int(input("Enter the maximum start time: "))
     list_capacity = int(input("Enter the capacity of the simulation: "))
-    simulation = create_simulation(floors, user_count, max_start_time)
-    save_simulation(simulation, floors, list_capacity)
-    print("Simulation saved")
+    profile = input(f"Enter the traffic profile ({', '.join(scenario_generator.profiles)}, default uniform): ")
+    seed = input("Enter a seed (leave empty for random): ")
+    # users are generated and written a chunk at a time so large simulations never have to fit in memory
+    chunks = scenario_generator.generate_chunks(floors, user_count, max_start_time, profile or "uniform",
+                                                int(seed) if seed else None)
+    simulation_id = save_simulation(chunks, floors, list_capacity,
+                                    {"max start time": max_start_time, "profile": profile or "uniform",
+                                     "seed": int(seed) if seed else None})
+    print(f"Simulation saved with id {simulation_id}")
 
 
-def run_simulation(algorithm: BaseLiftAlgorithm, simulation_id: int) -> List[User]:
+def run_simulation(algorithm: BaseLiftAlgorithm, simulation_id: int, event_driven: bool = True,
+                   trace: ActionTrace | None = None) -> UserTable:
     """
     Runs a given simulation using the given algorithm and id
     :param algorithm: algorithm to use to get the output
     :param simulation_id: simulation id to run
+    :param event_driven: when the lift is idle jump straight to the next arrival instead of stepping one time unit at a time
+    :param trace: records every action so the run can be replayed, see get_trace_path
     :return: simulated users with times
     """
     # load the constants
     with open("data/constants.json", "r") as f:
         constants = json.load(f)
+    hooks = instrumentation.get_hooks()
+    load_start = time.perf_counter_ns()
+    (users, total_floors, capacity) = open_simulation(simulation_id)
+    if hooks is not None:
+        hooks.load(time.perf_counter_ns() - load_start, len(users))
+    return simulate(algorithm, users, total_floors, capacity, constants, event_driven, trace)
+
+
+def simulate(algorithm: BaseLiftAlgorithm, users: UserTable, total_floors: int, capacity: int,
+             constants: Dict[str, int], event_driven: bool = True, trace: ActionTrace | None = None) -> UserTable:
+    """
+    Runs the lift loop over the given users
+    :param algorithm: algorithm to use to get the output
+    :param users: users in the simulation, their times are filled in as they use the lift
+    :param total_floors: number of floors in the building
+    :param capacity: capacity of the lift
+    :param constants: the timing constants from data/constants.json
+    :param event_driven: when the lift is idle jump straight to the next arrival instead of stepping one time unit at a time
+    :param trace: records every action so the run can be replayed
+    :return: the users table with times
+    """
     # set up values
-    (future_users, total_floors, capacity) = open_simulation(simulation_id)
+    future_users = users.create_queue()
     algorithm.set_capacity(capacity)
-    total_users = future_users.get_size()
-    finished_users: List[User] = []
+    total_users = len(users)
+    finished_users = 0
     current_time = 0
     current_floor = constants["start floor"]
-    lift_occupants = []
-    floors = [[] for floor in range(total_floors)]
+    lift_occupants: OrderedUsers = {}
+    floors = FloorQueues(total_floors)
     last_action: LiftAction = LiftAction(Action.wait)
+    # checked once so the loop does no instrumentation or tracing work when nothing is listening
+    hooks = instrumentation.get_hooks()
+    events = event_trace.get_tracer()
+    if hooks is not None:
+        hooks.start(algorithm.name, "engine")
+        run_start = time.perf_counter_ns()
 
     # run lift loop until simulation finished
     while True:
         # check to see if the lift has finished
-        if len(finished_users) == total_users:
+        if finished_users == total_users:
             break
         # see if any new lift users have arrived since the last action
         while not future_users.is_empty() and future_users.peak().start_time <= current_time:
             user = future_users.pop()
-            floors[user.start_floor].append(user)
+            floors.add_user(user)
 
         # send state to lift algorithm
+        if trace is not None:
+            trace.record_state(floors, lift_occupants)
+        if hooks is not None:
+            decision_start = time.perf_counter_ns()
         completed_action: LiftAction = algorithm.calculate(lift_occupants, floors, current_time, current_floor)
+        if hooks is not None:
+            hooks.decision(completed_action, time.perf_counter_ns() - decision_start, floors.get_total_waiting(),
+                           len(lift_occupants))
+        if trace is not None:
+            trace.record(current_time, current_floor, completed_action)
 
         # apply changes from action
         if completed_action.action == Action.wait:
             current_time += 1
+        elif completed_action.action == Action.idle:
+            idle_start = current_time
+            # nothing changes until somebody arrives so skip to them
+            if event_driven and not future_users.is_empty():
+                current_time = max(current_time + 1, future_users.peak().start_time)
+            else:
+                current_time += 1
+            if hooks is not None:
+                hooks.idle(current_time - idle_start)
+            if events is not None and events.steps:
+                events.record(event_trace.lift_idle, idle_start, current_time)
         elif completed_action.action == Action.move_up:
             current_floor += 1
             current_time += constants["time between floors"]
-            logging.info(f"Going up to floor: {current_floor}")
+            if events is not None and events.movement:
+                events.record(event_trace.moved_up, current_time, current_floor)
         elif completed_action.action == Action.move_down:
             current_floor -= 1
             current_time += constants["time between floors"]
-            logging.info(f"Going down to floor: {current_floor}")
+            if events is not None and events.movement:
+                events.record(event_trace.moved_down, current_time, current_floor)
         elif completed_action.action == Action.open_doors:
+            if hooks is not None:
+                doors_start = time.perf_counter_ns()
             # edit user timings
             for user in completed_action.add:
                 user.set_user_start_traveling(current_time)
             for user in completed_action.remove:
                 user.set_user_end_traveling(current_time)
             # remove from queue
-            floors[current_floor] = [user for user in floors[current_floor] if user not in completed_action.add]
-            # change lift occupants
-            lift_occupants.extend(completed_action.add)
-            lift_occupants = [user for user in lift_occupants if user not in completed_action.remove]
+            floors.remove_users(current_floor, completed_action.add)
+            # change lift occupants, only touching the users getting in and out
+            for user in completed_action.add:
+                lift_occupants[user] = None
+            for user in completed_action.remove:
+                lift_occupants.pop(user, None)
             # add to output
-            finished_users.extend(completed_action.remove)
+            finished_users += len(completed_action.remove)
+            if hooks is not None:
+                hooks.doors(time.perf_counter_ns() - doors_start, len(completed_action.add),
+                            len(completed_action.remove))
             # calculate time taken
             people_change = len(completed_action.add) + len(
                 completed_action.remove)
             current_time += (constants["first pickup time"] if last_action.action != Action.open_doors else 0) + \
                             constants["extra pickup time"] * people_change
-            logging.info(f"took on: {len(completed_action.add)}. dropped off: {len(completed_action.remove)}.")
-            logging.info(f"there are now {len(lift_occupants)} users in the lift")
+            if events is not None and events.doors:
+                events.record(event_trace.doors_opened, current_time, len(completed_action.add),
+                              len(completed_action.remove), len(lift_occupants))
         # update last actin
         last_action = completed_action
 
-        logging.info(f"current time: {current_time}. users left: {total_users - len(finished_users)}")
+        if events is not None and events.steps:
+            events.record(event_trace.step_finished, current_time, total_users - finished_users)
+
+    if trace is not None:
+        trace.finish(current_time)
+    if hooks is not None:
+        hooks.finish(current_time, time.perf_counter_ns() - run_start)
+    if events is not None:
+        events.flush()
+    # return users with their times
+    return users
+
+
+def run_multi_car_simulation(algorithm: BaseLiftAlgorithm, simulation_id: int, car_count: int,
+                             dispatcher: BaseDispatcher = None) -> UserTable:
+    """
+    Runs a given simulation with a bank of lifts
+    :param algorithm: algorithm each car uses, every car gets its own copy
+    :param simulation_id: simulation id to run
+    :param car_count: how many cars are in the bank
+    :param dispatcher: decides which car collects each user, defaults to NearestCarDispatcher
+    :return: simulated users with times
+    """
+    # load the constants
+    with open("data/constants.json", "r") as f:
+        constants = json.load(f)
+    hooks = instrumentation.get_hooks()
+    load_start = time.perf_counter_ns()
+    (users, total_floors, capacity) = open_simulation(simulation_id)
+    if hooks is not None:
+        hooks.load(time.perf_counter_ns() - load_start, len(users))
+    return simulate_multi_car(algorithm, users, total_floors, capacity, constants, car_count, dispatcher)
+
+
+def simulate_multi_car(algorithm: BaseLiftAlgorithm, users: UserTable, total_floors: int, capacity: int,
+                       constants: Dict[str, int], car_count: int, dispatcher: BaseDispatcher = None) -> UserTable:
+    """
+    Runs the lift loop for a bank of cars. Users are assigned to a car by the dispatcher as they arrive and each car
+    then steps on its own with its own copy of the algorithm only seeing the users assigned to it. With one car this
+    gives the same result as simulate
+    :param algorithm: algorithm each car uses
+    :param users: users in the simulation, their times are filled in as they use the lifts
+    :param total_floors: number of floors in the building
+    :param capacity: capacity of each car
+    :param constants: the timing constants from data/constants.json
+    :param car_count: how many cars are in the bank
+    :param dispatcher: decides which car collects each user, defaults to NearestCarDispatcher
+    :return: the users table with times
+    """
+    if dispatcher is None:
+        dispatcher = NearestCarDispatcher()
+    # set up values
+    future_users = users.create_queue()
+    total_users = len(users)
+    finished_users = 0
+    cars = CarBank(car_count, constants["start floor"], capacity, total_floors)
+    algorithms = [copy.deepcopy(algorithm) for car in range(car_count)]
+    for car_algorithm in algorithms:
+        car_algorithm.set_capacity(capacity)
+    car_floors = [FloorQueues(total_floors) for car in range(car_count)]
+    car_occupants: List[OrderedUsers] = [{} for car in range(car_count)]
+    last_actions = [LiftAction(Action.wait) for car in range(car_count)]
+    # the time each car is next free to act, cars that are free at the same time go in index order
+    next_steps = [(0, car) for car in range(car_count)]
+    # checked once so the loop does no instrumentation or tracing work when nothing is listening
+    hooks = instrumentation.get_hooks()
+    events = event_trace.get_tracer()
+    if hooks is not None:
+        hooks.start(algorithm.name, "multi_car")
+        run_start = time.perf_counter_ns()
+    end_time = 0
+
+    while finished_users < total_users:
+        if len(next_steps) == 0:
+            raise Exception("Every car is idle but not every user has finished.")
+        current_time, car = heapq.heappop(next_steps)
+        # hand any new users to a car
+        while not future_users.is_empty() and future_users.peak().start_time <= current_time:
+            user = future_users.pop()
+            assigned_car = dispatcher.assign(user, cars)
+            car_floors[assigned_car].add_user(user)
+            cars.waiting[assigned_car] += 1
+
+        current_floor = int(cars.floors[car])
+        if hooks is not None:
+            decision_start = time.perf_counter_ns()
+        completed_action: LiftAction = algorithms[car].calculate(car_occupants[car], car_floors[car], current_time,
+                                                                 current_floor)
+        if hooks is not None:
+            hooks.decision(completed_action, time.perf_counter_ns() - decision_start,
+                           car_floors[car].get_total_waiting(), len(car_occupants[car]))
+
+        # apply changes from action
+        if completed_action.action == Action.wait:
+            current_time += 1
+        elif completed_action.action == Action.idle:
+            cars.directions[car] = 0
+            # only new users can give this car something to do so sleep until the next one arrives
+            if future_users.is_empty():
+                last_actions[car] = completed_action
+                continue
+            idle_start = current_time
+            current_time = max(current_time + 1, future_users.peak().start_time)
+            if hooks is not None:
+                hooks.idle(current_time - idle_start)
+            if events is not None and events.steps:
+                events.record(event_trace.lift_idle, idle_start, current_time)
+        elif completed_action.action == Action.move_up:
+            cars.floors[car] += 1
+            cars.directions[car] = 1
+            current_time += constants["time between floors"]
+            if events is not None and events.movement:
+                events.record(event_trace.moved_up, current_time, int(cars.floors[car]))
+        elif completed_action.action == Action.move_down:
+            cars.floors[car] -= 1
+            cars.directions[car] = -1
+            current_time += constants["time between floors"]
+            if events is not None and events.movement:
+                events.record(event_trace.moved_down, current_time, int(cars.floors[car]))
+        elif completed_action.action == Action.open_doors:
+            if hooks is not None:
+                doors_start = time.perf_counter_ns()
+            # edit user timings
+            for user in completed_action.add:
+                user.set_user_start_traveling(current_time)
+            for user in completed_action.remove:
+                user.set_user_end_traveling(current_time)
+            # move users between the floor and the car
+            car_floors[car].remove_users(current_floor, completed_action.add)
+            for user in completed_action.add:
+                car_occupants[car][user] = None
+            for user in completed_action.remove:
+                car_occupants[car].pop(user, None)
+            cars.waiting[car] -= len(completed_action.add)
+            cars.occupants[car] = len(car_occupants[car])
+            finished_users += len(completed_action.remove)
+            if hooks is not None:
+                hooks.doors(time.perf_counter_ns() - doors_start, len(completed_action.add),
+                            len(completed_action.remove))
+            # calculate time taken
+            people_change = len(completed_action.add) + len(completed_action.remove)
+            current_time += (constants["first pickup time"] if last_actions[car].action != Action.open_doors else 0) + \
+                            constants["extra pickup time"] * people_change
+            if events is not None and events.doors:
+                events.record(event_trace.doors_opened, current_time, len(completed_action.add),
+                              len(completed_action.remove), len(car_occupants[car]))
+        last_actions[car] = completed_action
+        end_time = max(end_time, current_time)
+        if events is not None and events.steps:
+            events.record(event_trace.step_finished, current_time, total_users - finished_users)
+        heapq.heappush(next_steps, (current_time, car))
 
-    # return finished users
-    return finished_users
+    if hooks is not None:
+        hooks.finish(end_time, time.perf_counter_ns() - run_start)
+    if events is not None:
+        events.flush()
+    # return users with their times
+    return users
@@ -0,0 +1,26 @@
+def get_simulation_path(simulation_id: int) -> str:
+    """
+    :return: path of the simulation file for the given id
+    """
+    return f"simulations/simulation_{simulation_id}.lift"
+
+
+def get_trace_path(simulation_id: int, algorithm_name: str) -> str:
+    """
+    :return: path of the action trace of an algorithm run on a simulation
+    """
+    return f"simulations/simulation_{simulation_id}_{algorithm_name}.trace.npz"
+
+
+def get_metrics_path(simulation_id: int, algorithm_name: str) -> str:
+    """
+    :return: path of the run metrics of an algorithm run on a simulation, without the .json or .prom extension
+    """
+    return f"simulations/simulation_{simulation_id}_{algorithm_name}.metrics"
+
+
+def get_json_simulation_path(simulation_id: int) -> str:
+    """
+    :return: path of a simulation saved in the old json format for the given id
+    """
+    return f"simulations/simulation_{simulation_id}.json"
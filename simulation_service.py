@@ -0,0 +1,368 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import result_cache
+import results_store
+import scenario_generator
+import simulation_file
+import simulation_handler
+from lift_algorithms import registry
+from user import UserTable
+
+# finished runs that are remembered for polling, the oldest are forgotten first
+max_finished_jobs = 1_000
+# biggest request body accepted in bytes
+max_body_size = 64 * 1024 * 1024
+status_texts = {200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error",
+                503: "Service Unavailable"}
+# forkserver starts workers quickly without copying the threads of the service
+process_context = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+class RequestError(Exception):
+    """A request that can not be served, sent back with its status code"""
+    status: int
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+    """A run of an algorithm on a simulation"""
+    id: int
+    simulation_id: int
+    algorithm: str
+    status: str  # queued, running, done, failed or cancelled
+    error: str | None
+    cached: bool
+    statistics: Dict[str, float] | None  # summary metrics of the output once it is done
+    created: float
+    started: float | None
+    finished: float | None
+    task: asyncio.Task | None
+    process: multiprocessing.Process | None
+
+    def __init__(self, job_id: int, simulation_id: int, algorithm: str):
+        self.id = job_id
+        self.simulation_id = simulation_id
+        self.algorithm = algorithm
+        self.status = "queued"
+        self.error = None
+        self.cached = False
+        self.statistics = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.task = None
+        self.process = None
+
+    def get_summary(self) -> Dict:
+        return {"id": self.id, "simulation": self.simulation_id, "algorithm": self.algorithm,
+                "status": self.status, "error": self.error, "cached": self.cached, "statistics": self.statistics,
+                "created": self.created, "started": self.started, "finished": self.finished}
+
+
+def run_job(simulation_id: int, algorithm_name: str, connection: Connection):
+    """
+    Runs one simulation in a worker process, or takes its output from result_cache, and sends back the output or the
+    error
+    """
+    try:
+        connection.send((None, *result_cache.run_cached_simulation(algorithm_name, simulation_id)))
+    except Exception as e:
+        connection.send((str(e), None, None, False))
+    finally:
+        connection.close()
+
+
+def receive(connection: Connection) -> Tuple[str | None, UserTable | None, Dict[str, float] | None, bool]:
+    """
+    Waits for a worker to send its result
+    :return: the error, the output and summary metrics of the run and whether it came from the cache
+    """
+    try:
+        return connection.recv()
+    except EOFError:
+        return "Worker stopped before finishing.", None, None, False
+
+
+def create_simulation(settings: Dict) -> int:
+    """
+    Saves a simulation sent to the service, either the users themselves as "arrivals" ([[time, start floor, end floor],
+    ...]) or the settings to generate them with ("users", "max_start_time", "profile" and "seed")
+    :return: id of the saved simulation
+    """
+    floors = int(settings["floors"])
+    capacity = int(settings["capacity"])
+    if "arrivals" in settings:
+        arrivals = np.asarray(settings["arrivals"], dtype=np.int64).reshape(-1, 3)
+        if np.any(arrivals[:, 0] < 0):
+            raise RequestError(400, "Arrival times can not be negative.")
+        if np.any(arrivals[:, 1:] < 0) or np.any(arrivals[:, 1:] >= floors) or np.any(arrivals[:, 1] == arrivals[:, 2]):
+            raise RequestError(400, "Every arrival must be a trip between two floors of the building.")
+        records = np.zeros(len(arrivals), dtype=simulation_file.scenario_dtype)
+        records["id"] = np.arange(len(arrivals))
+        records["start_time"] = arrivals[:, 0]
+        records["start_floor"] = arrivals[:, 1]
+        records["end_floor"] = arrivals[:, 2]
+        return simulation_handler.save_simulation([records], floors, capacity)
+    user_count = int(settings["users"])
+    generator = {"users": user_count, "max start time": int(settings.get("max_start_time", user_count * 4)),
+                 "profile": settings.get("profile", "uniform"), "seed": settings.get("seed")}
+    try:
+        chunks = scenario_generator.generate_chunks(floors, user_count, generator["max start time"],
+                                                    generator["profile"], generator["seed"])
+    except Exception as e:
+        # generate_chunks only checks the settings, the users are generated as they are saved
+        raise RequestError(400, str(e))
+    return simulation_handler.save_simulation(chunks, floors, capacity, generator)
+
+
+def get_statistics(simulation_id: int) -> Dict:
+    """
+    :return: summary metrics of every algorithm run on a simulation and the lower bound if it was solved
+    """
+    bound = results_store.get_bound(simulation_id)
+    return {"simulation": simulation_id, "runs": results_store.get_runs(simulation_id),
+            "bound": None if bound is None else {"mean_total": bound[0], "optimal": bound[1]}}
+
+
+def simulation_exists(simulation_id: int) -> bool:
+    return os.path.exists(simulation_handler.get_simulation_path(simulation_id)) or os.path.exists(
+        simulation_handler.get_json_simulation_path(simulation_id))
+
+
+class SimulationService:
+    """
+    Local http service for running simulations without the TUI. Runs go to a bounded number of worker processes so
+    the event loop is free to answer requests while they run, and file and index work happens on threads. Waiting
+    for the workers has its own threads so requests are answered however many runs there are.
+
+    GET /algorithms, GET /simulations, POST /simulations, GET /simulations/{id}/statistics,
+    POST /runs ({"simulation": id, "algorithm": name}), GET /runs, GET /runs/{id} and DELETE /runs/{id} to cancel
+    """
+    workers: int
+    max_queued: int
+    jobs: Dict[int, Job]
+    next_job_id: int
+    worker_slots: asyncio.Semaphore
+    # threads waiting on the workers, one per worker so running jobs never take the threads requests use
+    worker_threads: ThreadPoolExecutor
+    save_lock: asyncio.Lock  # only one output is saved at a time so the simulation files are never written together
+
+    def __init__(self, workers: int | None = None, max_queued: int = 100):
+        """
+        :param workers: how many runs can happen at once, defaults to one per core
+        :param max_queued: how many runs can wait for a worker before new ones are turned away
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queued = max_queued
+        self.jobs = {}
+        self.next_job_id = 1
+        self.worker_slots = asyncio.Semaphore(self.workers)
+        self.worker_threads = ThreadPoolExecutor(self.workers, thread_name_prefix="worker-wait")
+        self.save_lock = asyncio.Lock()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Answers one http request on a connection
+        """
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if line == "":
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if len(request_line) < 2:
+                return
+            method, path = request_line[0], request_line[1].split("?")[0]
+            length = int(headers.get("content-length", 0))
+            if length > max_body_size:
+                status, response = 413, {"error": "Request body is too big."}
+            else:
+                body = await reader.readexactly(length) if length > 0 else b""
+                status, response = await self.respond(method, path, body)
+            content = json.dumps(response).encode()
+            extra_headers = "Retry-After: 1\r\n" if status == 503 else ""
+            writer.write(f"HTTP/1.1 {status} {status_texts[status]}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(content)}\r\n{extra_headers}Connection: close\r\n\r\n".encode()
+                         + content)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        """
+        :return: the status code and json response of a request
+        """
+        try:
+            data = json.loads(body) if len(body) > 0 else {}
+        except json.JSONDecodeError:
+            return 400, {"error": "Request body is not json."}
+        parts = [part for part in path.split("/") if part != ""]
+        try:
+            return await self.route(method, parts, data)
+        except RequestError as e:
+            return e.status, {"error": str(e)}
+        except (KeyError, TypeError, ValueError) as e:
+            return 400, {"error": f"Bad request: {e}"}
+        except Exception as e:
+            return 500, {"error": str(e)}
+
+    async def route(self, method: str, parts: List[str], data: Dict) -> Tuple[int, Dict]:
+        """
+        :return: the status code and json response of a request to the path split at each /
+        """
+        if parts == ["algorithms"] and method == "GET":
+            return 200, {"algorithms": registry.get_algorithm_names()}
+        if parts == ["simulations"] and method == "GET":
+            return 200, {"simulations": await asyncio.to_thread(results_store.get_scenario_ids)}
+        if parts == ["simulations"] and method == "POST":
+            return 201, {"id": await asyncio.to_thread(create_simulation, data)}
+        if len(parts) == 3 and parts[0] == "simulations" and parts[2] == "statistics" and method == "GET":
+            simulation_id = int(parts[1])
+            if not simulation_exists(simulation_id):
+                raise RequestError(404, f"Simulation {simulation_id} not found.")
+            return 200, await asyncio.to_thread(get_statistics, simulation_id)
+        if parts == ["runs"] and method == "GET":
+            return 200, {"runs": [job.get_summary() for job in self.jobs.values()]}
+        if parts == ["runs"] and method == "POST":
+            return 202, self.submit(int(data["simulation"]), str(data["algorithm"])).get_summary()
+        if len(parts) == 2 and parts[0] == "runs" and method in ("GET", "DELETE"):
+            job = self.jobs.get(int(parts[1]))
+            if job is None:
+                raise RequestError(404, f"Run {parts[1]} not found.")
+            if method == "DELETE":
+                self.cancel(job)
+            return 200, job.get_summary()
+        if parts in (["algorithms"], ["simulations"], ["runs"]) or (len(parts) == 2 and parts[0] == "runs"):
+            raise RequestError(405, "Method not allowed.")
+        raise RequestError(404, "Not found.")
+
+    def submit(self, simulation_id: int, algorithm_name: str) -> Job:
+        """
+        Queues a run, turning it away when too many runs are already waiting for a worker
+        """
+        if algorithm_name not in registry.get_algorithm_names():
+            raise RequestError(400, f"Algorithm {algorithm_name} not found.")
+        registry.get_algorithm_class(algorithm_name)
+        if not simulation_exists(simulation_id):
+            raise RequestError(404, f"Simulation {simulation_id} not found.")
+        if sum(job.status == "queued" for job in self.jobs.values()) >= self.max_queued:
+            raise RequestError(503, "Too many runs are waiting, try again later.")
+        job = Job(self.next_job_id, simulation_id, algorithm_name)
+        self.next_job_id += 1
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self.run(job))
+        return job
+
+    def cancel(self, job: Job):
+        """
+        Cancels a run, a running worker is stopped straight away
+        """
+        if job.status == "queued":
+            job.task.cancel()
+        elif job.status == "running" and job.process is not None:
+            job.process.terminate()
+        else:
+            return
+        job.status = "cancelled"
+        job.finished = time.time()
+
+    async def run(self, job: Job):
+        """
+        Waits for a worker, runs the job in its own process and saves the output
+        """
+        try:
+            async with self.worker_slots:
+                job.status = "running"
+                job.started = time.time()
+                receiver, sender = process_context.Pipe(duplex=False)
+                job.process = process_context.Process(target=run_job, args=(job.simulation_id, job.algorithm, sender),
+                                                      daemon=True)
+                job.process.start()
+                sender.close()
+                loop = asyncio.get_running_loop()
+                try:
+                    error, users, job.statistics, job.cached = await loop.run_in_executor(self.worker_threads,
+                                                                                          receive, receiver)
+                finally:
+                    receiver.close()
+                    await loop.run_in_executor(self.worker_threads, job.process.join)
+                    job.process = None
+            if job.status == "cancelled":
+                return
+            if error is None:
+                async with self.save_lock:
+                    await asyncio.to_thread(simulation_handler.save_output, users, job.simulation_id,
+                                            registry.create_algorithm(job.algorithm))
+                job.status = "done"
+            else:
+                job.status = "failed"
+                job.error = error
+            job.finished = time.time()
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            job.finished = job.finished or time.time()
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            job.finished = time.time()
+        finally:
+            self.forget_old_jobs()
+
+    def forget_old_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in ("done", "failed", "cancelled")]
+        for job_id in finished[:max(len(finished) - max_finished_jobs, 0)]:
+            del self.jobs[job_id]
+
+
+async def serve(service: SimulationService, host: str = "127.0.0.1", port: int = 8080, socket_path: str | None = None):
+    """
+    Serves requests until stopped
+    :param service: service to answer the requests
+    :param host: address to listen on
+    :param port: port to listen on
+    :param socket_path: listen on this unix socket instead of a port
+    """
+    if socket_path is not None:
+        server = await asyncio.start_unix_server(service.handle_connection, socket_path)
+        print(f"Listening on {socket_path}", flush=True)
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+        print(f"Listening on http://{host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve simulation runs over local http")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("-p", "--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    parser.add_argument("-s", "--socket", help="listen on this unix socket instead of a port")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="runs at once, defaults to one per core")
+    parser.add_argument("-q", "--max-queued", type=int, default=100,
+                        help="runs that can wait for a worker before new ones are turned away")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(SimulationService(args.workers, args.max_queued), args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
@@ -1,20 +1,39 @@
-import json
-from typing import Tuple, List
+from typing import Tuple, List, Dict
 
-import matplotlib.pyplot as plt
+import numpy as np
 
+import results_store
+import simulation_handler
+from user import UserTable
 
-def plot_times(data: List[List[int]], algorithm: str):
+time_labels = ["Waiting for lift", "In lift", "Total"]
+percentiles = (50, 90, 95, 99)
+histogram_bins = 30
+# box plots with more points than this do not draw each outlier as it is very slow for millions of users
+max_outliers_plotted = 100_000
+
+
+def plot_times(data: List[np.ndarray], algorithm: str):
     """
-    Uses matplotlib to create a box plot for each aspect of the simulations performance (waiting for lift, in lift, total)
-    :param data: a list of lists of values for each of the categories
+    Uses matplotlib to create a box plot and a histogram for each aspect of the simulations performance (waiting for lift, in lift, total)
+    :param data: an array of values for each of the categories
     :param algorithm: name of the algorithm
     """
-    plt.boxplot(data, tick_labels=["Waiting for lift", "In lift", "Total"])
+    import matplotlib.pyplot as plt
+
+    figure, (box_axes, histogram_axes) = plt.subplots(1, 2, figsize=(12, 5))
+    box_axes.boxplot(data, tick_labels=time_labels, showfliers=len(data[0]) <= max_outliers_plotted)
+    for label, times in zip(time_labels, data):
+        counts, edges = get_histogram(times)
+        histogram_axes.stairs(counts, edges, label=label)
 
     # Add labels and title
-    plt.title(f"Waiting times ({algorithm})")
-    plt.ylabel('Time')
+    box_axes.set_title(f"Waiting times ({algorithm})")
+    box_axes.set_ylabel('Time')
+    histogram_axes.set_title(f"Distribution of times ({algorithm})")
+    histogram_axes.set_xlabel('Time')
+    histogram_axes.set_ylabel('Users')
+    histogram_axes.legend()
 
     # show
     plt.show()
@@ -27,12 +46,14 @@ def plot_compared_times(index: int, name: str, input_data):
     :param name: the name for the plot
     :param input_data: the data to show in the plot
     """
+    import matplotlib.pyplot as plt
+
     data = []
     names = []
     for key in input_data:
         data.append(input_data[key][index])
         names.append(key)
-    plt.boxplot(data, tick_labels=names)
+    plt.boxplot(data, tick_labels=names, showfliers=max(len(times) for times in data) <= max_outliers_plotted)
     # Add labels and title
     plt.title(name)
     plt.ylabel('Time')
@@ -41,55 +62,84 @@ def plot_compared_times(index: int, name: str, input_data):
     plt.show()
 
 
-def get_statistics_of_algorithm(simulation_id: int, algorithm: str) -> Tuple[List[int], List[int], List[int]]:
+def get_statistics_of_algorithm(simulation_id: int, algorithm: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Loads the output data from the simulation and extract performance statistics
     :param simulation_id: simulation id
     :param algorithm: algorithm name
-    :return: a list of data points for how the algorithm performed in (waiting for lift, in lift, total)
+    :return: an array of data points for how the algorithm performed in (waiting for lift, in lift, total)
     """
-    # open output data file
-    with open(f"simulations/simulation_{simulation_id}.json", "r") as f:
-        raw_data = json.load(f)
     # get data for chosen algorithm
-    if "algorithm output" not in raw_data:
-        raise Exception(f"No algorithm output found for simulation: {simulation_id}")
-    if algorithm not in raw_data["algorithm output"]:
-        raise Exception(f"Algorithm {algorithm} not found.")
-    data = raw_data["algorithm output"][algorithm]
+    start_times, start_traveling_times, finish_times = simulation_handler.load_output(simulation_id, algorithm)
     # extract statistics from the data
-    total_time_waiting_for_lift = 0
-    waiting_times = []
-    total_time_in_lift = 0
-    inlift_times = []
+    return get_times(start_times, start_traveling_times, finish_times)
 
-    for key in data:
-        total_time_waiting_for_lift += data[key][1] - data[key][0]
-        total_time_in_lift += data[key][2] - data[key][1]
-        waiting_times.append(data[key][1] - data[key][0])
-        inlift_times.append(data[key][2] - data[key][1])
 
-    total_times = [sum(time) for time in zip(waiting_times, inlift_times)]
+def get_statistics_of_output(users: UserTable) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Extracts performance statistics straight from the output of a simulation
+    :param users: simulated users with times
+    :return: an array of data points for how the algorithm performed in (waiting for lift, in lift, total)
+    """
+    return get_times(users.start_times, users.start_traveling_times, users.finish_times)
 
+
+def get_times(start_times: np.ndarray, start_traveling_times: np.ndarray,
+              finish_times: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Works out how long each user spent (waiting for lift, in lift, total) from their timings
+    :param start_times: when each user arrived
+    :param start_traveling_times: when each user got in the lift
+    :param finish_times: when each user got out of the lift
+    :return: an array of data points for (waiting for lift, in lift, total)
+    """
+    waiting_times = np.subtract(start_traveling_times, start_times, dtype=np.int64)
+    inlift_times = np.subtract(finish_times, start_traveling_times, dtype=np.int64)
+    total_times = waiting_times + inlift_times
     return waiting_times, inlift_times, total_times
 
 
-def get_combined_statistics(simulation_ids: List[int], algorithm: str) -> Tuple[List[int], List[int], List[int]]:
+def get_summary(times: np.ndarray) -> Dict[str, float]:
+    """
+    Summarises a set of times
+    :param times: time of each user
+    :return: the total, mean, percentiles (p50, p90 ...) and max of the times
+    """
+    if len(times) == 0:
+        return {"total": 0, "mean": 0, **{f"p{percentile}": 0 for percentile in percentiles}, "max": 0}
+    summary = {"total": int(times.sum()), "mean": float(times.mean())}
+    for percentile, value in zip(percentiles, np.percentile(times, percentiles)):
+        summary[f"p{percentile}"] = float(value)
+    summary["max"] = int(times.max())
+    return summary
+
+
+def get_throughput(start_times: np.ndarray, finish_times: np.ndarray) -> float:
+    """
+    :return: how many users the lift delivered per unit of time, from the first arrival to the last drop off
+    """
+    if len(start_times) == 0:
+        return 0
+    duration = int(finish_times.max()) - int(start_times.min())
+    return len(start_times) / max(duration, 1)
+
+
+def get_histogram(times: np.ndarray, bins: int = histogram_bins) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :return: how many users fall in each bin and the edges of the bins
+    """
+    return np.histogram(times, bins=bins)
+
+
+def get_combined_statistics(simulation_ids: List[int], algorithm: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Loads the output data from multiple simulations and extract performance statistics
     :param simulation_ids: all simulation ids
     :param algorithm: algorithm name
-    :return: a list of data points for how the algorithm performed in (waiting for lift, in lift, total)
+    :return: an array of data points for how the algorithm performed in (waiting for lift, in lift, total)
     """
-    waiting_times = []
-    inlift_times = []
-    total_times = []
-    for sim_id in simulation_ids:
-        sim_waiting_times, sim_inlift_times, sim_total_times = get_statistics_of_algorithm(sim_id, algorithm)
-        waiting_times.extend(sim_waiting_times)
-        inlift_times.extend(sim_inlift_times)
-        total_times.extend(sim_total_times)
-
+    all_times = [get_statistics_of_algorithm(sim_id, algorithm) for sim_id in simulation_ids]
+    waiting_times, inlift_times, total_times = (np.concatenate(times) for times in zip(*all_times))
     return waiting_times, inlift_times, total_times
 
 
@@ -99,8 +149,10 @@ def show_statistics_of_algorithm(simulation_id: int, algorithm: str):
     :param simulation_id: simulation id
     :param algorithm: algorithm name
     """
-    waiting_times, inlift_times, total_times = get_statistics_of_algorithm(simulation_id, algorithm)
-    show_algorithm_statistics(waiting_times, inlift_times, total_times, algorithm)
+    start_times, start_traveling_times, finish_times = simulation_handler.load_output(simulation_id, algorithm)
+    waiting_times, inlift_times, total_times = get_times(start_times, start_traveling_times, finish_times)
+    show_algorithm_statistics(waiting_times, inlift_times, total_times, algorithm,
+                              get_throughput(start_times, finish_times))
 
 
 def show_combined_statistics_of_algorithm(simulation_ids: List[int], algorithm: str):
@@ -113,22 +165,28 @@ def show_combined_statistics_of_algorithm(simulation_ids: List[int], algorithm:
     show_algorithm_statistics(waiting_times, inlift_times, total_times, algorithm)
 
 
-def show_algorithm_statistics(waiting_times: List[int], inlift_times: List[int], total_times: List[int],
-                              algorithm: str):
+def format_summary(summary: Dict[str, float]) -> str:
+    """
+    :return: one line of text showing a summary from get_summary
+    """
+    return ", ".join(f"{key} {round(value, 2)}" for key, value in summary.items())
+
+
+def show_algorithm_statistics(waiting_times: np.ndarray, inlift_times: np.ndarray, total_times: np.ndarray,
+                              algorithm: str, throughput: float | None = None):
     """
     Loads and shows statistics from given data
     :param waiting_times: waiting times data points
     :param inlift_times: inlift times data points
     :param total_times: total times data points
     :param algorithm: name of algorithm used
+    :param throughput: users delivered per unit of time if known
     """
-    total_users = len(waiting_times)
-    print(f"Algorithm: {algorithm}:")
-    print(
-        f"\tThe total time waiting for lift is {sum(waiting_times)}. With an average of {sum(waiting_times) / total_users}")
-    print(f"\tThe total time in lift is {sum(inlift_times)}. With an average of {sum(inlift_times) / total_users}")
-    print(
-        f"\tThe total time spent by users is {sum(waiting_times) + sum(inlift_times)}. With an average of {sum(waiting_times) + sum(inlift_times) / total_users}")
+    print(f"Algorithm: {algorithm} ({len(waiting_times)} users):")
+    for label, times in zip(time_labels, (waiting_times, inlift_times, total_times)):
+        print(f"\t{label}: {format_summary(get_summary(times))}")
+    if throughput is not None:
+        print(f"\tThroughput: {round(throughput, 4)} users per unit of time")
 
     # show plots
     plot_times([waiting_times, inlift_times, total_times], algorithm)
@@ -139,17 +197,39 @@ def show_compare_statistics(simulation_id: int):
     Loads and shows statistics comparing all algorithms run for given simulation id
     :param simulation_id: simulation id
     """
-    # open output data file
-    with open(f"simulations/simulation_{simulation_id}.json", "r") as f:
-        raw_data = json.load(f)
-    timing_data = {}
-    if "algorithm output" not in raw_data:
+    # load every output from the file at once
+    outputs = simulation_handler.load_outputs(simulation_id)
+    if len(outputs) == 0:
         print("No simulations Run")
         return
-    for key in raw_data["algorithm output"]:
-        timing_data[key] = get_statistics_of_algorithm(simulation_id, key)
+    timing_data = {}
+    for key, (start_times, start_traveling_times, finish_times) in outputs.items():
+        timing_data[key] = get_times(start_times, start_traveling_times, finish_times)
+        print(f"Algorithm: {key}:")
+        for label, times in zip(time_labels, timing_data[key]):
+            print(f"\t{label}: {format_summary(get_summary(times))}")
+        print(f"\tThroughput: {round(get_throughput(start_times, finish_times), 4)} users per unit of time")
 
     # waiting for lift
     plot_compared_times(0, "Waiting for lift comparison", timing_data)
     plot_compared_times(1, "Time in lift comparison", timing_data)
     plot_compared_times(2, "Total time comparison", timing_data)
+
+
+def show_gaps(simulation_id: int):
+    """
+    Shows how far the mean total time of every algorithm run on a simulation is from the lower bound found by
+    optimal_solver.py
+    :param simulation_id: simulation id
+    """
+    bound = results_store.get_bound(simulation_id)
+    if bound is None:
+        print("No lower bound, run optimal_solver.py on the simulation first")
+        return
+    mean_total, optimal = bound
+    print(f"Lower bound on mean total time: {round(mean_total, 2)}{' (optimal)' if optimal else ''}")
+    for key, (start_times, start_traveling_times, finish_times) in simulation_handler.load_outputs(
+            simulation_id).items():
+        algorithm_mean = float(np.mean(get_times(start_times, start_traveling_times, finish_times)[2]))
+        print(f"\tAlgorithm: {key}: mean total time {round(algorithm_mean, 2)}, "
+              f"{(algorithm_mean - mean_total) / max(mean_total, 1e-9):.1%} above the bound")
@@ -1,22 +1,31 @@
-from typing import List
+import heapq
+from typing import List, Tuple, Iterator, Iterable
+
+import numpy as np
 
 
 class User:
     """
-    Class to hold the user details
+    Class to hold the user details. When the user comes from a UserTable their times are also written back to it
     """
+    __slots__ = ("id", "start_floor", "end_floor", "start_time", "start_traveling_time", "finish_time", "table", "row")
     id: int
     start_floor: int
     end_floor: int
     start_time: int
     start_traveling_time: int
     finish_time: int
+    table: "UserTable | None"
+    row: int
 
-    def __init__(self, id: int, start_floor: int, end_floor: int, start_time: int):
+    def __init__(self, id: int, start_floor: int, end_floor: int, start_time: int, table: "UserTable" = None,
+                 row: int = -1):
         self.id = id
         self.start_floor = start_floor
         self.end_floor = end_floor
         self.start_time = start_time
+        self.table = table
+        self.row = row
 
     def get_simulation_data(self) -> List[int]:
         return [self.start_floor, self.end_floor, self.start_time]
@@ -26,27 +35,140 @@ class User:
 
     def set_user_start_traveling(self, current_time: int):
         self.start_traveling_time = current_time
+        if self.table is not None:
+            self.table.start_traveling_times[self.row] = current_time
 
     def set_user_end_traveling(self, current_time: int):
         self.finish_time = current_time
+        if self.table is not None:
+            self.table.finish_times[self.row] = current_time
+
+
+class UserTable:
+    """
+    Stores every user in a simulation column by column in numpy arrays. This uses a fraction of the memory of a
+    User object per person so millions of users fit in memory. User objects are only made for users while they
+    are moving through the building and write their times back to the table. Loading a json simulation still builds
+    every user as python objects first, so the full saving needs the memory mapped .lift format in simulation_file
+    """
+    ids: np.ndarray
+    start_floors: np.ndarray
+    end_floors: np.ndarray
+    start_times: np.ndarray
+    start_traveling_times: np.ndarray
+    finish_times: np.ndarray
+
+    def __init__(self, ids, start_floors, end_floors, start_times):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.start_floors = np.asarray(start_floors, dtype=np.int32)
+        self.end_floors = np.asarray(end_floors, dtype=np.int32)
+        self.start_times = np.asarray(start_times, dtype=np.int64)
+        self.start_traveling_times = np.full(len(self.ids), -1, dtype=np.int64)
+        self.finish_times = np.full(len(self.ids), -1, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[User]:
+        for row in range(len(self.ids)):
+            yield self.get_user(row)
+
+    def get_user(self, row: int) -> User:
+        """
+        Creates a User linked to a row of the table
+        :param row: row of the user
+        :return: the user
+        """
+        user = User(int(self.ids[row]), int(self.start_floors[row]), int(self.end_floors[row]),
+                    int(self.start_times[row]), self, row)
+        if self.start_traveling_times[row] != -1:
+            user.start_traveling_time = int(self.start_traveling_times[row])
+        if self.finish_times[row] != -1:
+            user.finish_time = int(self.finish_times[row])
+        return user
+
+    def get_arrival_stream(self, chunk_size: int = 65536) -> Iterator[User]:
+        """
+        Lazily creates users in the order they arrive. Users with the same start time keep the table order
+        :param chunk_size: how many rows to convert at once
+        """
+        order = np.argsort(self.start_times, kind="stable")
+        for chunk_start in range(0, len(order), chunk_size):
+            for row in order[chunk_start:chunk_start + chunk_size].tolist():
+                yield self.get_user(row)
+
+    def create_queue(self) -> "UserQueue":
+        """
+        :return: a queue that creates the users in the table as they are needed
+        """
+        user_queue = UserQueue()
+        user_queue.add_sorted_stream(self.get_arrival_stream(), len(self))
+        return user_queue
 
 
 class UserQueue:
-    "Class to hold queue of users"
-    users: List[User] = []
-    size: int = 0
+    """
+    Queue of users waiting to arrive, ordered by start time. Users with the same start time leave in the order they
+    were added. Backed by a heap so users can be added unsorted and already sorted streams of users (for example
+    chunks of a large simulation) can be merged in lazily without loading them all first
+    """
+    heap: List[Tuple[int, int, User, Iterator[User] | None]]
+    order: int
+    size: int
+
+    def __init__(self):
+        self.heap = []
+        self.order = 0
+        self.size = 0
 
-    def peak(self):
-        return self.users[-1]
-    def pop(self):
+    def peak(self) -> User:
+        return self.heap[0][2]
+
+    def pop(self) -> User:
+        start_time, order, user, stream = self.heap[0]
+        next_user = next(stream, None) if stream is not None else None
+        if next_user is None:
+            heapq.heappop(self.heap)
+        else:
+            if next_user.start_time < start_time:
+                raise Exception("User stream is not sorted by start time")
+            # keep the same order so users from one stream stay together when they have the same start time
+            heapq.heapreplace(self.heap, (next_user.start_time, order, next_user, stream))
         self.size -= 1
-        return self.users.pop()
+        return user
+
     def enqueue(self, user: User):
         self.size += 1
-        self.users.append(user)
+        heapq.heappush(self.heap, (user.start_time, self.order, user, None))
+        self.order += 1
+
+    def extend(self, users: Iterable[User]):
+        """
+        Adds many users at once in any order
+        :param users: users to add
+        """
+        for user in users:
+            self.heap.append((user.start_time, self.order, user, None))
+            self.order += 1
+            self.size += 1
+        heapq.heapify(self.heap)
+
+    def add_sorted_stream(self, users: Iterable[User], count: int):
+        """
+        Lazily merges a stream of users that is already sorted by start time into the queue
+        :param users: sorted users, only read from as users are popped
+        :param count: how many users the stream will produce
+        """
+        stream = iter(users)
+        first = next(stream, None)
+        if first is None:
+            return
+        self.size += count
+        heapq.heappush(self.heap, (first.start_time, self.order, first, stream))
+        self.order += 1
+
     def is_empty(self):
-        return self.size == 0
+        return len(self.heap) == 0
+
     def get_size(self):
         return self.size
-
-